@@ -0,0 +1,92 @@
+'''
+Benchmark sbstools.getDependentFiles over a generated library of sbs files with
+the pathtools helpers against the filesystem checking fileTools ones they replaced.
+
+Each sbs references a few shared library sbs by relative path, one in five of them
+the target. Both the per file scan and an SBSDependencyIndex build and query are timed.
+
+usage: python bench_getDependentFiles.py [file_count]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+import pathtools
+import sbstools
+
+FILES_PER_DIR = 100
+LIBRARY = ['lib_%d.sbs' % i for i in xrange(20)]
+SBS_XML = '''<?xml version="1.0" encoding="UTF-8"?><package><identifier v="{name}"/><dependencies>{deps}</dependencies><content/></package>'''
+DEP_XML = '''<dependency><filename v="{fn}"/><uid v="{uid}"/></dependency>'''
+
+class FileSystemPaths(object):
+    r"""The path helpers as they were, checking the filesystem on every call."""
+    getRelativePathFrom = staticmethod(ft.getRelativePathFrom)
+    getDirectory = staticmethod(ft.getDirectory)
+    normPath = staticmethod(lambda fpn: os.path.normpath(fpn).replace('\\', '/').lower())
+    joinPath = staticmethod(lambda directory, rel_path: FileSystemPaths.normPath(directory + '/' + rel_path))
+
+def makeLibrary(root, file_count):
+    r"""Write file_count sbs under root/assets and the library they use under root/library, return the target."""
+    lib_path = os.path.join(root, 'library')
+    os.makedirs(lib_path)
+    for fn in LIBRARY:
+        with open(os.path.join(lib_path, fn), 'w') as f:
+            f.write(SBS_XML.format(name = fn, deps = ''))
+    for i in xrange(file_count):
+        group, index = divmod(i, FILES_PER_DIR)
+        dir_path = os.path.join(root, 'assets', 'set_%d' % (group / 10), 'group_%d' % group)
+        if index == 0:
+            os.makedirs(dir_path)
+        deps = [LIBRARY[(i + x) % len(LIBRARY)] for x in xrange(0, 12, 4)]
+        deps = ''.join([DEP_XML.format(fn = '../../../library/' + x, uid = 1000 + j) for j, x in enumerate(deps)])
+        with open(os.path.join(dir_path, 'asset_%d.sbs' % i), 'w') as f:
+            f.write(SBS_XML.format(name = i, deps = deps))
+    return os.path.join(lib_path, LIBRARY[0]).replace('\\', '/')
+
+def timeIt(fn):
+    t = time.time()
+    result = fn()
+    return time.time() - t, result
+
+def pathWork(paths, sbs_fpn_ls, target, index):
+    r"""The path calls getDependentFiles and the index make, without the parsing around them."""
+    for sbs_fpn in sbs_fpn_ls:
+        paths.getRelativePathFrom(sbs_fpn, target)
+        directory = os.path.dirname(sbs_fpn)
+        for dep_relfpn in index.getDependencies(sbs_fpn):
+            paths.joinPath(directory, dep_relfpn)
+
+def run(root, target, paths):
+    scan_t, scan = timeIt(lambda: sbstools.getDependentFiles(root, target))
+    index_t, index = timeIt(lambda: sbstools.SBSDependencyIndex().build(root))
+    query_t, query = timeIt(lambda: index.getDependentFiles(target))
+    sbs_fpn_ls = sorted(index.records)
+    path_t, _ = timeIt(lambda: pathWork(paths, sbs_fpn_ls, target, index))
+    return scan_t, index_t, query_t, path_t, sorted(scan), sorted(query)
+
+if __name__ == '__main__':
+    file_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    root = tempfile.mkdtemp(prefix = 'bench_getDependentFiles_')
+    try:
+        target = makeLibrary(root, file_count)
+        ft.searchFiles(root, 'sbs')
+        print
+        results = {}
+        for label, paths in [('fileTools', FileSystemPaths), ('pathtools', pathtools)]:
+            sbstools.pathtools = paths
+            pathtools.clearCaches()
+            results[label] = run(root, target, paths)
+            print '{:10} getDependentFiles {:6.2f}s  index build {:6.2f}s  index query {:6.3f}s  path calls only {:6.3f}s  {} dependents'.format(
+                label, results[label][0], results[label][1], results[label][2], results[label][3], len(results[label][4]))
+        sbstools.pathtools = pathtools
+        print 'same results:', results['fileTools'][4:] == results['pathtools'][4:]
+        for name, stats in sorted(pathtools.getCacheStats().items()):
+            print '  {:20} hits {hits:8} misses {misses:8} size {size:6}'.format(name, **stats)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,71 @@
+'''
+Benchmark importing sbstools on a machine without a Substance install.
+
+Each run imports sbstools in a fresh interpreter with SBSCONFIG_DIR pointed at a
+directory that doesn't exist, and times the import and the first
+getSBSAliases() call, with and without SBS_PACKAGES_DIR set. An empty
+interpreter and importing fileTools alone are timed for reference.
+
+usage: python bench_import.py [runs]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MISSING_DIR = os.path.join(tempfile.gettempdir(), 'bench_import_no_substance', 'Allegorithmic')
+
+CHILD = r'''
+import sys, time
+sys.path.insert(0, {package!r})
+t = time.time()
+import {module}
+t_import = time.time() - t
+t_aliases = 0.0
+if {module!r} == 'sbstools':
+    assert not sbstools._sbs_config_loaded
+    sbstools.SBSCONFIG_DIR = {missing!r}
+    t = time.time()
+    sbstools.getSBSAliases()
+    t_aliases = time.time() - t
+print t_import, t_aliases
+'''
+
+def timeImport(module, env):
+    r"""Return (seconds importing module, seconds in the first getSBSAliases()) in a fresh interpreter."""
+    code = CHILD.format(package = PACKAGE_DIR, module = module, missing = MISSING_DIR)
+    out = subprocess.check_output([sys.executable, '-c', code], env = env)
+    return [float(x) for x in out.split()]
+
+def timeStartup(env):
+    r"""Return the seconds of running an empty interpreter."""
+    t = time.time()
+    subprocess.check_call([sys.executable, '-c', 'pass'], env = env)
+    return time.time() - t
+
+def median(ls):
+    ls = sorted(ls)
+    return ls[len(ls) / 2]
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    assert not os.path.isdir(MISSING_DIR)
+    env = dict(os.environ)
+    env.pop('SBS_PACKAGES_DIR', None)
+    env.pop('SBS_CONFIG', None)
+    print '{} runs, SBSCONFIG_DIR {} (missing)'.format(runs, MISSING_DIR)
+    startup = [timeStartup(env) for i in xrange(runs)]
+    print '  {:34} median {:7.1f}ms  min {:7.1f}ms'.format('interpreter startup', median(startup) * 1000, min(startup) * 1000)
+    cases = [('import fileTools', 'fileTools', env),
+             ('import sbstools', 'sbstools', env),
+             ('import sbstools, SBS_PACKAGES_DIR', 'sbstools', dict(env, SBS_PACKAGES_DIR = MISSING_DIR))]
+    for label, module, case_env in cases:
+        results = [timeImport(module, case_env) for i in xrange(runs)]
+        imports = [x[0] for x in results]
+        aliases = [x[1] for x in results]
+        print '  {:34} median {:7.1f}ms  min {:7.1f}ms{}'.format(label, median(imports) * 1000, min(imports) * 1000,
+            '  first getSBSAliases {:.2f}ms'.format(median(aliases) * 1000) if module == 'sbstools' else '')
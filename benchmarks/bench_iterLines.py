@@ -0,0 +1,117 @@
+'''
+Benchmark fileTools.iterLines and iterCSV against readFile and readCSV as they were.
+
+Writes a material dump like file and a csv of about the given size under a temp
+directory, then reads them in a fresh process per case so each peak memory is
+its own. Peak memory is the process' max resident size, so Unix only.
+
+usage: python bench_iterLines.py [megabytes] [--buffer BYTES]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+try:
+    import resource
+except ImportError:
+    resource = None
+
+MATERIAL = '''SpecificValue Texture
+{
+    Name "Diffuse_%d"
+    SValue Costume_%d_D
+}
+Operation Op_%d
+    Input Input_%d Op_%d
+EndOperation
+'''
+
+def readFile_lines(filepath, strip_nl = False):
+    r"""readFile as it was, readlines() then a stripped copy."""
+    f = open(filepath, 'r')
+    lines = f.readlines()
+    f.close()
+    if strip_nl:
+        lines = [x.strip('\n') for x in lines]
+    return lines
+
+def readCSV_lines(filepath, delimiter = ','):
+    r"""readCSV as it was."""
+    f = open(filepath, 'r')
+    lines = f.readlines()
+    f.close()
+    rows = []
+    for line in lines:
+        line = line.replace(' ','').strip()
+        columns = [x for x in line.split(delimiter)]
+        rows.append(columns)
+    return rows
+
+CASES = [('readFile', lambda fp, csv_fp, buf: readFile_lines(fp, True)),
+         ('iterLines', lambda fp, csv_fp, buf: ft.iterLines(fp, True, buf)),
+         ('iterLines mmap', lambda fp, csv_fp, buf: ft.iterLines(fp, True, buf, use_mmap = True)),
+         ('iterLines utf-8', lambda fp, csv_fp, buf: ft.iterLines(fp, True, buf, encoding = 'utf-8')),
+         ('readCSV', lambda fp, csv_fp, buf: readCSV_lines(csv_fp)),
+         ('iterCSV', lambda fp, csv_fp, buf: ft.iterCSV(csv_fp, buffer_size = buf))]
+
+def makeFiles(root, megabytes):
+    r"""Write root/dump.material and root/dump.csv of about megabytes each, return their paths."""
+    fp = os.path.join(root, 'dump.material')
+    csv_fp = os.path.join(root, 'dump.csv')
+    size = megabytes << 20
+    with open(fp, 'w') as f:
+        i = 0
+        while f.tell() < size:
+            f.write(''.join([MATERIAL % ((i + x,) * 5) for x in xrange(1000)]))
+            i += 1000
+    with open(csv_fp, 'w') as f:
+        i = 0
+        while f.tell() < size:
+            f.write(''.join(['%d, Costume_%d_D, %f, texture , normalmap\n' % (i + x, i + x, x * .5) for x in xrange(1000)]))
+            i += 1000
+    return fp, csv_fp
+
+def maxRSS():
+    if resource == None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+def runCase(label, fp, csv_fp, buf):
+    r"""Run one case in this process and print seconds, peak MB and item count."""
+    before = maxRSS()
+    t = time.time()
+    count = 0
+    for item in dict(CASES)[label](fp, csv_fp, buf):
+        count += 1
+    print time.time() - t, before, maxRSS(), count
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if '--case' in args:
+        runCase(getOption(args, '--case', None), args[0], args[1], int(getOption(args, '--buffer', ft.LINE_BUFFER)))
+        sys.exit()
+    megabytes = int(args[0]) if args and args[0].isdigit() else 200
+    buf = getOption(args, '--buffer', str(ft.LINE_BUFFER))
+    root = tempfile.mkdtemp(prefix = 'bench_iterLines_')
+    try:
+        fp, csv_fp = makeFiles(root, megabytes)
+        print '{}MB material dump, {}MB csv, {} byte buffer'.format(os.path.getsize(fp) >> 20, os.path.getsize(csv_fp) >> 20, buf)
+        for label, _ in CASES:
+            out = subprocess.check_output([sys.executable, os.path.abspath(__file__), fp, csv_fp, '--case', label, '--buffer', buf])
+            t, before, peak, count = out.split()
+            size = os.path.getsize(csv_fp if 'CSV' in label else fp) / float(1 << 20)
+            print '  {:16} {:7.2f}s {:7.1f}MB/s  peak {:7.1f}MB (+{:.1f}MB)  {} items'.format(
+                label, float(t), size / max(float(t), 1e-6), float(peak), float(peak) - float(before), count)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,115 @@
+'''
+Benchmark the iterparse sbstools.getDependencies and getGraphOutputs against the
+et.parse versions they replaced.
+
+Writes synthetic sbs files of roughly the given sizes in MB, a <dependencies>
+block followed by graphs of instance nodes and outputs, and reads the
+dependencies and the outputs of the middle graph from each, each case in a fresh
+process so each peak memory is its own. The results of the two paths are compared.
+Peak memory is the process' max resident size, so Unix only.
+
+usage: python bench_iterparse.py [--sizes MB,MB,...]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import hashlib
+import tempfile
+import subprocess
+import xml.etree.ElementTree as et
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import sbstools
+from bench_iterLines import maxRSS
+
+DEP_COUNT = 40
+NODES_PER_GRAPH = 60
+DEP_XML = '''<dependency><filename v="../library/lib_{i}.sbs"/><uid v="{uid}"/><type v="package"/><fileUID v="0"/><versionUID v="0"/></dependency>'''
+NODE_XML = '''<compNode><uid v="{uid}"/><GUILayout><gpos v="{i} {i} 0"/></GUILayout><compImplementation><compInstance><path><value v="pkg:///lib_graph_{dep}?dependency={dep_uid}"/></path><parameters><parameter><name v="outputsize"/><paramValue><constantValueInt32 v="11"/></paramValue></parameter></parameters></compInstance></compImplementation></compNode>'''
+OUTPUT_XML = '''<graphoutput><identifier v="{name}"/><uid v="{uid}"/><attributes><label v="{name}"/></attributes><usages><usage><name v="{name}"/></usage></usages></graphoutput>'''
+GRAPH_HEAD = '''<graph><identifier v="graph_{i}"/><uid v="{uid}"/><graphOutputs>{outputs}</graphOutputs><compNodes>'''
+GRAPH_TAIL = '''</compNodes></graph>'''
+
+def getDependencies_parse(sbs_fpn):
+    r"""getDependencies as it was, parsing the whole tree."""
+    try:
+        sbs_tree = et.parse(sbs_fpn)
+    except:
+        raise sbstools.SBS_CorruptFileError(sbs_fpn)
+    sbs_root = sbs_tree.getroot()
+    return sbs_root.findall(".//dependency")
+
+def getGraphOutputs_parse(sbs_fpn, graph_nm):
+    r"""getGraphOutputs as it was, parsing the whole tree."""
+    sbs_tree = et.parse(sbs_fpn)
+    sbs_root = sbs_tree.getroot()
+    return sbs_root.findall(".//graph/identifier[@v='{}']/../graphOutputs/graphoutput".format(graph_nm))
+
+def writeGraph(f, i):
+    uid = 1000000 + i * (NODES_PER_GRAPH + 10)
+    outputs = ''.join([OUTPUT_XML.format(name = 'output_%d_%s' % (i, x), uid = uid + j) for j, x in enumerate('DNR')])
+    f.write(GRAPH_HEAD.format(i = i, uid = uid, outputs = outputs))
+    f.write(''.join([NODE_XML.format(uid = uid + 10 + j, i = j, dep = (i + j) % DEP_COUNT, dep_uid = 1000 + (i + j) % DEP_COUNT)
+                     for j in xrange(NODES_PER_GRAPH)]))
+    f.write(GRAPH_TAIL)
+
+def makeSBS(fpn, size):
+    r"""Write an sbs of about size bytes to fpn, return its graph count."""
+    with open(fpn, 'w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?><package><identifier v="bench"/><dependencies>')
+        f.write(''.join([DEP_XML.format(i = i, uid = 1000 + i) for i in xrange(DEP_COUNT)]))
+        f.write('</dependencies><content>')
+        graph_count = 0
+        while f.tell() < size:
+            writeGraph(f, graph_count)
+            graph_count += 1
+        f.write('</content></package>')
+    return graph_count
+
+def runCase(label, fpn, graph_nm):
+    r"""Run one case in this process and print seconds, peak MB before and after, item count and a digest."""
+    before = maxRSS()
+    t = time.time()
+    if label == 'deps et.parse':
+        elem_ls = getDependencies_parse(fpn)
+    elif label == 'deps iterparse':
+        elem_ls = sbstools.getDependencies(fpn)
+    elif label == 'outputs et.parse':
+        elem_ls = getGraphOutputs_parse(fpn, graph_nm)
+    else:
+        elem_ls = sbstools.getGraphOutputs(fpn, graph_nm)
+    t = time.time() - t
+    data = [et.tostring(x) for x in elem_ls]
+    print t, before, maxRSS(), len(data), hashlib.md5(repr(data)).hexdigest()
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if '--case' in args:
+        runCase(args[args.index('--case') + 1], args[0], args[1])
+        sys.exit()
+    sizes = [float(x) for x in getOption(args, '--sizes', '1,10,100').split(',')]
+    root = tempfile.mkdtemp(prefix = 'bench_iterparse_')
+    try:
+        for size in sizes:
+            fpn = os.path.join(root, 'bench_%g.sbs' % size)
+            graph_count = makeSBS(fpn, int(size * (1 << 20)))
+            graph_nm = 'graph_%d' % (graph_count / 2)
+            print '{:.1f}MB, {} graphs'.format(os.path.getsize(fpn) / float(1 << 20), graph_count)
+            for kind in ['deps', 'outputs']:
+                results = []
+                for label in [kind + ' et.parse', kind + ' iterparse']:
+                    out = subprocess.check_output([sys.executable, os.path.abspath(__file__), fpn, graph_nm, '--case', label])
+                    t, before, peak, count, digest = out.split()
+                    results.append((float(t), digest))
+                    print '  {:18} {:7.2f}s  peak {:7.1f}MB (+{:.1f}MB)  {} elements'.format(
+                        label, float(t), float(peak), float(peak) - float(before), count)
+                print '  {:18} x{:<6.1f} same: {}'.format(kind, results[0][0] / max(results[1][0], 1e-6), results[0][1] == results[1][1])
+    finally:
+        shutil.rmtree(root)
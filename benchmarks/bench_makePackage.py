@@ -0,0 +1,127 @@
+'''
+Benchmark SBS.makePackage with the SBSDocument lookup tables against the XPath
+setMap and setModel they replaced.
+
+Writes a synthetic package template of the resources, the output nodes that
+reference them and filler_count other nodes, then loads it and makes a package
+from it runs times with each. The packages written by the two are compared byte
+for byte.
+
+usage: python bench_makePackage.py [filler_count] [--runs N]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+import pathtools
+from sbstools import SBS, SBS_SetMapError, SBS_SetModelError
+
+MAPS = ['tex_m', 'tex_n', 'tex_h', 'tex_ao', 'tex_wsn', 'tex_p']
+RESOURCE_XML = '''<resource><identifier v="{name}"/><uid v="{uid}"/><filepath v="old/{name}.tga"/></resource>'''
+OUTPUT_XML = '''<compNode><params><parameter><paramValue><constantValueInt2><value v="9 9"/></constantValueInt2></paramValue></parameter></params><uid v="{uid}"/><compImplementation><compFilter><parameters><parameter><paramValue><constantValueString v="pkg://Resources/{name}?dependency=999"/></paramValue></parameter></parameters></compFilter></compImplementation></compNode>'''
+FILLER_XML = '''<compNode><uid v="{uid}"/><compImplementation><compFilter><filter v="blend"/><parameters><parameter><name v="opacity"/><paramValue><constantValueFloat1 v="0.5"/></paramValue></parameter></parameters></compFilter></compImplementation></compNode>'''
+PACKAGE_XML = '''<?xml version="1.0" encoding="UTF-8"?><package><identifier v="template"/><dependencies><dependency><filename v="?himself"/><uid v="999"/></dependency></dependencies><content><resource_folder>{resources}</resource_folder><graph><identifier v="bake"/><uid v="5"/><compNodes>{nodes}</compNodes></graph></content></package>'''
+
+class XPathSBS(SBS):
+    r"""SBS with setMap and setModel as they were, an XPath scan of the tree per lookup."""
+    def setMap(self, maptype, new_path, res):
+        new_path = new_path.replace('\\', '/')
+        for MAPTYPE in SBS.MAPTYPE_LIST:
+            if maptype == MAPTYPE[SBS.FORMAT_FULL]:
+                maptype = MAPTYPE[SBS.FORMAT_SWAP]
+        rel_path = pathtools.getRelativePathFrom(self.package_path, new_path)
+        map_name = new_path.split('/')[-1]
+        map_name = map_name.split('.')[0]
+        rel_path = '/'.join(rel_path.split('/')[:-1] + [new_path.split('/')[-1]])
+
+        rsrc = self.package_root.findall(".//*[@v='{}']/../filepath".format(maptype))
+        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc = rsrc[0]
+        rsrc.set('v',rel_path)
+
+        rsrc = self.package_root.findall(".//*[@v='{}']/../identifier".format(maptype))
+        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc = rsrc[0]
+        rsrc.set('v','{}'.format(map_name))
+
+        rsrc_node = self.package_root.findall(".//*[@v='pkg://Resources/{}?dependency={}']/../../../../../../".format(maptype, self.UID))
+        if len(rsrc_node) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc_node = rsrc_node[0]
+        rsrc_node.findall('.//constantValueInt2/value')[0].set('v', res)
+
+        rsrc = self.package_root.findall(".//*[@v='pkg://Resources/{}?dependency={}']".format(maptype, self.UID))
+        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc = rsrc[0]
+        rsrc.set('v','pkg://Resources/{}?dependency={}'.format(map_name, self.UID))
+
+    def setModel(self, model_path):
+        rsrc = self.package_root.findall(".//*[@v='{}']/../filepath".format('geo_low'))
+        if len(rsrc) == 0: raise SBS_SetModelError("template may be corrupt.")
+        rsrc = rsrc[0]
+        rsrc.set('v','{}'.format(pathtools.getRelativePathFrom(self.package_path, model_path)))
+        rsrc = self.package_root.findall(".//*[@v='{}']/../identifier".format('geo_low'))
+        if len(rsrc) == 0: raise SBS_SetModelError("template may be corrupt.")
+        rsrc = rsrc[0]
+        rsrc.set('v','{}'.format(ft.fileKey(model_path)))
+
+def makeTemplate(fpn, filler_count):
+    r"""Write the package template to fpn."""
+    resources = ''.join([RESOURCE_XML.format(name = x, uid = i) for i, x in enumerate(MAPS + ['geo_low'])])
+    nodes = ''.join([OUTPUT_XML.format(name = x, uid = 100 + i) for i, x in enumerate(MAPS)])
+    nodes += ''.join([FILLER_XML.format(uid = 1000 + i) for i in xrange(filler_count)])
+    with open(fpn, 'w') as f:
+        f.write(PACKAGE_XML.format(resources = resources, nodes = nodes))
+
+def makeAsset(root):
+    r"""Write empty maps and a model for an asset under root, return the SBS arguments."""
+    tex_path = os.path.join(root, 'asset')
+    os.makedirs(tex_path)
+    fpn_ls = [os.path.join(tex_path, 'asset_{}.tga'.format(x.split('_')[-1])) for x in MAPS] + [os.path.join(tex_path, 'asset_low.fbx')]
+    for fpn in fpn_ls:
+        open(fpn, 'w').close()
+    return [x.replace('\\', '/') for x in fpn_ls]
+
+def run(cls, asset, template_fpn, out_fpn, runs):
+    r"""Return the mean seconds loading template_fpn and the mean seconds of makePackage."""
+    t_load = t_make = 0.0
+    for i in xrange(runs):
+        t = time.time()
+        sbs = cls(*asset, package_template = template_fpn)
+        t_load += time.time() - t
+        t = time.time()
+        sbs.makePackage(out_fpn)
+        t_make += time.time() - t
+    return t_load / runs, t_make / runs
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    filler_count = int(args[0]) if args and args[0].isdigit() else 3000
+    runs = int(getOption(args, '--runs', 20))
+    root = tempfile.mkdtemp(prefix = 'bench_makePackage_')
+    try:
+        template_fpn = os.path.join(root, 'template.sbs').replace('\\', '/')
+        makeTemplate(template_fpn, filler_count)
+        asset = makeAsset(root)
+        print '{} filler nodes, {:.0f}KB template, {} runs'.format(filler_count, os.path.getsize(template_fpn) / 1024.0, runs)
+        results = {}
+        for label, cls in [('XPath', XPathSBS), ('indexed', SBS)]:
+            out_fpn = os.path.join(root, 'asset', 'asset_{}.sbs'.format(label)).replace('\\', '/')
+            t_load, t_make = run(cls, asset, template_fpn, out_fpn, runs)
+            results[label] = t_make
+            with open(out_fpn, 'rb') as f:
+                results[label + ' data'] = f.read()
+            print '  {:8} load {:7.1f}ms  makePackage {:7.1f}ms'.format(label, t_load * 1000, t_make * 1000)
+        print '  x{:<6.1f} same: {}'.format(results['XPath'] / max(results['indexed'], 1e-6),
+                                           results['XPath data'] == results['indexed data'])
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,59 @@
+'''
+Benchmark fileTools.iterFilesParallel on a simulated network share.
+
+fileTools._listDirectory is wrapped to sleep before each listing, standing in
+for the round trip of an SMB/NFS directory read. The parallel walk is checked
+against the serial searchFiles() result for every thread count.
+
+usage: python bench_parallelWalk.py [file_count] [--latency SECONDS] [--threads N,N,...]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+from bench_searchFiles import makeTree, timeIt
+
+def slowListing(latency):
+    r"""Return a replacement for fileTools._listDirectory that waits latency seconds per directory."""
+    listDirectory = ft._listDirectory
+    def _listDirectory(directory):
+        time.sleep(latency)
+        return listDirectory(directory)
+    return _listDirectory
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    latency = float(getOption(args, '--latency', 0.005))
+    thread_counts = [int(x) for x in getOption(args, '--threads', '1,4,16,32').split(',')]
+    file_count = int(args[0]) if args and args[0].isdigit() else 20000
+    base = tempfile.mkdtemp(prefix = 'bench_parallelWalk_')
+    try:
+        makeTree(base, file_count)
+        listDirectory = ft._listDirectory
+        ft._listDirectory = slowListing(latency)
+        try:
+            print '{} files, {:.1f}ms per directory listing'.format(file_count, latency * 1000)
+            t_serial, serial = timeIt(lambda: list(ft.iterFiles(base, 'sbs')))
+            print '  {:24} {:7.2f}s'.format('iterFiles', t_serial)
+            for threads in thread_counts:
+                t_ordered, ordered = timeIt(lambda: list(ft.iterFilesParallel(base, 'sbs', threads = threads, ordered = True)))
+                t_any, unordered = timeIt(lambda: list(ft.iterFilesParallel(base, 'sbs', threads = threads)))
+                print '  {:24} {:7.2f}s  x{:<5.1f} same order: {}  unordered {:.2f}s same set: {}'.format(
+                    'iterFilesParallel x%d' % threads, t_ordered, t_serial / max(t_ordered, 1e-6),
+                    ordered == serial, t_any, sorted(unordered) == sorted(serial))
+            t_depth, shallow = timeIt(lambda: list(ft.iterFilesParallel(base, 'sbs', threads = thread_counts[-1], max_depth = 1, ordered = True)))
+            print '  {:24} {:7.2f}s  same: {}'.format('max_depth 1', t_depth, shallow == list(ft.iterFiles(base, 'sbs', max_depth = 1)))
+        finally:
+            ft._listDirectory = listDirectory
+    finally:
+        shutil.rmtree(base)
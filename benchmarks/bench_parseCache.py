@@ -0,0 +1,73 @@
+'''
+Benchmark parsertools.parsetokens_files with a ParseCache on a corpus of data files.
+
+Writes file_count small data files under a temp directory and parses them without
+a cache, with an empty cache, with a warm one and with a warm one after touching
+one file in a hundred. The results are checked against the uncached parse.
+
+usage: python bench_parseCache.py [file_count] [--workers N]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import parsertools as pt
+
+FILES_PER_DIR = 500
+STYLES = [pt.TokenStyle('name'), pt.TokenStyle('texture'), pt.TokenStyle('value', 2), pt.TokenStyle('parent', 1, ' =')]
+LINES = ['Name "Data %d"\n', 'Texture tex_%d\n', '\tValue x %d\n', 'Parent = base_%d\n', '# comment %d\n', 'Other %d\n']
+
+def makeCorpus(root, file_count):
+    r"""Write file_count data files of 20 to 80 lines under root, return their paths."""
+    random.seed(file_count)
+    fpn_ls = []
+    for i in xrange(file_count):
+        dir_path = os.path.join(root, 'dir_%d' % (i / FILES_PER_DIR))
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(dir_path)
+        fpn = os.path.join(dir_path, 'data_%d.def' % i)
+        with open(fpn, 'w') as f:
+            f.write(''.join([random.choice(LINES) % j for j in xrange(random.randint(20, 80))]))
+        fpn_ls.append(fpn)
+    return fpn_ls
+
+def timeIt(fn, *args, **kwargs):
+    t = time.time()
+    result = fn(*args, **kwargs)
+    return time.time() - t, result
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    file_count = int(args[0]) if args and args[0].isdigit() else 50000
+    workers = int(getOption(args, '--workers', 0)) or None
+    root = tempfile.mkdtemp(prefix = 'bench_parseCache_')
+    try:
+        fpn_ls = makeCorpus(root, file_count)
+        print '{} files, workers {}'.format(file_count, workers)
+        t_none, ref = timeIt(pt.parsetokens_files, fpn_ls, STYLES, workers = workers)
+        print '  {:16} {:7.2f}s'.format('no cache', t_none)
+        cache = pt.ParseCache(os.path.join(root, 'parsetokens.sqlite'))
+        for label in ['cold cache', 'warm cache', '1% changed']:
+            if label == '1% changed':
+                future = time.time() + 10
+                for fpn in fpn_ls[::100]:
+                    os.utime(fpn, (future, future))
+            cache.hits = cache.misses = 0
+            t, result = timeIt(pt.parsetokens_files, fpn_ls, STYLES, workers = workers, cache = cache)
+            stats = cache.getStats()
+            print '  {:16} {:7.2f}s  x{:<6.1f} hits {hits:6} misses {misses:6}  same: {same}'.format(
+                label, t, t_none / max(t, 1e-6), same = result == ref, **stats)
+        cache.close()
+        print '  database {:.1f}MB'.format(os.path.getsize(os.path.join(root, 'parsetokens.sqlite')) / float(1 << 20))
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,103 @@
+'''
+Benchmark parsertools.iterparselines streaming a block file against parselines over readFile.
+
+Writes a block structured data file of nested key blocks and builds Node trees
+from it, each case in a fresh process so each peak memory is its own:
+  readFile + parselines          -- the lines and the whole tree in memory.
+  iterLines + parselines         -- the whole tree.
+  iterLines + iterparselines     -- each block counted and pruned as it closes.
+Peak memory is the process' max resident size, so Unix only.
+
+usage: python bench_parselines.py [block_count]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+import parsertools as pt
+from bench_iterLines import maxRSS
+
+BLOCK = '''Material Material_%d
+{
+    Shader Shader_%d
+    Texture
+    {
+        Name Diffuse_%d
+        Flags 0
+    }
+    Texture
+    {
+        Name Normal_%d
+    }
+}
+'''
+
+def enterBlock(line, inNode, blockDepth):
+    return 1 if line.strip() == '{' else 0
+
+def exitBlock(line, inNode, blockDepth):
+    return -1 if line.strip() == '}' else 0
+
+def isKeyBlock(line, inNode, blockDepth):
+    return True
+
+def stepIn(line, inNode, blockDepth):
+    node = pt.Node(inNode.pending)
+    inNode.addChild(node)
+    node.pending = None
+    return node
+
+def stepOut(line, inNode, blockDepth):
+    return inNode.parent
+
+def other(line, inNode, blockDepth):
+    inNode.pending = line.strip()
+
+CALLBACKS = {'f_enterBlock' : enterBlock, 'f_exitBlock' : exitBlock, 'f_enterKeyBlock' : isKeyBlock,
+             'f_exitKeyBlock' : isKeyBlock, 'f_stepIn' : stepIn, 'f_stepOut' : stepOut, 'f_other' : other}
+
+def countNodes(node):
+    return 1 + sum([countNodes(x) for x in node.children])
+
+def runCase(label, fp):
+    r"""Run one case in this process and print seconds, peak MB before and after and node count."""
+    before = maxRSS()
+    t = time.time()
+    root = pt.Node('root')
+    root.pending = None
+    if label == 'readFile + parselines':
+        count = countNodes(pt.parselines(ft.readFile(fp), root, **CALLBACKS)) - 1
+    elif label == 'iterLines + parselines':
+        count = countNodes(pt.parselines(ft.iterLines(fp), root, **CALLBACKS)) - 1
+    else:
+        count = 0
+        for node in pt.iterparselines(ft.iterLines(fp), root, prune = True, **CALLBACKS):
+            count += 1
+    print time.time() - t, before, maxRSS(), count
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    if '--case' in args:
+        runCase(args[args.index('--case') + 1], args[0])
+        sys.exit()
+    block_count = int(args[0]) if args else 200000
+    root = tempfile.mkdtemp(prefix = 'bench_parselines_')
+    try:
+        fp = os.path.join(root, 'dump.materials')
+        with open(fp, 'w') as f:
+            for i in xrange(0, block_count, 1000):
+                f.write(''.join([BLOCK % ((x,) * 4) for x in xrange(i, min(i + 1000, block_count))]))
+        print '{} blocks, {:.0f}MB'.format(block_count, os.path.getsize(fp) / float(1 << 20))
+        for label in ['readFile + parselines', 'iterLines + parselines', 'iterLines + iterparselines']:
+            out = subprocess.check_output([sys.executable, os.path.abspath(__file__), fp, '--case', label])
+            t, before, peak, count = out.split()
+            print '  {:28} {:7.2f}s  peak {:7.1f}MB (+{:.1f}MB)  {} nodes'.format(
+                label, float(t), float(peak), float(peak) - float(before), count)
+    finally:
+        shutil.rmtree(root)
@@ -0,0 +1,76 @@
+'''
+Benchmark parsertools.parsetokens with a TokenStyleSet against the per style loop it replaced.
+
+Generates a config like file whose lines start with one of the style tokens and
+parses it with growing numbers of styles, all sharing the first letter so the
+old first letter check doesn't skip any, spread over a few sep/splits configurations.
+
+usage: python bench_parsetokens.py [line_count] [--styles N,N,...]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import parsertools as pt
+from parsertools import str_tokenize_clean
+
+CONFIGS = [(' \t\n', -1), (' \t\n', 1), (' =', -1)]
+
+def parsetokens_loop(lines, token_styles, preservecase=False):
+    r"""parsetokens as it was, tokenizing the line again for every style."""
+    retdict = {}
+    firstletters = map(lambda x: x.token[0], token_styles) #get the first character of each token to speed things up
+    for token_style in token_styles:
+        retdict[token_style.token] = []
+    for line in lines:
+        line = line.strip()
+        comment_i = line.find('#')
+        comment_i = comment_i if comment_i != -1 else len(line)
+        line = line[:comment_i]
+        if len(line) == 0 or not line[0].lower() in firstletters:
+            continue
+        for token_style in token_styles:
+            line_tk = str_tokenize_clean(line,
+                                         token_style.sep,
+                                         token_style.splits,
+                                         preservecase=preservecase)
+            if line_tk[0].lower() == token_style.token.lower():
+                retdict[token_style.token].append(line_tk[token_style.valindex])
+                break
+    if not preservecase:
+        for k in retdict.keys():
+            retdict[k] = map(lambda x: x.lower(), retdict[k])
+    return retdict
+
+def makeStyles(style_count):
+    return [pt.TokenStyle('token_%d' % i, 1, *CONFIGS[i % len(CONFIGS)]) for i in xrange(style_count)]
+
+def makeLines(line_count, style_count):
+    random.seed(line_count)
+    return ['\ttoken_%d "Value %d" # comment\n' % (random.randrange(style_count + 2), i) for i in xrange(line_count)]
+
+def timeIt(fn, *args):
+    t = time.time()
+    result = fn(*args)
+    return time.time() - t, result
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    line_count = int(args[0]) if args and args[0].isdigit() else 100000
+    style_counts = [int(x) for x in getOption(args, '--styles', '1,5,20,40').split(',')]
+    print '{} lines'.format(line_count)
+    for style_count in style_counts:
+        styles = makeStyles(style_count)
+        lines = makeLines(line_count, style_count)
+        t_old, old = timeIt(parsetokens_loop, lines, styles)
+        t_new, new = timeIt(pt.parsetokens, lines, pt.TokenStyleSet(styles))
+        print '  {:3} styles  per style {:6.2f}s  TokenStyleSet {:6.2f}s  x{:<5.1f} same: {}'.format(
+            style_count, t_old, t_new, t_old / max(t_new, 1e-6), old == new)
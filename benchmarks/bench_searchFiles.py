@@ -0,0 +1,96 @@
+'''
+Benchmark fileTools.searchFiles against the os.walk implementation it replaced.
+
+Generates a tree of empty files under a temp directory (reused between runs),
+times both searches and checks they return the same list.
+
+usage: python bench_searchFiles.py [file_count ...] [--root DIR] [--keep]
+
+@author: dkorkh
+'''
+import os
+import re
+import sys
+import time
+import shutil
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import fileTools as ft
+
+EXTS = ('sbs', 'sbsar', 'tga', 'png', 'xml', 'txt', 'mtl', 'psd')
+FILES_PER_DIR = 50
+DIRS_PER_DIR = 8
+
+def searchFiles_walk(directory, fileType = ".", name_srch_rgx = ".*", exact = False):
+    r"""The os.walk based searchFiles, without the prints."""
+    fileList = []
+    for root, dirs, files in os.walk(directory, topdown=True):
+        for each in files:
+            if exact:
+                if re.search((fileType.lower()+"$"), each.lower()):
+                    if each.lower() == name_srch_rgx.lower():
+                        fileList.append(root+"/"+each)
+            elif re.search(name_srch_rgx.lower(), each.lower()) and re.search((fileType.lower()+"$"), each.lower()):
+                fileList.append(root+"/"+each)
+    for index in xrange(len(fileList)):
+        fileList[index] = fileList[index].replace("\\","/")
+    return fileList
+
+def makeTree(root, file_count):
+    r"""Fill root with file_count empty files, FILES_PER_DIR per directory, breadth first."""
+    made = 0
+    dirs = [root]
+    while made < file_count:
+        next_dirs = []
+        for d in dirs:
+            for i in xrange(min(FILES_PER_DIR, file_count - made)):
+                open(os.path.join(d, 'File_%d.%s' % (made, EXTS[made % len(EXTS)])), 'w').close()
+                made += 1
+            for i in xrange(DIRS_PER_DIR):
+                sub = os.path.join(d, 'Dir_%d' % i if i else '.autosave')
+                os.mkdir(sub)
+                next_dirs.append(sub)
+            if made >= file_count:
+                break
+        dirs = next_dirs
+
+def timeIt(fn, *args, **kwargs):
+    t = time.time()
+    result = fn(*args, **kwargs)
+    return time.time() - t, result
+
+def run(file_count, base):
+    root = os.path.join(base, 'tree_%d' % file_count)
+    if not os.path.isdir(root):
+        os.makedirs(root)
+        t, _ = timeIt(makeTree, root, file_count)
+        print 'generated {} files in {:.1f}s'.format(file_count, t)
+    print '{} files (scandir: {})'.format(file_count, ft.scandir != None)
+    cases = [('by type', ('sbs',), {}),
+             ('type + name', ('tga', 'file_1'), {}),
+             ('exact', ('png', 'file_3.png'), {'exact' : True})]
+    results = {}
+    for label, args, kwargs in cases:
+        t_old, old = timeIt(searchFiles_walk, root, *args, **kwargs)
+        t_new, new = timeIt(lambda: list(ft.iterFiles(root, *args, **kwargs)))
+        results[label] = new
+        print '  {:12} walk {:7.2f}s  iterFiles {:7.2f}s  x{:.1f}  same: {}'.format(label, t_old, t_new, t_old / max(t_new, 1e-6), old == new)
+    t_prune, pruned = timeIt(lambda: list(ft.iterFiles(root, 'sbs', prune = ft.PRUNE_DIRS)))
+    print '  {:12} iterFiles {:7.2f}s  {} of {} files'.format('pruned', t_prune, len(pruned), len(results['by type']))
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    keep = '--keep' in args
+    base = None
+    if '--root' in args:
+        base = args[args.index('--root') + 1]
+        args = args[:args.index('--root')] + args[args.index('--root') + 2:]
+    counts = [int(x) for x in args if not x.startswith('--')] or [100000, 1000000]
+    if base == None:
+        base = tempfile.mkdtemp(prefix = 'bench_searchFiles_')
+    try:
+        for count in counts:
+            run(count, base)
+    finally:
+        if not keep:
+            shutil.rmtree(base)
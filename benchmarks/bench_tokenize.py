@@ -0,0 +1,155 @@
+'''
+Benchmark parsertools.str_tokenize against the character state machine it replaced.
+
+Both tokenize the lines of a generated material/config like file with the
+separators and splits parsertools' callers use and the results are compared
+line by line, along with a corpus of edge cases: quotes next to words, open
+quotes, separators that are quotes, splits of 0 and the rest of the line, whitespace
+str.split() would split on that isn't in sep and unicode lines.
+
+usage: python bench_tokenize.py [line_count] [--repeat N]
+
+@author: dkorkh
+'''
+import os
+import sys
+import time
+import gc
+import random
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import parsertools as pt
+
+LINES = ['SpecificValue Texture\n',
+         '    Name "Diffuse Map %d"\n',
+         '    SValue Costume_%d_D\n',
+         '\tInput\tInput_%d Op_%d # comment\n',
+         'Operation Op_%d\n',
+         'Token = "quoted value %d", other\n',
+         '}\n',
+         '\n']
+CONFIGS = [(' \t\n', -1), (' \t\n', 1), (' \t\n', 2), (' =', -1), (',', 3)]
+EDGE_CASES = ['', ' ', '\n', 'a', '"', '""', '"a"b', 'a"b"', 'a "b c" d', 'a "b', '"a b',
+              '  lead and trail  \n', 'x "" y', '"a""b"', 'a,,b,', ' = a = "b = c" =',
+              'tab\tsep\tline\n', 'one "two three" four "five', 'Name "Diffuse Map"\n',
+              'crlf line\r\n', 'a\rb c', 'a\x0bb\x0cc d', u'a\xa0b c', u'"a\xa0b" c', 'a,,b,,', ' , a , b ,']
+
+def str_tokenize_statemachine(s, sep=' \t\n', splits= -1, splitquotes=False):
+    r"""str_tokenize_clean as it was, without the cleaning."""
+    WORD, TOKENS, SPLITSMADE, INDEX, STRING, SEP, SPLITS, QUOTE, COMMENT = 1, 2, 3, 4, 5, 6, 7, 8, 9
+    r = {WORD        : '',
+         TOKENS      : [],
+         SPLITSMADE  : 0,
+         INDEX       : 0,
+         STRING      : s,
+         SEP         : sep if sep else ' \t\n', #protect from None
+         SPLITS      : splits,
+         QUOTE       : '\"' if not splitquotes else ''}
+    def enterWord():
+        while r[INDEX] < len(r[STRING])        \
+        and r[STRING][r[INDEX]] != r[QUOTE]    \
+        and not r[STRING][r[INDEX]] in r[SEP]:
+            r[WORD] += r[STRING][r[INDEX]]
+            r[INDEX] += 1
+        r[TOKENS].append(r[WORD])
+        r[WORD] = ''
+        r[SPLITSMADE] += 1
+        enterSpace()
+    def enterQuote():
+        r[WORD] += r[STRING][r[INDEX]]
+        r[INDEX] += 1
+        if r[INDEX] == len(r[STRING]):
+                raise pt.QuoteMismatchError(r[STRING])
+        while r[STRING][r[INDEX]] != r[QUOTE]:
+            r[WORD] += r[STRING][r[INDEX]]
+            r[INDEX] += 1
+            if r[INDEX] == len(r[STRING]):
+                raise pt.QuoteMismatchError(r[STRING])
+        r[WORD] += r[STRING][r[INDEX]]
+        r[INDEX] += 1
+        r[TOKENS].append(r[WORD])
+        r[WORD] = ''
+        r[SPLITSMADE] += 1
+        enterSpace()
+    def enterSpace():
+        while r[INDEX] < len(r[STRING]) \
+        and r[STRING][r[INDEX]] in r[SEP]:
+            r[INDEX] += 1
+
+    while r[INDEX] < len(r[STRING]) \
+    and r[STRING][r[INDEX]]         \
+    and r[SPLITSMADE] != r[SPLITS]:
+        if r[STRING][r[INDEX]] in r[SEP]:
+            enterSpace()
+            continue
+        if r[STRING][r[INDEX]] == r[QUOTE]:
+            enterQuote()
+            continue
+        else:
+            enterWord()
+            continue
+    if r[INDEX] < len(r[STRING]):
+        while r[INDEX] < len(r[STRING]):
+            r[WORD] += r[STRING][r[INDEX]]
+            r[INDEX] += 1
+        r[TOKENS].append(r[WORD])
+        r[WORD] = ''
+        r[SPLITSMADE] += 1
+    return r[TOKENS]
+
+def tokenize(fn, line, sep, splits, splitquotes = False):
+    r"""Return fn's tokens, or the QuoteMismatchError line it raised."""
+    try:
+        return fn(line, sep, splits, splitquotes)
+    except pt.QuoteMismatchError as e:
+        return ('QuoteMismatchError', e.line)
+
+def checkEdgeCases():
+    r"""Return the edge cases the two tokenizers disagree on."""
+    differ = []
+    for line in EDGE_CASES:
+        for sep in [' \t\n', ',', ' =', '"', None]:
+            for splits in [-1, 0, 1, 2, 3, 40]:
+                for splitquotes in [False, True]:
+                    args = (line, sep, splits, splitquotes)
+                    if tokenize(str_tokenize_statemachine, *args) != tokenize(pt.str_tokenize, *args):
+                        differ.append(args)
+    return differ
+
+def makeLines(line_count):
+    random.seed(line_count)
+    return [random.choice(LINES).replace('%d', str(i)) for i in xrange(line_count)]
+
+def timeIt(fn, lines, sep, splits, repeat = 1):
+    r"""Return the least seconds fn takes over lines in repeat runs and its results, the lines have
+    no open quotes. The garbage collector is off so it doesn't time walking the results of the last run."""
+    best = None
+    for i in xrange(repeat):
+        result = None
+        gc.disable()
+        try:
+            t = time.time()
+            result = [fn(line, sep, splits) for line in lines]
+            t = time.time() - t
+        finally:
+            gc.enable()
+        best = t if best == None else min(best, t)
+    return best, result
+
+def getOption(args, name, default):
+    if not name in args:
+        return default
+    return args[args.index(name) + 1]
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    line_count = int(args[0]) if args and args[0].isdigit() else 1000000
+    repeat = int(getOption(args, '--repeat', 3))
+    differ = checkEdgeCases()
+    print '{} edge cases differ{}'.format(len(differ), ''.join(['\n  {!r}'.format(x) for x in differ]))
+    lines = makeLines(line_count)
+    print '{} lines, best of {}'.format(line_count, repeat)
+    for sep, splits in CONFIGS:
+        t_old, old = timeIt(str_tokenize_statemachine, lines, sep, splits, repeat)
+        t_new, new = timeIt(pt.str_tokenize, lines, sep, splits, repeat)
+        print '  sep {!r:8} splits {:2}  state machine {:6.2f}s  str_tokenize {:6.2f}s  x{:<5.1f} same: {}'.format(
+            sep, splits, t_old, t_new, t_old / max(t_new, 1e-6), old == new)
@@ -5,6 +5,21 @@ Mostly short recipies and tools for working with basic fileIO
 
 Methods:
 writedict() -- Format a dictionary into a text file in a simple tabbed hierarchy.
+iterFiles() -- Lazily yield the files under a directory by type and name, pruning directories.
+iterFilesParallel() -- iterFiles() listing directories from a pool of threads, for network shares.
+diskCache() -- Decorate a function to reuse its results from disk across runs.
+hashFiles() -- Hash many files in a pool of threads.
+findDuplicates() -- Return the groups of identical files in a list.
+waitForFiles() -- Yield paths as they become writable or exist, until a deadline.
+iterLines() -- Lazily yield the lines of a file, streamed or memory mapped.
+iterCSV() -- Lazily yield the rows of a csv.
+
+Classes:
+FileList -- A persistent index of the files under a root, refreshed by directory mtime.
+WatchedFileList -- A FileList kept live with inotify or polling.
+DiskCache -- A store of function results on disk shared between processes, see diskCache().
+HashCache -- File hashes remembered while the files don't change, see hashFiles().
+GimmeClient -- Check files in and out of gimme in concurrent batches.
 
 @author: dkorkh
 '''
@@ -15,6 +30,55 @@ from time import sleep
 import hashlib
 import json
 import printtools
+import pathtools
+import threading
+import Queue
+import sys
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import cPickle
+import zlib
+import time
+import tempfile
+import inspect
+import functools
+import mmap
+import subprocess
+from multiprocessing.pool import ThreadPool
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+PRUNE_DIRS = ('_macos', '__macosx', '.autosave')
+HASH_CHUNK = 1 << 20
+GIMME = r"C:\Cryptic\tools\bin\gimme.exe"
+PARTIAL_HASH_SIZE = 1 << 16
+LINE_BUFFER = 1 << 16
+
+#inotify(7)
+_IN_ATTRIB      = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM  = 0x00000040
+_IN_MOVED_TO    = 0x00000080
+_IN_CREATE      = 0x00000100
+_IN_DELETE      = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW  = 0x00004000
+_IN_IGNORED     = 0x00008000
+_IN_ONLYDIR     = 0x01000000
+_IN_ISDIR       = 0x40000000
+_IN_NONBLOCK    = 0x00000800
+_IN_CLOEXEC     = 0x00080000
+_inotify = None
+_disk_cache = None
+_source_hash_dct = {}
 
 def getRelativePathFrom(src_abs_path, trg_abs_path):
     r"""Return the trg_abs_path as a relative path to src_abs_path."""
@@ -40,43 +104,126 @@ def getRelativePathFrom(src_abs_path, trg_abs_path):
     ret_path = ret_path.lstrip('/')
     return ret_path
 
+class GimmeClient(object):
+    r"""Check files in and out of gimme in batches run side by side.
+    
+    Files are passed to the tool as a ; separated argument, as many per call as fit in max_cmdline,
+    and up to concurrency calls run at once. Whether a file was checked out is read from the file
+    being writable afterwards, the tool's output lines naming a file that wasn't are kept in errors.
+    
+    Keyword arguments:
+    tool         -- Path of the gimme executable. (default $GIMME or GIMME)
+    concurrency  -- The number of tool processes run at once. (default 4)
+    batch_size   -- The most files passed to one call. (default None, only limited by max_cmdline)
+    max_cmdline  -- The longest command line made, Windows allows 32767 characters. (default MAX_CMDLINE)
+    
+    Attributes:
+    errors       -- {path : [output lines]} of the files the last call failed on.
+    returncodes  -- The exit codes of the tool calls of the last call.
+    
+    Methods:
+    checkOut()   -- Check out files and return the ones that became writable.
+    unCheckOut() -- Undo the checkout of files and return the ones that became read only.
+    stat()       -- Return the tool's status output for a file.
+    """
+    CHECKOUT_ARGS = ['-nowarn', '-quiet', '-ignoreerrors', '-editor', 'null']
+    UNDO_ARGS = ['-undo']
+    MAX_CMDLINE = 30000
+    
+    def __init__(self, tool = None, concurrency = 4, batch_size = None, max_cmdline = MAX_CMDLINE):
+        self.tool = tool or os.environ.get('GIMME', GIMME)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_cmdline = max_cmdline
+        self.errors = {}
+        self.returncodes = []
+    
+    def getBatches(self, args, fpn_ls):
+        r"""Split fpn_ls into lists that each fit one command line of the tool with args."""
+        base_len = len(subprocess.list2cmdline([self.tool] + args)) + 3
+        batch_ls = []
+        batch = []
+        batch_len = base_len
+        for fpn in fpn_ls:
+            fpn_len = len(fpn) + 1
+            if batch and (batch_len + fpn_len > self.max_cmdline or len(batch) == self.batch_size):
+                batch_ls.append(batch)
+                batch = []
+                batch_len = base_len
+            batch.append(fpn)
+            batch_len += fpn_len
+        if batch:
+            batch_ls.append(batch)
+        return batch_ls
+    
+    def _runBatch(self, args_batch):
+        r"""Run the tool on a batch and return (returncode, [output lines]), returncode None if it couldn't start."""
+        args, batch = args_batch
+        try:
+            proc = subprocess.Popen([self.tool] + args + [';'.join(batch)], stdout = subprocess.PIPE, stderr = subprocess.STDOUT)
+            output = proc.communicate()[0]
+        except OSError as e:
+            return None, [str(e)]
+        return proc.returncode, output.splitlines()
+    
+    def run(self, args, fpn_ls, writable):
+        r"""Run the tool with args on fpn_ls in batches and return the files that are writable afterwards if writable
+        is True, or read only afterwards if it's False."""
+        self.errors = {}
+        self.returncodes = []
+        if not fpn_ls:
+            return []
+        batch_ls = self.getBatches(args, fpn_ls)
+        if self.concurrency > 1 and len(batch_ls) > 1:
+            pool = ThreadPool(min(self.concurrency, len(batch_ls)))
+            try:
+                result_ls = pool.map(self._runBatch, [(args, x) for x in batch_ls])
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            result_ls = [self._runBatch((args, x)) for x in batch_ls]
+        ret_ls = []
+        for batch, (returncode, line_ls) in zip(batch_ls, result_ls):
+            self.returncodes.append(returncode)
+            for fpn in batch:
+                if os.access(fpn, os.W_OK) == writable:
+                    ret_ls.append(fpn)
+                    continue
+                name = os.path.basename(fpn).lower()
+                self.errors[fpn] = [x for x in line_ls if name in x.lower()] or line_ls
+        return ret_ls
+    
+    def checkOut(self, fpn_ls):
+        r"""Check out the read only files in fpn_ls and return the ones that became writable."""
+        return self.run(self.CHECKOUT_ARGS, [x for x in fpn_ls if not os.access(x, os.W_OK)], True)
+    
+    def unCheckOut(self, fpn_ls):
+        r"""Undo the checkout of the writable files in fpn_ls and return the ones that became read only."""
+        return self.run(self.UNDO_ARGS, [x for x in fpn_ls if os.access(x, os.W_OK)], False)
+    
+    def stat(self, fpn):
+        r"""Return the status output of the tool for fpn."""
+        returncode, line_ls = self._runBatch((['-cstat'], [fpn]))
+        return '\n'.join(line_ls)
+
 def checkOutFile(filePath):
+    r"""Check out filePath if it's read only, return True if it's writable afterwards."""
     if os.access(filePath, os.F_OK) and not os.access(filePath, os.W_OK):
-        os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -nowarn -quiet -ignoreerrors -editor null " + "\"" +filePath + "\"")
+        GimmeClient().checkOut([filePath])
+    return os.access(filePath, os.W_OK)
 
 def statFile(filePath):
     r"""Print the stats of the file to the console."""
-    os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -cstat " + "\"" +filePath + "\"")
-
-def checkOutMany(filepath_list, batch_size = 100):
-    #filter out write_enabled files
-    filepath_list = filter(lambda x: not os.access(x, os.W_OK), filepath_list)
-    #send by batches of 50
-    while len(filepath_list) > batch_size:
-        joinpaths = ['\"'+x+'\"' for x in filepath_list[:batch_size]]
-        joinpaths = ';'.join(joinpaths)
-        os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -nowarn -quiet -ignoreerrors -editor null " + joinpaths)
-        filepath_list = filepath_list[batch_size:]
-    #send any that remain
-    if len(filepath_list):
-        joinpaths = ['\"'+x+'\"' for x in filepath_list]
-        joinpaths = ';'.join(joinpaths)
-        os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -nowarn -quiet -ignoreerrors -editor null " + joinpaths)
-
-def unCheckOutMany(filepath_list):
-    #filter out write_enabled files
-    filepath_list = filter(lambda x: os.access(x, os.W_OK), filepath_list)
-    #send by batches of 50
-    while len(filepath_list) > 50:
-        joinpaths = ['\"'+x+'\"' for x in filepath_list[:50]]
-        joinpaths = ';'.join(joinpaths)
-        os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -undo " + joinpaths)
-        filepath_list = filepath_list[50:]
-    #send any that remain
-    if len(filepath_list):
-        joinpaths = ['\"'+x+'\"' for x in filepath_list]
-        joinpaths = ';'.join(joinpaths)
-        os.system("C:\\Cryptic\\tools\\bin\\gimme.exe -undo " + joinpaths)
+    print GimmeClient().stat(filePath)
+
+def checkOutMany(filepath_list, batch_size = None, concurrency = 4):
+    r"""Check out the read only files in filepath_list and return the ones that became writable, see GimmeClient."""
+    return GimmeClient(concurrency = concurrency, batch_size = batch_size).checkOut(filepath_list)
+
+def unCheckOutMany(filepath_list, batch_size = None, concurrency = 4):
+    r"""Undo the checkout of the writable files in filepath_list and return the ones that became read only, see GimmeClient."""
+    return GimmeClient(concurrency = concurrency, batch_size = batch_size).unCheckOut(filepath_list)
 
 def canWrite(filePath):
     if os.access(filePath, os.F_OK) and not os.access(filePath, os.W_OK):
@@ -90,8 +237,11 @@ def exists(filePath):
     else:
         return False
 
-def getDirectory(filePath):
-    """Return a directory path to the file."""
+def getDirectory(filePath, check_fs = True):
+    """Return a directory path to the file.
+    With check_fs False a path is only taken as a directory if it ends in a slash, see pathtools."""
+    if not check_fs:
+        return pathtools.getDirectory(filePath)
     if os.path.isdir(filePath):
         return filePath
     return os.path.dirname(filePath)
@@ -100,51 +250,189 @@ def getFileName(filePath):
     """Return the file name given the full path."""
     return os.path.basename(filePath)
 
-def fileKey(filePath):
-    """Return the lowercase name of the file without extension."""
-    if os.path.isfile(filePath):
+def fileKey(filePath, check_fs = True):
+    """Return the lowercase name of the file without extension.
+    None if it isn't a file, unless check_fs is False."""
+    if not check_fs or os.path.isfile(filePath):
         return os.path.basename(filePath).lower().split(".")[0]
 
-def fileExt(filePath):
-    """Return the lowercase extension of the file without a dot."""
-    if os.path.isfile(filePath):
+def fileExt(filePath, check_fs = True):
+    """Return the lowercase extension of the file without a dot.
+    None if it isn't a file, unless check_fs is False."""
+    if not check_fs or os.path.isfile(filePath):
         return os.path.basename(filePath).lower().split(".")[-1]
     
 def delete(filePath):
     os.remove(filePath)
+
+def replaceFile(srcPath, trgPath):
+    r"""Move srcPath over trgPath.
+    Atomic on posix, on Windows the target has to be removed first so there's a short window without it."""
+    if os.name == 'nt' and os.path.exists(trgPath):
+        os.remove(trgPath)
+    os.rename(srcPath, trgPath)
     
-def searchFiles(directory, fileType = ".", name_srch_rgx = ".*", exact = False):
-        
-    #define vars
-    fileList = [] #will store all files found by type and filter
+def _compileFileFilter(fileType = ".", name_srch_rgx = ".*", exact = False):
+    r"""Return a function(name) -> bool matching searchFiles() semantics with the patterns compiled once.
+    A literal fileType is checked with endswith() and a '.*' name pattern is skipped, so the common
+    search by extension never touches a regex."""
+    fileType = fileType.lower()
+    if re.escape(fileType) == fileType:
+        suffix = fileType
+        ext_match = lambda name: name.endswith(suffix)
+    else:
+        ext_match = re.compile(fileType + "$").search
+    if exact:
+        exact_name = name_srch_rgx.lower()
+        return lambda name: ext_match(name) and name == exact_name
+    if name_srch_rgx == ".*":
+        return lambda name: bool(ext_match(name))
+    name_match = re.compile(name_srch_rgx.lower()).search
+    return lambda name: bool(name_match(name) and ext_match(name))
+
+def _listDirectory(directory):
+    r"""Return ([file names], [directory names to descend]) of a directory or None if it can't be listed.
+    Symlinked directories count as neither, like os.walk()."""
+    file_ls = []
+    walk_ls = []
+    try:
+        if scandir != None:
+            for entry in scandir(directory):
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        walk_ls.append(entry.name)
+                else:
+                    file_ls.append(entry.name)
+            return file_ls, walk_ls
+        names = os.listdir(directory)
+    except OSError:
+        return None
+    dir_set = set()
+    walk_set = set()
+    for name in names:
+        fpn = os.path.join(directory, name)
+        if os.path.isdir(fpn):
+            dir_set.add(name)
+            if not os.path.islink(fpn):
+                walk_set.add(name)
+    file_ls = [x for x in names if not x in dir_set]
+    walk_ls = [x for x in names if x in walk_set]
+    return file_ls, walk_ls
+
+def _scanDirectory(root, match, prune):
+    r"""Return ([matching file paths], [subdirectory paths to descend]) of root, see iterFiles()."""
+    listing = _listDirectory(root)
+    if listing == None:
+        return [], []
+    file_ls, walk_ls = listing
+    root_slash = root.replace("\\", "/")
+    fpn_ls = [root_slash + "/" + x for x in file_ls if match(x.lower())]
+    if prune:
+        walk_ls = [x for x in walk_ls if not x.lower() in prune]
+    return fpn_ls, [os.path.join(root, x) for x in walk_ls]
+
+def iterFiles(directory, fileType = ".", name_srch_rgx = ".*", exact = False, prune = None, max_depth = None):
+    r"""Yield the paths of files under directory lazily, in the same order and form as searchFiles().
+    
+    Keyword arguments:
+    fileType      -- Regex matched against the end of the lowercase file name. (default any)
+    name_srch_rgx -- Regex searched in the lowercase file name. (default any)
+    exact         -- Match name_srch_rgx as the whole file name instead.
+    prune         -- Directory names not to descend into, compared lowercase e.g. PRUNE_DIRS. (default None)
+    max_depth     -- Don't descend more than this many directories below directory, 0 is directory only. (default None)"""
+    match = _compileFileFilter(fileType, name_srch_rgx, exact)
+    prune = set([x.lower() for x in prune]) if prune else None
+    stack = [(directory, 0)]
+    while stack:
+        root, depth = stack.pop()
+        fpn_ls, dir_ls = _scanDirectory(root, match, prune)
+        for fpn in fpn_ls:
+            yield fpn
+        if max_depth == None or depth < max_depth:
+            stack.extend([(x, depth + 1) for x in reversed(dir_ls)])
+
+def iterFilesParallel(directory, fileType = ".", name_srch_rgx = ".*", exact = False, prune = None, max_depth = None, threads = 8, ordered = False):
+    r"""Yield the paths of files under directory, listing directories in a pool of threads.
+    Worth it where each listing is a round trip, e.g. SMB/NFS shares. Arguments are those of iterFiles().
+    
+    Keyword arguments:
+    threads -- The number of directories listed at once. (default 8)
+    ordered -- Yield in iterFiles() order once the walk is done, instead of as directories complete. (default False)"""
+    match = _compileFileFilter(fileType, name_srch_rgx, exact)
+    prune = set([x.lower() for x in prune]) if prune else None
+    work = Queue.Queue()
+    done = Queue.Queue()
+    stop = threading.Event()
+    def worker():
+        while True:
+            item = work.get()
+            if item == None or stop.is_set():
+                return
+            root, depth = item
+            try:
+                fpn_ls, dir_ls = _scanDirectory(root, match, prune)
+            except Exception as e:
+                done.put((root, None, None, e))
+                continue
+            if max_depth != None and depth >= max_depth:
+                dir_ls = []
+            for sub in dir_ls:
+                work.put((sub, depth + 1))
+            done.put((root, fpn_ls, dir_ls, None))
+    thread_ls = [threading.Thread(target = worker) for i in xrange(max(1, threads))]
+    for thread in thread_ls:
+        thread.daemon = True
+        thread.start()
+    work.put((directory, 0))
+    pending = 1
+    listing_dct = {}
+    try:
+        while pending:
+            root, fpn_ls, dir_ls, error = done.get()
+            if error != None:
+                raise error
+            pending += len(dir_ls) - 1
+            if ordered:
+                listing_dct[root] = (fpn_ls, dir_ls)
+                continue
+            for fpn in fpn_ls:
+                yield fpn
+    finally:
+        stop.set()
+        for thread in thread_ls:
+            work.put(None)
+    if ordered:
+        stack = [directory]
+        while stack:
+            fpn_ls, dir_ls = listing_dct.pop(stack.pop())
+            for fpn in fpn_ls:
+                yield fpn
+            stack.extend(reversed(dir_ls))
+
+def searchFiles(directory, fileType = ".", name_srch_rgx = ".*", exact = False, prune = None, max_depth = None, threads = None):
+    r"""Return a list of the paths of files under directory, see iterFiles().
+    With threads the directories are listed in parallel, see iterFilesParallel(). The result is the same."""
     print "searching for "+fileType+" files...",
     if exact:
         print "\twith exact name: "+name_srch_rgx
     if name_srch_rgx != ".*":
         print "\tfor "+name_srch_rgx+" in the name...",
-    #search files by type and filter
-    for root, dirs, files in os.walk(directory, topdown=True):
-        for each in files:
-            #re.search takes 2 strings as arguments, if the first string is found in the second, returns true
-            #str.lower() converts all values in the string to lowercase to avoid case mismatch
-            if exact:
-                if re.search((fileType.lower()+"$"), each.lower()):
-                    if each.lower() == name_srch_rgx.lower():
-                        fileList.append(root+"/"+each)
-            elif re.search(name_srch_rgx.lower(), each.lower()) and re.search((fileType.lower()+"$"), each.lower()):
-                #add files to the list with their path
-                fileList.append(root+"/"+each)
+    if threads:
+        fileList = list(iterFilesParallel(directory, fileType, name_srch_rgx, exact, prune, max_depth, threads, ordered = True))
+    else:
+        fileList = list(iterFiles(directory, fileType, name_srch_rgx, exact, prune, max_depth))
     print "complete"
-    for index in xrange(len(fileList)):
-        fileList[index] = fileList[index].replace("\\","/")
     return fileList
 
-def searchFilesToDict(directory, fileType = ".", name_srch_rgx = ".*", exact = False):
+def searchFilesToDict(directory, fileType = ".", name_srch_rgx = ".*", exact = False, prune = None, max_depth = None, threads = None):
     r"""Search for files and return a dictionary of paths with lowercase filename without extension as keys."""
     return groupFilesByNameFlat(searchFiles(directory      = directory,
                                             fileType       = fileType,
                                             name_srch_rgx  = name_srch_rgx,
-                                            exact          = exact))
+                                            exact          = exact,
+                                            prune          = prune,
+                                            max_depth      = max_depth,
+                                            threads        = threads))
 
 def waitForFile(fp,mx=5,incr=.1):
     """
@@ -153,18 +441,243 @@ def waitForFile(fp,mx=5,incr=.1):
     return True if file becomes writeable before time runs out, False otherwise
     
     """
-    w = False
-    while((not os.access(fp, os.W_OK)) and (mx > 0)):
-        sleep(incr)
-        mx -= incr
-    if os.access(fp, os.W_OK):
-        w = True
-    return w
+    for fpn in waitForFiles([fp], mx, poll = incr, max_poll = incr):
+        return True
+    return False
+
+def waitForFiles(fpn_ls, timeout = 5, writable = True, poll = .01, max_poll = 1.0):
+    r"""Yield each path in fpn_ls as it becomes ready, until all have or timeout seconds pass.
+    Paths that are ready already are yielded first, in order, then the rest as they get ready.
+    Whatever wasn't yielded when the generator ends wasn't ready at the deadline.
+    
+    On Linux the directories of the paths are watched with inotify, so a path is yielded as soon as
+    it's created, written or its permissions change. Paths are also polled, every poll seconds at first
+    and doubling up to max_poll, which is all there is elsewhere or on shares inotify doesn't see.
+    
+    Keyword arguments:
+    timeout   -- Seconds to wait for all the paths, from the call. (default 5)
+    writable  -- Wait for the paths to be writable, else only for them to exist. (default True)
+    poll      -- First polling interval in seconds. (default .01)
+    max_poll  -- Longest polling interval in seconds. (default 1.0)
+    """
+    deadline = time.time() + timeout
+    mode = os.W_OK if writable else os.F_OK
+    pending_ls = []
+    for fpn in fpn_ls:
+        if os.access(fpn, mode):
+            yield fpn
+        else:
+            pending_ls.append(fpn)
+    if not pending_ls:
+        return
+    #directory : {name : [paths]} for the inotify events to look up
+    dir_dct = {}
+    for fpn in pending_ls:
+        directory, name = os.path.split(os.path.abspath(fpn))
+        dir_dct.setdefault(directory, {}).setdefault(name, []).append(fpn)
+    pending = set(pending_ls)
+    fd = None
+    wd_dct = {}
+    libc = _loadInotify()
+    if libc != None:
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if fd < 0:
+            fd = None
+        else:
+            for directory in dir_dct:
+                wd = libc.inotify_add_watch(fd, directory, _IN_CREATE | _IN_MOVED_TO | _IN_CLOSE_WRITE | _IN_ATTRIB | _IN_ONLYDIR)
+                if wd >= 0:
+                    wd_dct[wd] = directory
+    try:
+        interval = poll
+        next_poll = time.time() + interval
+        while pending:
+            now = time.time()
+            if now >= deadline:
+                #a last look, a path may have got ready since the last poll
+                for fpn in pending_ls:
+                    if fpn in pending and os.access(fpn, mode):
+                        pending.discard(fpn)
+                        yield fpn
+                return
+            wait = max(0, min(next_poll, deadline) - now)
+            ready = set()
+            if wd_dct:
+                if select.select([fd], [], [], wait)[0]:
+                    for wd, mask, name in _readInotifyEvents(fd):
+                        for fpn in dir_dct.get(wd_dct.get(wd), {}).get(name, ()):
+                            if fpn in pending and os.access(fpn, mode):
+                                ready.add(fpn)
+            else:
+                sleep(wait)
+            if time.time() >= next_poll:
+                ready.update([fpn for fpn in pending if os.access(fpn, mode)])
+                interval = min(interval * 2, max_poll)
+                next_poll = time.time() + interval
+            for fpn in pending_ls:
+                if fpn in ready and fpn in pending:
+                    pending.discard(fpn)
+                    yield fpn
+            if ready:
+                pending_ls = [fpn for fpn in pending_ls if fpn in pending]
+    finally:
+        if fd != None:
+            os.close(fd)
 
 def genUID(s,l):
     hashedLogName = hashlib.sha1(s).hexdigest()
     return hashedLogName[:l]
 
+def hashFile(fpn, algorithm = 'sha1', use_mmap = False, partial = None):
+    r"""Return the hex digest of the content of fpn, read HASH_CHUNK bytes at a time.
+    
+    Keyword arguments:
+    algorithm  -- A hashlib algorithm name. (default sha1)
+    use_mmap   -- Map the file and hash it in one call instead of reading it in chunks. (default False)
+    partial    -- Only hash the first and last partial bytes, files up to twice that are hashed
+                  whole so their partial hash is also their full hash. (default None)"""
+    h = hashlib.new(algorithm)
+    with open(fpn, 'rb') as f:
+        if partial != None:
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(0)
+            if size > 2 * partial:
+                h.update(f.read(partial))
+                f.seek(-partial, 2)
+                h.update(f.read(partial))
+                return h.hexdigest()
+        if use_mmap:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                #empty files can't be mapped
+                m = None
+            if m != None:
+                try:
+                    h.update(m)
+                finally:
+                    m.close()
+                return h.hexdigest()
+        for chunk in iter(lambda: f.read(HASH_CHUNK), ''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def hashFiles(fpn_ls, threads = 8, algorithm = 'sha1', use_mmap = False, partial = None, cache = None):
+    r"""Return {path : hex digest} of the files in fpn_ls hashed in a pool of threads, see hashFile().
+    Files that can't be read are left out.
+    
+    Keyword arguments:
+    threads  -- The number of files hashed at once, hashlib and file reads release the GIL. (default 8)
+    cache    -- A HashCache to reuse and remember the hashes in. (default None)"""
+    kind = algorithm if partial == None else '{}:{}'.format(algorithm, partial)
+    def work(fpn):
+        try:
+            st = os.stat(fpn)
+            if cache != None:
+                digest = cache.get(fpn, kind, st)
+                if digest != None:
+                    return fpn, digest
+            digest = hashFile(fpn, algorithm, use_mmap, partial)
+        except EnvironmentError:
+            return fpn, None
+        if cache != None:
+            cache.set(fpn, kind, st, digest)
+        return fpn, digest
+    if threads and threads > 1 and len(fpn_ls) > 1:
+        pool = ThreadPool(threads)
+        try:
+            result_ls = pool.map(work, fpn_ls)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        result_ls = [work(x) for x in fpn_ls]
+    return dict([x for x in result_ls if x[1] != None])
+
+def findDuplicates(fpn_ls, threads = 8, algorithm = 'sha1', partial = PARTIAL_HASH_SIZE, use_mmap = False, cache = None):
+    r"""Return the groups of identical files among fpn_ls e.g. findDuplicates(searchFiles(root, 'tga')).
+    
+    Files are grouped by size, groups are split by a hash of each file's first and last partial bytes,
+    and only files still sharing a group are hashed in full. Returns [[path,..],..], each group sorted,
+    largest files first. Keyword arguments are those of hashFiles()."""
+    size_dct = {}
+    for fpn in set(fpn_ls):
+        try:
+            size_dct.setdefault(os.path.getsize(fpn), []).append(fpn)
+        except OSError:
+            continue
+    def split(group_ls, hash_partial):
+        hash_dct = hashFiles([x for size, group in group_ls if size for x in group], threads, algorithm, use_mmap, hash_partial, cache)
+        split_ls = []
+        for size, group in group_ls:
+            if size == 0:
+                split_ls.append((size, group))
+                continue
+            by_hash = {}
+            for fpn in group:
+                if fpn in hash_dct:
+                    by_hash.setdefault(hash_dct[fpn], []).append(fpn)
+            split_ls.extend([(size, x) for x in by_hash.itervalues() if len(x) > 1])
+        return split_ls
+    group_ls = split([(size, group) for size, group in size_dct.iteritems() if len(group) > 1], partial)
+    #Files up to 2 * partial were hashed whole already.
+    group_ls = ([x for x in group_ls if x[0] <= 2 * partial] +
+                split([x for x in group_ls if x[0] > 2 * partial], None))
+    return [sorted(group) for size, group in sorted(group_ls, key = lambda x: (-x[0], sorted(x[1])))]
+
+class HashCache(object):
+    r"""File hashes remembered while the file's size and mtime don't change, see hashFiles().
+    
+    Keyword arguments:
+    cache_fpn  -- A json the hashes are loaded from and save()d to. (default None, in memory only)
+    
+    Methods:
+    get()      -- Return a remembered hash of a file or None.
+    set()      -- Remember a hash of a file.
+    load()     -- Load the hashes from cache_fpn.
+    save()     -- Write the hashes to cache_fpn.
+    """
+    CACHE_VERSION = 1
+    
+    def __init__(self, cache_fpn = None):
+        self.cache_fpn = cache_fpn
+        self.entries = {}
+        self._lock = threading.Lock()
+        if cache_fpn and os.access(cache_fpn, os.F_OK):
+            self.load()
+    
+    def get(self, fpn, kind, st):
+        r"""Return the kind of hash of fpn if it was taken at the os.stat() st, None otherwise."""
+        entry = self.entries.get(fpn)
+        if entry == None or entry[0] != st.st_size or entry[1] != st.st_mtime:
+            return None
+        return entry[2].get(kind)
+    
+    def set(self, fpn, kind, st, digest):
+        r"""Remember digest as the kind of hash of fpn at the os.stat() st."""
+        with self._lock:
+            entry = self.entries.get(fpn)
+            if entry == None or entry[0] != st.st_size or entry[1] != st.st_mtime:
+                entry = self.entries[fpn] = [st.st_size, st.st_mtime, {}]
+            entry[2][kind] = digest
+    
+    def load(self):
+        r"""Load the hashes from cache_fpn, ignoring a cache of another version."""
+        with open(self.cache_fpn, 'r') as f:
+            data = json.load(f)
+        if data.get('version') == self.CACHE_VERSION:
+            self.entries = data['entries']
+    
+    def save(self):
+        r"""Write the hashes to cache_fpn."""
+        with self._lock:
+            text = json.dumps({'version' : self.CACHE_VERSION, 'entries' : self.entries})
+        tmp_fpn = self.cache_fpn + '.tmp'
+        with open(tmp_fpn, 'w') as f:
+            f.write(text)
+        replaceFile(tmp_fpn, self.cache_fpn)
+
 class Config_Data(object):
     def __init__(self,fp):
         self.fp = fp
@@ -190,20 +703,35 @@ class Config_Data(object):
 
 
 class FileList(object):
-    """gets a list of files based on extension and stores/loads them from a .txt
-    to avoid unnecessary searches."""
+    """gets a list of files based on extension and stores/loads them from a manifest
+    to avoid unnecessary searches.
+    
+    The manifest is a json index of every directory walked with its mtime, subdirectories and
+    the matching files' size and mtime. Loading it re-lists only the directories whose mtime changed,
+    adding or removing a file changes its directory's mtime, editing one in place does not.
+    Manifests of plain paths from older versions are still read, the next update rewrites them."""
     
-    def __init__(self, root, ext, manifest, regex = ".*"):
+    MANIFEST_VERSION = 1
+    
+    def __init__(self, root, ext, manifest, regex = ".*", refresh = True):
         self.ext        = ext
         self.root       = root
         self.regex      = regex
         self.manifest   = manifest
         self.fp_list    = []
+        self.dir_dct    = {}
+        self._match     = _compileFileFilter(self.ext, self.regex)
+        self._ext_dct   = None
+        self._key_dct   = None
+        self._stat_dct  = None
         if not os.access(self.manifest, os.F_OK):
-            self.fp_list = searchFiles(self.root, self.ext, self.regex)
-            self.saveFileList()
+            self.updateManifest()
         else:
             self.loadFileList()
+            if not self.dir_dct and not self.fp_list:
+                self.updateManifest()
+            elif refresh and self.dir_dct and self.refresh():
+                self.saveFileList()
     
     def __printFileFromPath(self, fp):
         fname = os.path.basename(fp)
@@ -224,23 +752,117 @@ class FileList(object):
     def __getFileFromIndex(self, index):
         fp = self.fp_list[index]
         return self.__getFileFromPath(fp)
+    
+    def _indexDirectory(self, directory, dir_mtime):
+        r"""List directory into dir_dct and return its subdirectories."""
+        fpn_ls, sub_ls = _scanDirectory(directory, self._match, None)
+        file_ls = []
+        for fpn in fpn_ls:
+            try:
+                st = os.stat(fpn)
+            except OSError:
+                continue
+            file_ls.append([fpn, st.st_size, st.st_mtime])
+        self.dir_dct[directory] = {'mtime' : dir_mtime, 'dirs' : sub_ls, 'files' : file_ls}
+        return sub_ls
+    
+    def _removeDirectory(self, directory):
+        r"""Drop directory and everything under it from dir_dct and return the directories dropped."""
+        removed_ls = []
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            entry = self.dir_dct.pop(directory, None)
+            if entry != None:
+                removed_ls.append(directory)
+                stack.extend(entry['dirs'])
+        return removed_ls
+    
+    def _buildFileList(self):
+        r"""Set fp_list from dir_dct in searchFiles() order."""
+        fp_list = []
+        stack = [self.root]
+        while stack:
+            entry = self.dir_dct.get(stack.pop())
+            if entry == None:
+                continue
+            fp_list.extend([x[0] for x in entry['files']])
+            stack.extend(reversed(entry['dirs']))
+        self.fp_list = fp_list
+        self._ext_dct = None
+        self._key_dct = None
+        self._stat_dct = None
+    
+    def _refreshTree(self, directory):
+        r"""Re-list the changed directories under directory without rebuilding fp_list, see refresh()."""
+        changed = 0
+        stack = [directory]
+        while stack:
+            directory = stack.pop()
+            entry = self.dir_dct.get(directory)
+            try:
+                dir_mtime = os.stat(directory).st_mtime
+            except OSError:
+                if entry != None:
+                    self._removeDirectory(directory)
+                    changed += 1
+                continue
+            if entry != None and entry['mtime'] == dir_mtime:
+                stack.extend(reversed(entry['dirs']))
+                continue
+            sub_ls = self._indexDirectory(directory, dir_mtime)
+            changed += 1
+            if entry != None:
+                for sub in set(entry['dirs']).difference(sub_ls):
+                    self._removeDirectory(sub)
+            stack.extend(reversed(sub_ls))
+        return changed
+    
+    def refresh(self, directory = None):
+        r"""Re-list the directories whose mtime changed since the index was made.
+        Return the number of directories listed or dropped.
         
+        Keyword arguments:
+        directory -- Only check this indexed directory and the ones under it. (default root)"""
+        changed = self._refreshTree(self.root if directory == None else directory)
+        if changed:
+            self._buildFileList()
+        return changed
     
     def saveFileList(self):
-        """Save the list of files into a txt to avoid searching over and over."""
-        with open(self.manifest, "w") as f:
-            for fp in self.fp_list:
-                f.write(fp+"\n")
+        """Save the index of files into a json to avoid searching over and over."""
+        data = {'version' : self.MANIFEST_VERSION,
+                'root'    : self.root,
+                'ext'     : self.ext,
+                'regex'   : self.regex,
+                'dirs'    : self.dir_dct}
+        tmp_fpn = self.manifest + '.tmp'
+        with open(tmp_fpn, "w") as f:
+            f.write(json.dumps(data))
+        replaceFile(tmp_fpn, self.manifest)
 
     def loadFileList(self):
-        """Return a list of file paths from a file."""
+        """Load the index of files from the manifest, or the list of paths if it's an old one."""
         with open(self.manifest, "r") as f:
-            for line in f:
-                self.fp_list.append(line.strip())
+            text = f.read()
+        if text.startswith('{'):
+            data = json.loads(text)
+            if (data.get('version') == self.MANIFEST_VERSION and
+                [data.get('root'), data.get('ext'), data.get('regex')] == [self.root, self.ext, self.regex]):
+                self.dir_dct = data['dirs']
+                self._buildFileList()
+                return
+            self.dir_dct = {}
+            self.fp_list = []
+            return
+        self.dir_dct = {}
+        self.fp_list = [x.strip() for x in text.splitlines() if x.strip()]
                 
     def updateManifest(self):
         """Do another search for the files and update the manifest"""
-        self.fp_list = searchFiles(self.root, self.ext, self.regex)
+        self.dir_dct = {}
+        self.refresh()
+        self._buildFileList()
         self.saveFileList()
         
     def printFile(self, arg):
@@ -252,7 +874,33 @@ class FileList(object):
         
     def filter(self, rgx):
         """return a list of files who's basename is a regexmatch"""
-        return filter(lambda x: re.match(rgx, os.path.basename(x)), self.fp_list)
+        match = re.compile(rgx).match
+        return [x for x in self.fp_list if match(os.path.basename(x))]
+    
+    def getFilesByExt(self, ext):
+        """Return a list of files with the lowercase extension ext."""
+        if self._ext_dct == None:
+            self._ext_dct = {}
+            for fp in self.fp_list:
+                self._ext_dct.setdefault(os.path.basename(fp).lower().split(".")[-1], []).append(fp)
+        return list(self._ext_dct.get(ext.lower().lstrip('.'), []))
+    
+    def getFilesByKey(self, key):
+        """Return a list of files with the name key, see fileKey()."""
+        if self._key_dct == None:
+            self._key_dct = {}
+            for fp in self.fp_list:
+                self._key_dct.setdefault(os.path.basename(fp).lower().split(".")[0], []).append(fp)
+        return list(self._key_dct.get(key.lower(), []))
+    
+    def getStat(self, fp):
+        """Return the [size, mtime] of a file as of the last refresh, or None if it isn't indexed."""
+        if self._stat_dct == None:
+            self._stat_dct = {}
+            for entry in self.dir_dct.itervalues():
+                for fpn, size, mtime in entry['files']:
+                    self._stat_dct[fpn] = [size, mtime]
+        return self._stat_dct.get(fp)
     
     def getFile(self, arg):
         """Return the contents of a file at index."""
@@ -270,6 +918,254 @@ class FileList(object):
         '''Return a list of files.'''
         return self.fp_list
 
+def _loadInotify():
+    r"""Return libc if it has inotify, None otherwise."""
+    global _inotify
+    if _inotify == None:
+        _inotify = False
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno = True)
+                libc.inotify_init1.argtypes = [ctypes.c_int]
+                libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+                libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+                _inotify = libc
+            except (OSError, AttributeError):
+                pass
+    return _inotify or None
+
+def _readInotifyEvents(fd):
+    r"""Return the [(wd, mask, name)] waiting on a non blocking inotify descriptor."""
+    chunk_ls = []
+    while True:
+        try:
+            chunk = os.read(fd, 65536)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                break
+            raise
+        if not chunk:
+            break
+        chunk_ls.append(chunk)
+    data = ''.join(chunk_ls)
+    event_ls = []
+    offset = 0
+    while offset + 16 <= len(data):
+        wd, mask, cookie, length = struct.unpack_from('iIII', data, offset)
+        event_ls.append((wd, mask, data[offset + 16:offset + 16 + length].rstrip('\0')))
+        offset += 16 + length
+    return event_ls
+
+class WatchedFileList(FileList):
+    """A FileList kept up to date while the program runs, for tools that query the same root all day.
+    
+    On Linux the directories are watched with inotify and each create, delete, move or write is applied
+    to the index as it arrives. Elsewhere, or with poll, refresh() runs every interval. When the kernel's
+    event queue overflows the index is refresh()ed, re-listing only the directories that changed.
+    Queries are safe from any thread.
+    
+    Counters:
+    events    -- inotify events applied.
+    rescans   -- Directories re-listed because of a new directory, an overflow or a poll.
+    overflows -- Times the event queue overflowed."""
+    
+    WATCH_MASK = (_IN_CREATE | _IN_DELETE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CLOSE_WRITE |
+                  _IN_ATTRIB | _IN_DELETE_SELF | _IN_ONLYDIR)
+    
+    def __init__(self, root, ext, manifest, regex = ".*", interval = 1.0, poll = False, start = True):
+        self._lock       = threading.RLock()
+        self._stop       = threading.Event()
+        self._thread     = None
+        self._fd         = None
+        self._wd_dct     = {}
+        self._dir_wd_dct = {}
+        self.interval    = interval
+        self.poll        = poll or _loadInotify() == None
+        super(WatchedFileList, self).__init__(root, ext, manifest, regex)
+        self.events      = 0
+        self.rescans     = 0
+        self.overflows   = 0
+        if start:
+            self.start()
+    
+    def _indexDirectory(self, directory, dir_mtime):
+        #Watch before listing so nothing made in between is missed.
+        self._addWatch(directory)
+        return super(WatchedFileList, self)._indexDirectory(directory, dir_mtime)
+    
+    def _removeDirectory(self, directory):
+        removed_ls = super(WatchedFileList, self)._removeDirectory(directory)
+        for directory in removed_ls:
+            wd = self._dir_wd_dct.pop(directory, None)
+            if wd != None:
+                self._wd_dct.pop(wd, None)
+                _loadInotify().inotify_rm_watch(self._fd, wd)
+        return removed_ls
+    
+    def _addWatch(self, directory):
+        if self._fd == None:
+            return
+        wd = _loadInotify().inotify_add_watch(self._fd, directory, self.WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err in (errno.ENOENT, errno.ENOTDIR):
+                return
+            #Out of watches (fs.inotify.max_user_watches) or not allowed, poll instead.
+            self._closeInotify()
+            self.poll = True
+            return
+        self._wd_dct[wd] = directory
+        self._dir_wd_dct[directory] = wd
+    
+    def _closeInotify(self):
+        if self._fd != None:
+            os.close(self._fd)
+        self._fd = None
+        self._wd_dct = {}
+        self._dir_wd_dct = {}
+    
+    def _readEvents(self):
+        r"""Return the [(wd, mask, name)] waiting on the inotify descriptor."""
+        return _readInotifyEvents(self._fd)
+    
+    def _applyEvent(self, wd, mask, name):
+        r"""Apply one inotify event to dir_dct and return the directory it changed, if any."""
+        if mask & _IN_Q_OVERFLOW:
+            self.overflows += 1
+            self.rescans += self._refreshTree(self.root)
+            return None
+        directory = self._wd_dct.get(wd)
+        if mask & _IN_IGNORED:
+            if directory != None and self._dir_wd_dct.get(directory) == wd:
+                del self._dir_wd_dct[directory]
+            self._wd_dct.pop(wd, None)
+            return None
+        if directory == None:
+            return None
+        if mask & _IN_DELETE_SELF:
+            if directory == self.root:
+                self._removeDirectory(directory)
+            return None
+        entry = self.dir_dct.get(directory)
+        if entry == None:
+            return None
+        added = mask & (_IN_CREATE | _IN_MOVED_TO | _IN_CLOSE_WRITE | _IN_ATTRIB)
+        if mask & _IN_ISDIR:
+            path = os.path.join(directory, name)
+            if added and not path in entry['dirs']:
+                entry['dirs'].append(path)
+                self.rescans += self._refreshTree(path)
+            elif mask & (_IN_DELETE | _IN_MOVED_FROM) and path in entry['dirs']:
+                entry['dirs'].remove(path)
+                self._removeDirectory(path)
+            return directory
+        if not self._match(name.lower()):
+            return directory
+        fpn = directory.replace("\\", "/") + "/" + name
+        file_ls = entry['files']
+        fpn_ls = [x[0] for x in file_ls]
+        index = fpn_ls.index(fpn) if fpn in fpn_ls else None
+        st = None
+        if added:
+            try:
+                st = os.stat(fpn)
+            except OSError:
+                pass
+            if st != None and os.path.isdir(fpn):
+                st = None
+        if st == None:
+            if index != None:
+                del file_ls[index]
+        elif index == None:
+            file_ls.append([fpn, st.st_size, st.st_mtime])
+        else:
+            file_ls[index] = [fpn, st.st_size, st.st_mtime]
+        return directory
+    
+    def processEvents(self, timeout = 0):
+        r"""Apply the changes waiting, blocking up to timeout seconds for them to arrive.
+        Return the number of events applied, or when polling the number of directories re-listed."""
+        if self.poll:
+            if timeout:
+                self._stop.wait(timeout)
+            with self._lock:
+                changed = self._refreshTree(self.root)
+                self.rescans += changed
+                if changed:
+                    self._buildFileList()
+            return changed
+        if not select.select([self._fd], [], [], timeout)[0]:
+            return 0
+        with self._lock:
+            event_ls = self._readEvents()
+            touched = set()
+            for wd, mask, name in event_ls:
+                touched.add(self._applyEvent(wd, mask, name))
+            #Keep the directory mtimes current so a reload of the saved manifest doesn't re-list them.
+            for directory in touched:
+                if directory in self.dir_dct:
+                    try:
+                        self.dir_dct[directory]['mtime'] = os.stat(directory).st_mtime
+                    except OSError:
+                        pass
+            self.events += len(event_ls)
+            self._buildFileList()
+        return len(event_ls)
+    
+    def start(self):
+        r"""Start watching in a background thread."""
+        with self._lock:
+            if not self.poll and self._fd == None:
+                fd = _loadInotify().inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+                if fd < 0:
+                    self.poll = True
+                else:
+                    self._fd = fd
+                    for directory in self.dir_dct.keys():
+                        self._addWatch(directory)
+                    #Pick up anything that changed before the watches were in place.
+                    self.refresh()
+        if self._thread == None:
+            self._stop.clear()
+            self._thread = threading.Thread(target = self._run)
+            self._thread.daemon = True
+            self._thread.start()
+    
+    def _run(self):
+        while not self._stop.is_set():
+            self.processEvents(self.interval)
+    
+    def stop(self, save = True):
+        r"""Stop watching and save the manifest if save."""
+        self._stop.set()
+        if self._thread != None:
+            self._thread.join()
+            self._thread = None
+        with self._lock:
+            self._closeInotify()
+            if save:
+                self.saveFileList()
+    
+    def filter(self, rgx):
+        with self._lock:
+            return super(WatchedFileList, self).filter(rgx)
+    
+    def getFilesByExt(self, ext):
+        with self._lock:
+            return super(WatchedFileList, self).getFilesByExt(ext)
+    
+    def getFilesByKey(self, key):
+        with self._lock:
+            return super(WatchedFileList, self).getFilesByKey(key)
+    
+    def getStat(self, fp):
+        with self._lock:
+            return super(WatchedFileList, self).getStat(fp)
+    
+    def getFiles(self):
+        with self._lock:
+            return list(self.fp_list)
+
 def writedict(dictionary, filepath, sort = True):
     r"""Format a dictionary into a text file in a simple tabbed hierarchy.
     
@@ -310,30 +1206,58 @@ def writedict(dictionary, filepath, sort = True):
 
 #FILE PARSING UTILITIES
 def readFile(filepath, strip_nl = False):
-    r"""Return a list of lines from a file.
+    r"""Return a list of lines from a file, see iterLines() to stream them instead.
     Arguments:
     filepath -- The path to the file.
     Keyword Arguments:
     strip_nl -- If True will strip the new line chars from each line. (default: False)"""
-    f = open(filepath, 'r')
-    lines = f.readlines()
-    f.close()
-    if strip_nl:
-        lines = [x.strip('\n') for x in lines]
-    return lines
+    return list(iterLines(filepath, strip_nl))
+
+def iterLines(filepath, strip_nl = False, buffer_size = LINE_BUFFER, use_mmap = False, encoding = None):
+    r"""Lazily yield the lines of a file like readFile(), holding one buffer of it in memory at a time.
+    Arguments:
+    filepath -- The path to the file.
+    Keyword Arguments:
+    strip_nl    -- If True will strip the new line chars from each line. (default: False)
+    buffer_size -- Bytes read from the file at a time. (default LINE_BUFFER)
+    use_mmap    -- Map the file and let the OS page it in instead of reading it. (default False)
+    encoding    -- Decode each line from this encoding as it's yielded, else yield str. (default None)"""
+    with open(filepath, 'r', buffer_size) as f:
+        m = None
+        if use_mmap:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                #empty files can't be mapped
+                m = None
+        if m != None:
+            #the map is raw bytes, translate new lines the way text mode would
+            crlf = os.linesep == '\r\n'
+            try:
+                for line in iter(m.readline, ''):
+                    if crlf and line.endswith('\r\n'):
+                        line = line[:-2] + '\n'
+                    if strip_nl:
+                        line = line.strip('\n')
+                    yield unicode(line, encoding) if encoding else line
+            finally:
+                m.close()
+            return
+        for line in f:
+            if strip_nl:
+                line = line.strip('\n')
+            yield unicode(line, encoding) if encoding else line
 
 def readCSV(filepath, delimiter = ','):
-    r"""Return a rectangular list from a csv.
+    r"""Return a rectangular list from a csv, see iterCSV() to stream it instead.
     delimiter  -- use this token to split the columns. (default = ,)."""
-    f = open(filepath, 'r')
-    lines = f.readlines()
-    f.close()
-    rows = []
-    for line in lines:
-        line = line.replace(' ','').strip()
-        columns = [x for x in line.split(delimiter)]
-        rows.append(columns)
-    return rows
+    return list(iterCSV(filepath, delimiter))
+
+def iterCSV(filepath, delimiter = ',', buffer_size = LINE_BUFFER, use_mmap = False, encoding = None):
+    r"""Lazily yield the rows of a csv like readCSV(), with spaces removed and split by delimiter.
+    The keyword arguments are passed to iterLines()."""
+    for line in iterLines(filepath, False, buffer_size, use_mmap, encoding):
+        yield line.replace(' ','').strip().split(delimiter)
 
 def writeCSV(filepath, nestedlist, delimiter = ','):
     r"""Write a nested list into a csv."""
@@ -377,86 +1301,313 @@ def writeListDict(fobject, somedict, label):
         fobject.write('\t'+'\n\t'.join(v))
     return fobject
 
+def getSourceHash(func):
+    r"""Return a sha1 of the source of func, or of its bytecode where the source isn't available."""
+    code = getattr(func, '__code__', func)
+    if code in _source_hash_dct:
+        return _source_hash_dct[code]
+    try:
+        source = inspect.getsource(func)
+    except (IOError, TypeError):
+        source = code.co_code if code != func else repr(func)
+    _source_hash_dct[code] = hashlib.sha1(source).hexdigest()
+    return _source_hash_dct[code]
+
+def _keyRepr(value):
+    r"""Return a string of value that every equal value shares, for DiskCache keys.
+    Supports None, bool, int, long, float, str, unicode and tuples, lists, dicts, sets and
+    frozensets of those, raises TypeError on anything else."""
+    t = type(value)
+    if t is int or t is long:
+        return str(value)
+    if value is None or t is bool or t is float or t is str or t is unicode:
+        return repr(value)
+    if t is tuple or t is list:
+        return '{}({})'.format(t.__name__, ','.join([_keyRepr(x) for x in value]))
+    if t is dict:
+        return 'dict({})'.format(','.join(sorted([_keyRepr(k) + ':' + _keyRepr(v) for k, v in value.iteritems()])))
+    if t is set or t is frozenset:
+        return 'set({})'.format(','.join(sorted([_keyRepr(x) for x in value])))
+    raise TypeError('{} is not supported in DiskCache keys'.format(t.__name__))
+
+class DiskCache(object):
+    r"""A store of function results pickled to disk, safe to share between processes.
+    
+    Entries are keyed by the function's module, name and source and by its arguments, so a result
+    is reused across runs until the code changes. An entry may also record the mtimes of input files
+    and is stale once any of them changes. Entries are written to a temp file and renamed into place.
+    Hits refresh an entry's mtime and the least recently used entries are evicted once the store
+    grows over max_bytes.
+    
+    Keyword arguments:
+    root       -- The cache directory. (default $FILETOOLS_CACHE or fileTools_cache in the temp dir)
+    max_bytes  -- Size the store is trimmed to after each set(), None for unbounded. (default None)
+    ttl        -- Seconds an entry stays valid, None for no expiry. (default None)
+    compress   -- zlib the pickles. (default True)
+    
+    Attributes:
+    hits       -- Number of get() calls served from the cache.
+    misses     -- Number of get() calls that weren't.
+    
+    Methods:
+    getKey()   -- Return the key of a call.
+    get()      -- Return (True, result) of an entry or (False, None).
+    set()      -- Store a result.
+    delete()   -- Remove an entry.
+    evict()    -- Remove least recently used entries over max_bytes.
+    clear()    -- Remove every entry.
+    """
+    EXT = '.pkl'
+    
+    def __init__(self, root = None, max_bytes = None, ttl = None, compress = True):
+        if root == None:
+            root = os.environ.get('FILETOOLS_CACHE', os.path.join(tempfile.gettempdir(), 'fileTools_cache'))
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if not os.path.isdir(root):
+            try:
+                os.makedirs(root)
+            except OSError:
+                if not os.path.isdir(root):
+                    raise
+    
+    def getKey(self, func, args = (), kwargs = None):
+        r"""Return the key of calling func with args and kwargs, or None if they can't be keyed.
+        The arguments may be None, bool, int, long, float, str, unicode and tuples, lists, dicts,
+        sets and frozensets of those. Equal arguments make the same key, except that 1, 1.0 and
+        True are told apart."""
+        try:
+            arg_data = _keyRepr((tuple(args), kwargs or {}))
+        except (TypeError, RuntimeError):
+            return None
+        fn_nm = getattr(func, '__name__', type(func).__name__)
+        name = '.'.join([getattr(func, '__module__', None) or '', fn_nm])
+        return '_'.join([re.sub(r'\W', '', fn_nm), hashlib.sha1('|'.join([name, getSourceHash(func), arg_data])).hexdigest()])
+    
+    def getPath(self, key):
+        r"""Return the path of entry key."""
+        return os.path.join(self.root, key + self.EXT)
+    
+    def get(self, key, ttl = None):
+        r"""Return (True, result) of entry key, or (False, None) if it's missing, expired or its files changed.
+        
+        Keyword arguments:
+        ttl  -- Overrides the store's ttl."""
+        ttl = self.ttl if ttl == None else ttl
+        fpn = self.getPath(key)
+        try:
+            with open(fpn, 'rb') as f:
+                data = f.read()
+            if self.compress:
+                data = zlib.decompress(data)
+            created, stamp_ls, value = cPickle.loads(data)
+        except (IOError, OSError, EOFError, ValueError, zlib.error, cPickle.UnpicklingError):
+            with self._lock:
+                self.misses += 1
+            return False, None
+        if (ttl != None and time.time() - created > ttl) or stamp_ls != self.stampFiles([x[0] for x in stamp_ls]):
+            self.delete(key)
+            with self._lock:
+                self.misses += 1
+            return False, None
+        with self._lock:
+            self.hits += 1
+        try:
+            os.utime(fpn, None)
+        except OSError:
+            pass
+        return True, value
+    
+    def set(self, key, value, files = None, stamps = None):
+        r"""Store value as entry key and evict over max_bytes.
+        
+        Keyword arguments:
+        files   -- Paths of input files, the entry is stale once one of their mtimes changes.
+        stamps  -- stampFiles(files) taken before the value was computed, to use instead of stamping now."""
+        if stamps == None:
+            stamps = self.stampFiles(files or [])
+        data = cPickle.dumps((time.time(), stamps, value), cPickle.HIGHEST_PROTOCOL)
+        if self.compress:
+            data = zlib.compress(data, 1)
+        fd, tmp_fpn = tempfile.mkstemp(self.EXT, '.' + key, self.root)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            replaceFile(tmp_fpn, self.getPath(key))
+        except (IOError, OSError):
+            #another process has the entry open on Windows, it'll be stored next time
+            if os.path.exists(tmp_fpn):
+                os.remove(tmp_fpn)
+        self.evict()
+    
+    def delete(self, key):
+        r"""Remove entry key if it exists."""
+        try:
+            os.remove(self.getPath(key))
+        except OSError:
+            pass
+    
+    def stampFiles(self, fpn_ls):
+        r"""Return [[path, mtime]] of fpn_ls, mtime None for missing files."""
+        stamp_ls = []
+        for fpn in fpn_ls:
+            try:
+                stamp_ls.append([fpn, os.path.getmtime(fpn)])
+            except OSError:
+                stamp_ls.append([fpn, None])
+        return stamp_ls
+    
+    def _listEntries(self):
+        r"""Return [(mtime, path, size)] of every entry."""
+        entry_ls = []
+        for fn in os.listdir(self.root):
+            if fn.startswith('.') or not fn.endswith(self.EXT):
+                continue
+            try:
+                st = os.stat(os.path.join(self.root, fn))
+            except OSError:
+                continue
+            entry_ls.append((st.st_mtime, os.path.join(self.root, fn), st.st_size))
+        return entry_ls
+    
+    def evict(self):
+        r"""Remove the least recently used entries until the store is within max_bytes."""
+        if self.max_bytes == None:
+            return
+        with self._lock:
+            entry_ls = sorted(self._listEntries())
+            total = sum([x[2] for x in entry_ls])
+            while total > self.max_bytes and entry_ls:
+                mtime, fpn, size = entry_ls.pop(0)
+                try:
+                    os.remove(fpn)
+                except OSError:
+                    pass
+                total -= size
+    
+    def clear(self):
+        r"""Remove every entry."""
+        for mtime, fpn, size in self._listEntries():
+            try:
+                os.remove(fpn)
+            except OSError:
+                pass
+
+def getDiskCache():
+    r"""Return the DiskCache used by diskCache(), SList and SDict when none is given."""
+    global _disk_cache
+    if _disk_cache == None:
+        _disk_cache = DiskCache()
+    return _disk_cache
+
+def diskCache(func = None, cache = None, ttl = None, files = None):
+    r"""Decorate func to store its results in a DiskCache and reuse them on calls with the same arguments.
+    Use bare, @diskCache, or with options, @diskCache(ttl = 3600).
+    
+    Keyword arguments:
+    cache  -- The DiskCache. (default getDiskCache())
+    ttl    -- Seconds a result stays valid. (default the cache's ttl)
+    files  -- A function taking the same arguments as func that returns the paths of the input files,
+              the result is recomputed once one of their mtimes changes. (default None)
+    
+    Calls with arguments DiskCache.getKey() doesn't support, e.g. instances of other classes, aren't cached.
+    The decorated function has refresh(*args, **kwargs) to recompute and store a result regardless."""
+    if func == None:
+        return lambda x: diskCache(x, cache, ttl, files)
+    def call(refresh, args, kwargs):
+        store = cache if cache != None else getDiskCache()
+        key = store.getKey(func, args, kwargs)
+        if key != None and not refresh:
+            found, value = store.get(key, ttl)
+            if found:
+                return value
+        stamps = store.stampFiles(files(*args, **kwargs)) if files else []
+        value = func(*args, **kwargs)
+        if key != None:
+            store.set(key, value, stamps = stamps)
+        return value
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return call(False, args, kwargs)
+    wrapper.refresh = lambda *args, **kwargs: call(True, args, kwargs)
+    return wrapper
+
 class SList(list):
+    r"""A disc stored list.
+        Takes a list returning function, arguments, and stores the result in a DiskCache.
+        Reads from it if the function and arguments are the same on consecutive runs."""
     def __init__(self, func, *args, **kwargs):
-        from __main__ import __file__ as modname
         self.force_rebuild = kwargs.pop('force_rebuild', 0)
+        self.cache = kwargs.pop('cache', None) or getDiskCache()
         self.func = func
         self.args = args
         self.kwargs = kwargs
-        self.root = ''.join(['c:/denis_korkh/temp/',
-                             os.path.basename(modname).split('.')[0],
-                              '_temp/',
-                              func.__name__,
-                              '/'])
-        if not os.access(self.root, os.F_OK):
-            os.makedirs(self.root)
-        self.path = self.root + self.makename(self.func, self.args, self.kwargs)
-        if os.access(self.path, os.F_OK) and not self.force_rebuild:
-            super(SList,self).__init__(self.load())
+        self.root = self.cache.root
+        self.key = self.makename(self.func, self.args, self.kwargs)
+        self.path = self.cache.getPath(self.key) if self.key != None else None
+        found = False
+        if self.key != None and not self.force_rebuild:
+            found, result = self.cache.get(self.key)
+        if found:
+            super(SList,self).__init__(result)
         else:
             self.rebuild()
             self.save()
     def makename(self, fn, args, kwargs):
-        return '_'.join([fn.__name__,str(hash(tuple(fn.__name__+str(args)+str(kwargs))))]) + '.json'
+        return self.cache.getKey(fn, args, kwargs)
     def load(self):
-        f = open(self.path, 'r')
-        t = json.load(f)
-        f.close()
-        return t
+        return self.cache.get(self.key)[1]
     def save(self):
-        f = open(self.path, 'w')
-        json.dump(self, f)
-        f.close()
+        if self.key != None:
+            self.cache.set(self.key, list(self))
     def rebuild(self):
         result = self.func(*self.args, **self.kwargs)
         if type(result) != list:
-            raise TypeError('{} expected type {}, got {}'.format(self.__name__, list, type(result)))
+            raise TypeError('{} expected type {}, got {}'.format(self.func.__name__, list, type(result)))
         super(SList,self).__init__(result)
 
 class SDict(dict):
     r"""A disc stored dictionary.
-        Takes a dict returning function, arguments, and writes the result
-        to disc.  Reads from disc if the program name, function, and arguments are
-        the same on consequitive runs."""
+        Takes a dict returning function, arguments, and stores the result in a DiskCache.
+        Reads from it if the function and arguments are the same on consecutive runs."""
     def __init__(self, func, *args, **kwargs):
         super(SDict,self).__init__()
         self.force_rebuild = kwargs.pop('force_rebuild', 0)
+        self.cache = kwargs.pop('cache', None) or getDiskCache()
         self.func = func
         self.args = args
         self.kwargs = kwargs
-        from __main__ import __file__ as modname
-        self.root = ''.join(['c:/denis_korkh/temp/',
-                             os.path.basename(modname).split('.')[0],
-                              '_temp/',
-                              func.__name__,
-                              '/'])
-        if not os.access(self.root, os.F_OK):
-            os.makedirs(self.root)
-        self.path = self.root + self.makename(self.func, self.args, self.kwargs)
-        if os.access(self.path, os.F_OK) and not self.force_rebuild:
-            self.update(self.load())
+        self.root = self.cache.root
+        self.key = self.makename(self.func, self.args, self.kwargs)
+        self.path = self.cache.getPath(self.key) if self.key != None else None
+        found = False
+        if self.key != None and not self.force_rebuild:
+            found, result = self.cache.get(self.key)
+        if found:
+            print ':'.join([self.func.__name__,'loading from disc.'])
+            self.update(result)
         else:
             self.rebuild()
             self.save()
     def makename(self, fn, args, kwargs):
-        return '_'.join([fn.__name__,str(hash(tuple(fn.__name__+str(args)+str(kwargs))))]) + '.json'
+        return self.cache.getKey(fn, args, kwargs)
     def load(self):
         print ':'.join([self.func.__name__,'loading from disc.'])
-        f = open(self.path, 'r')
-        t = json.load(f)
-        f.close()
-        return t
+        return self.cache.get(self.key)[1]
     def save(self):
-        f = open(self.path, 'w')
-        json.dump(self, f)
-        f.close()
+        if self.key != None:
+            self.cache.set(self.key, dict(self))
     def rebuild(self):
         print ':'.join([self.func.__name__,'recalculating.'])
         result = self.func(*self.args, **self.kwargs)
         if type(result) != dict:
-            raise TypeError('{} expected type {}, got {}'.format(self.__name__, dict, type(result)))
-        self.update(self.func(*self.args, **self.kwargs))
+            raise TypeError('{} expected type {}, got {}'.format(self.func.__name__, dict, type(result)))
+        self.update(result)
 #===============================================================================
 # EXCEPTIONS
 #===============================================================================
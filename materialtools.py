@@ -16,9 +16,8 @@ NORMALMAP       = 'normalmap'
 def getTextures(material_f_path):
     r"""Return a list of texture names used by a material file."""
     ret_ls = []
-    lines = fileTools.readFile(material_f_path)
     b_intex = 0
-    for l in lines:
+    for l in fileTools.iterLines(material_f_path):
         l = parsertools.str_tokenize_clean(l)
         if (len(l) == 0): continue
         if (l[0] == SPECIFICVALUE and (l[1] == TEXTURE or l[1] == NORMALMAP)):
@@ -31,9 +30,8 @@ def getTextures(material_f_path):
 def getShaderGraph(shader_path):
     r"""Return a dictionary of shader operations and their inputs shader_graph[operation] = {'inputs'}"""
     shader_graph = {} 
-    shader_content = fileTools.readFile(shader_path)
     in_op = 0
-    for l in shader_content:
+    for l in fileTools.iterLines(shader_path):
         l = l.lower().strip()
         if not len(l):
             continue
@@ -5,17 +5,25 @@ A collection of utilities used for parsing strings and files.
 
 Classes:
 TokenStyle           -- A set of rules for parsing a token as passed to parsetokens().
+TokenStyleSet        -- TokenStyles compiled for parsetokens() to tokenize each line once per sep and splits.
+ParseCache           -- Token dicts of parsed files remembered while the files don't change.
 Node                 -- Simple node that has one parent, children, key, depth.
 Node_Acyc            -- Simple node that has parents and children.
 
 Functions:
 str_tokenize_clean() -- Tokenize a string for parsing.
+str_tokenize()       -- Tokenize a string keeping the tokens as found.
+getTokenizer()       -- Return the compiled regular expression str_tokenize() uses for a sep and quote.
 parselines()         -- Parse a list of lines containing block definitions and return a node tree.
+iterparselines()     -- Parse lines containing block definitions and yield each block's node once it's complete.
 parsetoken()         -- Parse a list of lines for token values and return a list of values.
 parsetokens()        -- Parse a list of lines for token value pairs and return a {'token':['value',..],..}
 parsetokens_nested() -- Parse for tokens nested within other tokens and return a dictionary.
 parsetoken_file()    -- Parse file and return a list of token values that follow token using token_style rules.
+parsetokens_file()   -- Parse file and return a {'token':['value',..],..}
 parsetoken_files()   -- Parse files and return a {filename : [values,..],..}
+parsetokens_files()  -- Parse files and return a {file:{token_key:[value,..]},..}
+iterparsetokens_files() -- Yield (file, {token_key:[value,..]}) as files are parsed, optionally in a process pool.
 parseblocks()        -- Parse blocks from lines, and return lines
 stripblocks()        -- Strip blocks from lines, and return lines
 
@@ -25,9 +33,23 @@ QuoteMismatchError   -- Exception raised for methods parsing lines with quotes e
 
 @author: dkorkh
 '''
+import os
+import re
+import zlib
+import cPickle
+import sqlite3
+import hashlib
+import itertools
+import multiprocessing
 import lowtils as lt
 import fileTools as ft
 
+MAX_SPLIT_GROUPS = 32
+
+_tokenizer_dct = {}
+_separator_dct = {}
+_parse_worker_args = None
+
 #===============================================================================
 # CLASSES
 #===============================================================================
@@ -60,6 +82,140 @@ class TokenStyle(object):
     def __repr__(self):
         return '{!r}:{!r},{!r},{!r}'.format(self.token, self.valindex, self.sep, self.splits)
     
+class TokenStyleSet(object):
+    r"""TokenStyles compiled for parsetokens() to tokenize each line once per distinct sep and splits
+    instead of once per style, and find the style by the first token instead of trying each in turn.
+    
+    A line still gets the value of the first style in token_styles that matches it, and lines are
+    only parsed if they start with the first letter of a token as it's written, like before.
+    
+    Arguments:
+    token_styles  -- A list of TokenStyle objects.
+    
+    Attributes:
+    tokens        -- The tokens of token_styles, once each, in order.
+    firstletters  -- The set of the first letter of each token.
+    groups        -- [(index of the first style, sep, splits, {lowercase token : (index, style)}),..]
+                     a group per distinct sep and splits, in the order of their first style.
+    """
+    def __init__(self, token_styles):
+        self.token_styles = list(token_styles)
+        self.tokens = []
+        self.firstletters = set()
+        group_dct = {}
+        self.groups = []
+        for index, token_style in enumerate(self.token_styles):
+            if not token_style.token in self.tokens:
+                self.tokens.append(token_style.token)
+            self.firstletters.add(token_style.token[0])
+            key = (token_style.sep, token_style.splits)
+            if not key in group_dct:
+                group_dct[key] = (index, token_style.sep, token_style.splits, {})
+                self.groups.append(group_dct[key])
+            group_dct[key][3].setdefault(token_style.token.lower(), (index, token_style))
+    
+    def __len__(self):
+        return len(self.token_styles)
+    
+    def __iter__(self):
+        return iter(self.token_styles)
+    
+    def __repr__(self):
+        return 'TokenStyleSet({!r})'.format(self.token_styles)
+    
+    def getFingerprint(self, preservecase=False):
+        r"""Return a hex digest of the styles and preservecase, e.g. to key parse results by."""
+        return hashlib.sha1(repr((self.token_styles, bool(preservecase)))).hexdigest()
+
+class ParseCache(object):
+    r"""Token dicts of parsed files remembered while the file's size and mtime don't change,
+    see parsetokens_files().
+    
+    Entries are keyed by path and by the fingerprint of the TokenStyleSet and preservecase they were
+    parsed with, and kept pickled in a sqlite database. The database is in write ahead log mode so
+    processes can read it while another writes. Writes are buffered until flush().
+    
+    Keyword arguments:
+    db_fpn     -- The database file. (default parsetokens.sqlite in the fileTools DiskCache root)
+    
+    Attributes:
+    hits       -- Number of get() calls that found a current entry.
+    misses     -- Number of get() calls that didn't.
+    
+    Methods:
+    get()      -- Return the remembered token dict of a file or None.
+    set()      -- Remember the token dict of a file.
+    flush()    -- Write the set() entries to the database.
+    clear()    -- Remove every entry.
+    getStats() -- Return the hits, misses and number of entries.
+    close()    -- Flush and close the database.
+    """
+    CACHE_VERSION = 1
+    FLUSH_COUNT = 1000
+    
+    def __init__(self, db_fpn=None):
+        if db_fpn == None:
+            db_fpn = os.path.join(ft.getDiskCache().root, 'parsetokens.sqlite')
+        self.db_fpn = db_fpn
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._conn = sqlite3.connect(db_fpn, timeout=60)
+        self._conn.text_factory = str
+        try:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError:
+            pass
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] != self.CACHE_VERSION:
+            with self._conn:
+                self._conn.execute('DROP TABLE IF EXISTS parse')
+                self._conn.execute('PRAGMA user_version = {}'.format(self.CACHE_VERSION))
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS parse (path TEXT, fingerprint TEXT, size INTEGER, '
+                               'mtime REAL, result BLOB, PRIMARY KEY (path, fingerprint))')
+    
+    def get(self, path, fingerprint, st):
+        r"""Return the token dict of path parsed with fingerprint if it was parsed at the os.stat() st, None otherwise."""
+        row = self._conn.execute('SELECT size, mtime, result FROM parse WHERE path = ? AND fingerprint = ?',
+                                 (path, fingerprint)).fetchone()
+        if row == None or row[0] != st.st_size or row[1] != st.st_mtime:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return cPickle.loads(zlib.decompress(row[2]))
+    
+    def set(self, path, fingerprint, st, token_dict):
+        r"""Remember token_dict as path parsed with fingerprint at the os.stat() st, written on the next flush()."""
+        self._pending.append((path, fingerprint, st.st_size, st.st_mtime,
+                              sqlite3.Binary(zlib.compress(cPickle.dumps(token_dict, cPickle.HIGHEST_PROTOCOL)))))
+        if len(self._pending) >= self.FLUSH_COUNT:
+            self.flush()
+    
+    def flush(self):
+        r"""Write the set() entries to the database in one transaction."""
+        if self._pending:
+            with self._conn:
+                self._conn.executemany('INSERT OR REPLACE INTO parse VALUES (?, ?, ?, ?, ?)', self._pending)
+            self._pending = []
+    
+    def clear(self):
+        r"""Remove every entry and reset the stats."""
+        self._pending = []
+        with self._conn:
+            self._conn.execute('DELETE FROM parse')
+        self.hits = 0
+        self.misses = 0
+    
+    def getStats(self):
+        r"""Return {'hits', 'misses', 'entries'}."""
+        self.flush()
+        entries = self._conn.execute('SELECT COUNT(*) FROM parse').fetchone()[0]
+        return {'hits' : self.hits, 'misses' : self.misses, 'entries' : entries}
+    
+    def close(self):
+        self.flush()
+        self._conn.close()
+    
 class Node(object):
     r"""Simple node that has one parent, children, key, depth."""
     def __init__(self, key):
@@ -149,66 +305,94 @@ def str_tokenize_clean(s, sep=' \t\n', splits= -1, splitquotes=False, preserveca
     If splitquotes is False and the string has an odd number of quotes, a QuoteMismatchError
     is raised.
     """
-    WORD, TOKENS, SPLITSMADE, INDEX, STRING, SEP, SPLITS, QUOTE, COMMENT = 1, 2, 3, 4, 5, 6, 7, 8, 9
-    r = {WORD        : '',
-         TOKENS      : [],
-         SPLITSMADE  : 0,
-         INDEX       : 0,
-         STRING      : s,
-         SEP         : sep if sep else ' \t\n', #protect from None
-         SPLITS      : splits,
-         QUOTE       : '\"' if not splitquotes else ''}
-    def enterWord():
-        while r[INDEX] < len(r[STRING])        \
-        and r[STRING][r[INDEX]] != r[QUOTE]    \
-        and not r[STRING][r[INDEX]] in r[SEP]:
-            r[WORD] += r[STRING][r[INDEX]]
-            r[INDEX] += 1
-        r[TOKENS].append(r[WORD])
-        r[WORD] = ''
-        r[SPLITSMADE] += 1
-        enterSpace()
-    def enterQuote():
-        r[WORD] += r[STRING][r[INDEX]]
-        r[INDEX] += 1
-        if r[INDEX] == len(r[STRING]):
-                raise QuoteMismatchError(r[STRING])
-        while r[STRING][r[INDEX]] != r[QUOTE]:
-            r[WORD] += r[STRING][r[INDEX]]
-            r[INDEX] += 1
-            if r[INDEX] == len(r[STRING]):
-                raise QuoteMismatchError(r[STRING])
-        r[WORD] += r[STRING][r[INDEX]]
-        r[INDEX] += 1
-        r[TOKENS].append(r[WORD])
-        r[WORD] = ''
-        r[SPLITSMADE] += 1
-        enterSpace()
-    def enterSpace():
-        while r[INDEX] < len(r[STRING]) \
-        and r[STRING][r[INDEX]] in r[SEP]:
-            r[INDEX] += 1
-
-    while r[INDEX] < len(r[STRING]) \
-    and r[STRING][r[INDEX]]         \
-    and r[SPLITSMADE] != r[SPLITS]:            
-        if r[STRING][r[INDEX]] in r[SEP]:
-            enterSpace()
-            continue
-        if r[STRING][r[INDEX]] == r[QUOTE]:
-            enterQuote()
-            continue
+    return lt.list_str_clean(str_tokenize(s, sep, splits, splitquotes), preservecase=preservecase, stripquotes=stripquotes)
+
+def str_tokenize(s, sep=' \t\n', splits= -1, splitquotes=False):
+    r"""Split line and return a list[str,..] of tokens as found, see str_tokenize_clean().
+    
+    Quoted parts keep their quotes and a quote ends the word before it. Once splits tokens are
+    made, the rest of the line after the separators that follow the last token is the last token.
+    A line is split with str.split() where that gives the same tokens, e.g. for the default
+    whitespace sep, or else on runs of separators, see getSeparator(), unless a quote is among
+    the tokens split. Those lines are matched by a regular expression compiled once per sep,
+    quote and splits, see getTokenizer().
+    """
+    sep = sep if sep else ' \t\n' #protect from None
+    quote = '' if splitquotes else '\"'
+    if splits == 0:
+        return [s] if s else []
+    unlimited = splits < 0 or splits == None
+    if unlimited and quote and quote in s:
+        tokens = (_tokenizer_dct.get((sep, quote, -1)) or getTokenizer(sep, quote)).findall(s)
+        if quote in tokens:
+            raise QuoteMismatchError(s)
+        return tokens
+    whitespace = sep == ' \t\n' and type(s) is str and not '\r' in s and not '\x0b' in s and not '\x0c' in s
+    if unlimited:
+        return s.split() if whitespace else (_tokenizer_dct.get((sep, '', -1)) or getTokenizer(sep, '')).findall(s)
+    #split as if there were no quotes, a quote in the rest of the line doesn't change the tokens
+    if whitespace:
+        tokens = s.split(None, splits)
+    else:
+        if len(sep) == 1 and not sep + sep in s and s[:1] != sep:
+            tokens = s.split(sep, splits)
         else:
-            enterWord()
-            continue
-    if r[INDEX] < len(r[STRING]):
-        while r[INDEX] < len(r[STRING]):
-            r[WORD] += r[STRING][r[INDEX]]
-            r[INDEX] += 1
-        r[TOKENS].append(r[WORD])
-        r[WORD] = ''
-        r[SPLITSMADE] += 1
-    return lt.list_str_clean(r[TOKENS], preservecase=preservecase, stripquotes=stripquotes)
+            tokens = (_separator_dct.get(sep) or getSeparator(sep)).split(s.lstrip(sep), splits)
+        if not tokens[-1]:
+            tokens.pop()
+    if not quote or not quote in s or (len(tokens) > splits and not quote in s[:len(s) - len(tokens[-1])]):
+        return tokens
+    #a line of no more than splits tokens has no rest
+    tokens = (_tokenizer_dct.get((sep, quote, -1)) or getTokenizer(sep, quote)).findall(s)
+    if len(tokens) > splits and splits <= MAX_SPLIT_GROUPS:
+        rgx = _tokenizer_dct.get((sep, quote, splits)) or getTokenizer(sep, quote, splits)
+        tokens = [x for x in rgx.match(s).groups() if x != None]
+    elif len(tokens) > splits:
+        tokens = []
+        for match in getTokenizer(sep, quote).finditer(s):
+            if len(tokens) == splits:
+                #the separators before this token were skipped, the rest is the last token
+                tokens.append(s[match.start():])
+                break
+            tokens.append(match.group())
+    if quote in tokens[:splits]:
+        raise QuoteMismatchError(s)
+    return tokens
+
+def getSeparator(sep):
+    r"""Return the compiled regular expression for a run of sep characters str_tokenize() splits
+    lines without quotes on."""
+    if not sep in _separator_dct:
+        _separator_dct[sep] = re.compile('[{}]+'.format(''.join([re.escape(c) for c in sep])))
+    return _separator_dct[sep]
+
+def getTokenizer(sep, quote='\"', splits= -1):
+    r"""Return the compiled regular expression str_tokenize() tokenizes lines with.
+    A token is a quoted part, a run of characters that are neither sep nor quote, or an
+    unmatched quote.
+    
+    Arguments:
+    sep    -- Any character in sep splits tokens.
+    quote  -- Parts between two of this character are one token, '' for none. A quote in sep is a
+              separator, not a quote. (default '"')
+    splits -- If -1, the expression finds every token. Otherwise it matches the whole line, with
+              a group for each of the first splits tokens and one for the rest. (default -1)
+    """
+    key = (sep, quote, splits)
+    if not key in _tokenizer_dct:
+        sep_class = ''.join([re.escape(c) for c in sep])
+        if quote and not quote in sep:
+            token = '{0}[^{0}]*{0}|[^{1}{0}]+|{0}'.format(re.escape(quote), sep_class)
+        else:
+            token = '[^{}]+'.format(sep_class)
+        if splits < 0:
+            _tokenizer_dct[key] = re.compile(token)
+        else:
+            groups = ''
+            for i in xrange(splits):
+                groups = '(?:({})[{}]*{})?'.format(token, sep_class, groups)
+            _tokenizer_dct[key] = re.compile('[{}]*{}(.+)?'.format(sep_class, groups), re.DOTALL)
+    return _tokenizer_dct[key]
 
 def parsetoken(lines, token_style, preservecase=False, stripquotes=True):
     """Parse a list of lines for token value pairs and return a list of values.
@@ -238,34 +422,35 @@ def parsetokens(lines, token_styles, preservecase=False):
     r"""Parse a list of lines for token value pairs and return a {'token':['value',..],..}
     
     Arguments:
-    lines -- A list of strings to parse.
+    lines -- A list or iterable of strings to parse, e.g. fileTools.iterLines().
         
     Keyword arguments:
-    token_styles   -- A list of TokenStyle objects to use for parsing tokens.
+    token_styles   -- A list of TokenStyle objects or a TokenStyleSet to use for parsing tokens.
+                      When parsing many files, passing a TokenStyleSet saves compiling it for each.
     preserve_case  -- If False, the tokens returned are lowercase, False by default.
     """
-    retdict = {}
-    firstletters = map(lambda x: x.token[0], token_styles) #get the first character of each token to speed things up
-    for token_style in token_styles:
-        retdict[token_style.token] = []
+    if not isinstance(token_styles, TokenStyleSet):
+        token_styles = TokenStyleSet(token_styles)
+    retdict = dict([(token, []) for token in token_styles.tokens])
+    firstletters = token_styles.firstletters
+    groups = token_styles.groups
     for line in lines:
         line = line.strip()
         comment_i = line.find('#')
-        comment_i = comment_i if comment_i != -1 else len(line)
-        line = line[:comment_i]
+        if comment_i != -1:
+            line = line[:comment_i]
         if len(line) == 0 or not line[0].lower() in firstletters:
             continue
-        for token_style in token_styles:
-            line_tk = str_tokenize_clean(line,
-                                         token_style.sep,
-                                         token_style.splits,
-                                         preservecase=preservecase)
-            if line_tk[0].lower() == token_style.token.lower():
-                retdict[token_style.token].append(line_tk[token_style.valindex])
+        match = None
+        for first_index, sep, splits, dispatch in groups:
+            if match != None and first_index > match[0]:
                 break
-    if not preservecase:
-        for k in retdict.keys():
-            retdict[k] = map(lambda x: x.lower(), retdict[k])
+            line_tk = str_tokenize_clean(line, sep, splits, preservecase=preservecase)
+            style = dispatch.get(line_tk[0].lower())
+            if style != None and (match == None or style[0] < match[0]):
+                match = (style[0], style[1], line_tk)
+        if match != None:
+            retdict[match[1].token].append(match[2][match[1].valindex])
     return retdict
 
 def parsetokens_nested(lines, def_token, attr_tokens, mode=0):
@@ -313,17 +498,24 @@ def parsetokens_nested(lines, def_token, attr_tokens, mode=0):
 
 def parsetoken_file(file_path, token_style, preservecase=False):
     '''Parse file and return a list of token values that follow token using token_style rules.'''
-    f_lines = ft.readFile(file_path)
-    return parsetoken(f_lines, token_style, preservecase)
+    return parsetoken(ft.iterLines(file_path), token_style, preservecase)
 
-def parsetoken_files(file_list, token_style, preservecase=False):
-    '''Parse files and return a {filename : [values,..],..}'''
+def parsetokens_file(file_path, token_styles, preservecase=False):
+    '''Parse file and return a {'token':['value',..],..} using token_styles rules, see parsetokens().'''
+    return parsetokens(ft.iterLines(file_path), token_styles, preservecase)
+
+def parsetoken_files(file_list, token_style, preservecase=False, workers=None, chunksize=None):
+    '''Parse files and return a {filename : [values,..],..}
+    workers and chunksize parse in a process pool, see iterparsetokens_files().'''
     file_dict = ft.groupFilesByNameFlat(file_list)
-    for path in file_dict.values():
-        file_dict[path] = parsetoken_file(path, token_style, preservecase)
+    name_dict = dict([(path, name) for name, path in file_dict.items()])
+    for path, values in _iterparse_files(parsetoken_file, file_dict.values(), (token_style, preservecase),
+                                         workers, False, chunksize):
+        file_dict[name_dict[path]] = values
     return file_dict
 
-def parsetokens_files(file_list, token_styles, preservecase=False, progress_object=None):
+def parsetokens_files(file_list, token_styles, preservecase=False, progress_object=None, workers=None, chunksize=None,
+                      cache=None):
     r"""Return a nested {file:{token_key:[value,..]},..} dictionary for tokens from files.
     
     Arguments:
@@ -334,34 +526,131 @@ def parsetokens_files(file_list, token_styles, preservecase=False, progress_obje
     preservecase    -- If True, will return values as found otherwise lowercase. (default False) 
     progress_object -- An optional object to display progress. Must have a reset(maxcount)
                        method thats run before the loop and an update() method that gets called
-                       every iteration."""
-    retdict = {}
+                       every iteration.
+    workers         -- Parse in a process pool of this many processes. (default None, serial)
+    chunksize       -- Files sent to a worker at a time, see iterparsetokens_files().
+    cache           -- A ParseCache to reuse the results of files that haven't changed. (default None)"""
+    return dict(iterparsetokens_files(file_list, token_styles, preservecase, progress_object, workers, False, chunksize,
+                                      cache))
+
+def iterparsetokens_files(file_list, token_styles, preservecase=False, progress_object=None, workers=None,
+                          ordered=True, chunksize=None, cache=None):
+    r"""Yield a (file, {token_key:[value,..]}) for each file in file_list as it's parsed.
+    
+    Arguments:
+    file_list    -- A list of files to parse.
+    token_styles -- TokenStyle objects or a TokenStyleSet to use for parsing rules.
+    
+    Keyword arguments:
+    preservecase    -- If True, will return values as found otherwise lowercase. (default False)
+    progress_object -- An optional object to display progress, as in parsetokens_files(). It's updated
+                       from this process as each file's result arrives.
+    workers         -- Parse in a multiprocessing pool of this many processes. The token styles are
+                       sent to each worker once. (default None, serial)
+    ordered         -- Yield in the order of file_list, else as soon as each file is parsed. (default True)
+    chunksize       -- Files sent to a worker at a time. (default spreads the files in 4 chunks per worker)
+    cache           -- A ParseCache to reuse the results of files that haven't changed since they were
+                       cached with the same styles and preservecase. Only the other files are parsed, and
+                       cached. Unordered, the cached results are yielded first. (default None)
+    
+    Scripts using workers on Windows must guard their entry point with if __name__ == '__main__'."""
+    if not isinstance(token_styles, TokenStyleSet):
+        token_styles = TokenStyleSet(token_styles)
     if progress_object:
         progress_object.reset('parsetokens_files', len(file_list))
+    if cache == None:
+        for path, token_dict in _iterparse_files(parsetokens_file, file_list, (token_styles, preservecase),
+                                                 workers, ordered, chunksize):
+            if progress_object:
+                progress_object.update()
+            yield (path, token_dict)
+        return
+    fingerprint = token_styles.getFingerprint(preservecase)
+    cached_dict = {}
+    stat_dict = {}
     for path in file_list:
-        lines = ft.readFile(path)
-        token_dict = parsetokens(lines, token_styles=token_styles, preservecase=preservecase)
-        retdict[path] = token_dict
-        if progress_object:
-            progress_object.update()
-    return retdict
+        try:
+            stat_dict[path] = os.stat(path)
+        except OSError:
+            #let the parse raise as it would without a cache
+            continue
+        token_dict = cache.get(path, fingerprint, stat_dict[path])
+        if token_dict != None:
+            cached_dict[path] = token_dict
+    parse_list = [path for path in file_list if not path in cached_dict]
+    parsed = _iterparse_files(parsetokens_file, parse_list, (token_styles, preservecase), workers, ordered, chunksize)
+    try:
+        #ordered, the parsed files arrive in file_list order too and are merged in as they come up
+        for path in (file_list if ordered else cached_dict.keys() + parse_list):
+            if path in cached_dict:
+                token_dict = cached_dict[path]
+            else:
+                path, token_dict = next(parsed)
+                if path in stat_dict:
+                    cache.set(path, fingerprint, stat_dict[path], token_dict)
+            if progress_object:
+                progress_object.update()
+            yield (path, token_dict)
+    finally:
+        parsed.close()
+        cache.flush()
+
+def _iterparse_files(fn, file_list, args, workers=None, ordered=True, chunksize=None):
+    r"""Yield (path, fn(path, *args)) for each file in file_list, from a process pool if workers.
+    fn must be a module level function, args are sent to each worker once."""
+    pool = None
+    if workers and workers > 1 and len(file_list) > 1:
+        if not chunksize:
+            chunksize = max(1, len(file_list) / (workers * 4))
+        pool = multiprocessing.Pool(workers, _initparse_worker, (fn, args))
+        imap = pool.imap if ordered else pool.imap_unordered
+        results = imap(_parse_worker, file_list, chunksize)
+    else:
+        results = itertools.imap(lambda path: (path, fn(path, *args)), file_list)
+    try:
+        for result in results:
+            yield result
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+def _initparse_worker(fn, args):
+    r"""Keep the parse function and its arguments in a pool worker."""
+    global _parse_worker_args
+    _parse_worker_args = (fn, args)
+
+def _parse_worker(path):
+    r"""Return (path, fn(path, *args)) with the pool worker's function.  Runs in pool workers."""
+    fn, args = _parse_worker_args
+    return (path, fn(path, *args))
+
+def _noop(line, inNode, blockDepth):
+    r"""The default parselines() callback, it's skipped rather than called."""
+    return None
+
+def _nodepth(line, inNode, blockDepth):
+    r"""The default parselines() f_enterBlock and f_exitBlock, they're skipped rather than called."""
+    return 0
 
 def parselines(lines,
               rootNode,
-              f_onExit=lambda line, inNode, blockDepth: None,
-              f_onEnter=lambda line, inNode, blockDepth: None,
-              f_stepIn=lambda line, inNode, blockDepth: None,
-              f_stepOut=lambda line, inNode, blockDepth: None,
-              f_enterBlock=lambda line, inNode, blockDepth: 0,
-              f_exitBlock=lambda line, inNode, blockDepth: 0,
-              f_enterKeyBlock=lambda line, inNode, blockDepth: None,
-              f_exitKeyBlock=lambda line, inNode, blockDepth: None,
-              f_update=lambda line, inNode, blockDepth: None,
-              f_other=lambda line, inNode, blockDepth: None):
+              f_onExit=_noop,
+              f_onEnter=_noop,
+              f_stepIn=_noop,
+              f_stepOut=_noop,
+              f_enterBlock=_nodepth,
+              f_exitBlock=_nodepth,
+              f_enterKeyBlock=_noop,
+              f_exitKeyBlock=_noop,
+              f_update=_noop,
+              f_other=_noop,
+              f_subtree=None,
+              prune=False):
     '''Parse a list of lines containing block definitions and return a node tree.
     all functions should accept (line, currentNode, blockdepth) as parameters. Lines with only white
-    space get ignored except for the call to f_update.
-        lines            : a list of strings to parse
+    space get ignored except for the call to f_update. Functions left at their defaults aren't called.
+        lines            : a list or iterable of strings to parse, e.g. fileTools.iterLines()
         rootNode         : root tree node, must have key<str>, parent<node>, children<node list>
         f_onExit         : function called on exiting any block
         f_onEnter        : function called on entering any block
@@ -373,34 +662,79 @@ def parselines(lines,
         f_exitKeyBlock   : function called on exiting a new block and returns True/False if the block is a key block
         f_update         : function called at the beginning of every cycle with the line as is.
         f_other          : function called at the end of the cycle if it's neither block start or end.
+        f_subtree        : function called with the node stepped out of, once its key block is complete.
+        prune            : remove the node stepped out of from its parent's children after f_subtree, so
+                           it can be freed once processed.
     '''
+    for node in iterparselines(lines, rootNode, f_onExit, f_onEnter, f_stepIn, f_stepOut, f_enterBlock,
+                               f_exitBlock, f_enterKeyBlock, f_exitKeyBlock, f_update, f_other, prune):
+        if f_subtree:
+            f_subtree(node)
+    return rootNode
+
+def iterparselines(lines,
+                   rootNode,
+                   f_onExit=_noop,
+                   f_onEnter=_noop,
+                   f_stepIn=_noop,
+                   f_stepOut=_noop,
+                   f_enterBlock=_nodepth,
+                   f_exitBlock=_nodepth,
+                   f_enterKeyBlock=_noop,
+                   f_exitKeyBlock=_noop,
+                   f_update=_noop,
+                   f_other=_noop,
+                   prune=False):
+    '''Parse lines like parselines() and yield each node stepped out of as soon as its key block is
+    complete, e.g. to process a large file block by block from fileTools.iterLines().
+        prune            : remove each node from its parent's children once the consumer has it,
+                           so the tree doesn't keep every block in memory.
+    '''
+    f_onExit, f_onEnter, f_enterKeyBlock, f_exitKeyBlock, f_update, f_other = \
+        [None if f is _noop else f for f in (f_onExit, f_onEnter, f_enterKeyBlock, f_exitKeyBlock, f_update, f_other)]
+    f_enterBlock, f_exitBlock = [None if f is _nodepth else f for f in (f_enterBlock, f_exitBlock)]
     blockDepth = 0  #blockDepth is incremented/decremented by enter/exit block.
     inBlock = 0  #inBlock is the last block depth level, > depth means exited, < depth means entered
     inNode = rootNode
-    line_num = 0
     for line in lines:
-        line_num += 1
-        f_update(line, inNode, blockDepth)
+        if f_update:
+            f_update(line, inNode, blockDepth)
         if not line.strip():
             continue
-        blockDepth += f_enterBlock(line, inNode, blockDepth)
+        if f_enterBlock:
+            blockDepth += f_enterBlock(line, inNode, blockDepth)
         if inBlock < blockDepth:
             inBlock = blockDepth
-            f_onEnter(line, inNode, blockDepth)
-            if f_enterKeyBlock(line, inNode, blockDepth):
-                inNode = f_stepIn(line, inNode, blockDepth)
+            if f_onEnter:
+                f_onEnter(line, inNode, blockDepth)
+            if f_enterKeyBlock and f_enterKeyBlock(line, inNode, blockDepth):
+                #a default f_stepIn returns None
+                inNode = f_stepIn(line, inNode, blockDepth) if f_stepIn is not _noop else None
             continue
-        blockDepth += f_exitBlock(line, inNode, blockDepth)
+        if f_exitBlock:
+            blockDepth += f_exitBlock(line, inNode, blockDepth)
         if inBlock > blockDepth:
             inBlock = blockDepth
-            f_onExit(line, inNode, blockDepth)
-            if f_exitKeyBlock(line, inNode, blockDepth):
-                inNode = f_stepOut(line, inNode, blockDepth)
+            if f_onExit:
+                f_onExit(line, inNode, blockDepth)
+            if f_exitKeyBlock and f_exitKeyBlock(line, inNode, blockDepth):
+                node = inNode
+                inNode = f_stepOut(line, inNode, blockDepth) if f_stepOut is not _noop else None
+                if node != None:
+                    yield node
+                    if prune:
+                        _prunenode(node)
                 if inNode == None:
                     break
             continue
-        f_other(line, inNode, blockDepth)
-    return rootNode
+        if f_other:
+            f_other(line, inNode, blockDepth)
+
+def _prunenode(node):
+    r"""Remove node from its parent's children."""
+    parent = getattr(node, 'parent', None)
+    if parent != None and node in parent.children:
+        parent.children.remove(node)
 
 def stripblocks(lines, fn_blockid, fn_blockenter, fn_blockexit):
     '''Return lines stripped from blocks identified by fn_blockid, from line
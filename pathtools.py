@@ -0,0 +1,203 @@
+'''
+Created on Oct 18, 2026
+
+String only path helpers for tight loops, memoized in bounded LRU caches.
+
+The fileTools versions of these ask the filesystem whether a path is a file or
+a directory. These treat every path as a file path unless it ends in a slash,
+so they never stat and their results can be cached.
+
+Classes:
+LRUCache              -- A bounded mapping that drops the least recently used key when full.
+
+Functions:
+memoize()             -- Decorate a function to cache its results in an LRUCache.
+normPath()            -- Return a path lowercase, normalized and with forward slashes.
+joinPath()            -- Return normPath() of a path relative to a directory.
+getDirectory()        -- Return the directory of a path.
+getFileName()         -- Return the file name of a path.
+fileKey()             -- Return the lowercase name of a file without extension.
+fileExt()             -- Return the lowercase extension of a file without a dot.
+getRelativePathFrom() -- Return a path as a relative path from another.
+getCacheStats()       -- Return the hits, misses and size of every memoized function.
+clearCaches()         -- Empty every memoized function's cache.
+
+@author: dkorkh
+'''
+import os
+import threading
+import functools
+
+MAXSIZE = 16384
+
+_memo_dct = {}
+
+#===============================================================================
+# CLASSES
+#===============================================================================
+
+class LRUCache(object):
+    r"""A bounded mapping that drops the least recently used key when full.
+
+    Keyword arguments:
+    maxsize  -- The number of keys kept. (default MAXSIZE)
+
+    Attributes:
+    hits     -- Number of get() calls that found their key.
+    misses   -- Number of get() calls that didn't.
+    """
+    def __init__(self, maxsize = MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        #key : [prev link, next link, key, value], in a circular list from least to most recently used
+        self._dct = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._dct)
+
+    def get(self, key, default = None):
+        r"""Return the value of key, or default if it isn't cached."""
+        with self._lock:
+            link = self._dct.get(key)
+            if link == None:
+                self.misses += 1
+                return default
+            link_prev, link_next, key, value = link
+            link_prev[1] = link_next
+            link_next[0] = link_prev
+            last = self._root[0]
+            last[1] = self._root[0] = link
+            link[0] = last
+            link[1] = self._root
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        r"""Cache value as key, dropping the least recently used key if full."""
+        with self._lock:
+            link = self._dct.pop(key, None)
+            if link != None:
+                link[0][1] = link[1]
+                link[1][0] = link[0]
+            last = self._root[0]
+            link = [last, self._root, key, value]
+            last[1] = self._root[0] = self._dct[key] = link
+            if len(self._dct) > self.maxsize:
+                oldest = self._root[1]
+                self._root[1] = oldest[1]
+                oldest[1][0] = self._root
+                del self._dct[oldest[2]]
+
+    def clear(self):
+        with self._lock:
+            self._dct.clear()
+            self._root[:] = [self._root, self._root, None, None]
+            self.hits = 0
+            self.misses = 0
+
+    def getStats(self):
+        r"""Return {'hits', 'misses', 'size', 'maxsize'}."""
+        return {'hits' : self.hits, 'misses' : self.misses, 'size' : len(self._dct), 'maxsize' : self.maxsize}
+
+#===============================================================================
+# FUNCTIONS
+#===============================================================================
+
+def memoize(maxsize = MAXSIZE):
+    r"""Decorate a function of hashable positional arguments to cache its results in an LRUCache.
+    The cache is the function's cache attribute and is reported by getCacheStats()."""
+    def decorator(func):
+        cache = LRUCache(maxsize)
+        missing = object()
+        @functools.wraps(func)
+        def wrapper(*args):
+            value = cache.get(args, missing)
+            if value is missing:
+                value = func(*args)
+                cache.set(args, value)
+            return value
+        wrapper.cache = cache
+        _memo_dct[func.__name__] = cache
+        return wrapper
+    return decorator
+
+def getCacheStats():
+    r"""Return {function name : {'hits', 'misses', 'size', 'maxsize'}} of every memoized function."""
+    return dict([(k, v.getStats()) for k, v in _memo_dct.iteritems()])
+
+def clearCaches():
+    r"""Empty every memoized function's cache and reset its stats."""
+    for cache in _memo_dct.itervalues():
+        cache.clear()
+
+@memoize()
+def normPath(path):
+    r"""Return path lowercase, normalized and with forward slashes, e.g. to compare or key paths."""
+    return os.path.normpath(path).replace('\\', '/').lower()
+
+@memoize()
+def joinPath(directory, rel_path):
+    r"""Return normPath() of rel_path relative to directory."""
+    return normPath(directory + '/' + rel_path)
+
+def getDirectory(path, check_fs = False):
+    r"""Return the directory of path, or path without its trailing slash if it has one.
+
+    Keyword arguments:
+    check_fs  -- Return path itself if it's an existing directory, like fileTools.getDirectory(). (default False)"""
+    if check_fs and os.path.isdir(path):
+        return path
+    if path.endswith('/') or path.endswith('\\'):
+        return path[:-1]
+    return os.path.dirname(path)
+
+def getFileName(path):
+    r"""Return the file name of path."""
+    return os.path.basename(path)
+
+def fileKey(path, check_fs = False):
+    r"""Return the lowercase name of the file without extension.
+
+    Keyword arguments:
+    check_fs  -- Return None unless path is an existing file, like fileTools.fileKey(). (default False)"""
+    if check_fs and not os.path.isfile(path):
+        return None
+    return os.path.basename(path).lower().split(".")[0]
+
+def fileExt(path, check_fs = False):
+    r"""Return the lowercase extension of the file without a dot.
+
+    Keyword arguments:
+    check_fs  -- Return None unless path is an existing file, like fileTools.fileExt(). (default False)"""
+    if check_fs and not os.path.isfile(path):
+        return None
+    return os.path.basename(path).lower().split(".")[-1]
+
+def getRelativePathFrom(src_path, trg_path):
+    r"""Return trg_path as a lowercase relative path from the directory of src_path.
+    Both are taken as file paths unless they end in a slash. The result matches fileTools.getRelativePathFrom()
+    for files and is cached per source directory."""
+    return _getRelativePath(getDirectory(src_path.replace('\\', '/').lower()), trg_path.replace('\\', '/').lower())
+
+@memoize()
+def _getRelativePath(src_dir, trg_path):
+    trg_fn = trg_path.split('/')[-1]
+    trg_dir = getDirectory(trg_path)
+    src_tk_path = src_dir.split('/')
+    trg_tk_path = trg_dir.split('/')
+    minlen = min([len(src_tk_path),len(trg_tk_path)])
+    for i in range(minlen):
+        if src_tk_path[0] == trg_tk_path[0]:
+            src_tk_path.pop(0)
+            trg_tk_path.pop(0)
+    ret_path = '/'.join([".." for x in src_tk_path])
+    ret_path = '/'.join([ret_path] + trg_tk_path)
+    if trg_fn:
+        ret_path = '/'.join([ret_path, trg_fn])
+    else:
+        ret_path += '/'
+    return ret_path.lstrip('/')
@@ -2,9 +2,22 @@
 A collection of tools to assist with substance designer.
 
 Classes:
+SBSDependencyIndex -- In-memory dependency graph of the sbs files under a root.
+SBSDocument -- An sbs file parsed once for a series of edits and written once.
+SBSRenderJob -- A single sbsrender call and its result.
+SBSRenderCache -- A content addressed store of rendered sbsar outputs.
+SBSRenderQueue -- Run many sbsrender jobs with a bounded number of concurrent processes.
 
 Functions:
 getDependencies(sbs_path) -- Return a list of dependencies.
+readSBSRecord(sbs_path) -- Return the dependencies and graph references of an sbs as plain data.
+iterDependencies(sbs_path) -- Stream the (filename, uid) of each dependency.
+iterGraphs(sbs_path) -- Stream the graph elements.
+iterSBSRecords(sbs_path_ls) -- Yield readSBSRecord() for many sbs, optionally in a process pool.
+makePackages(asset_ls) -- Make a package per asset from a single load of the package template.
+getRenderArgs(sbsar_path, output, out_path) -- Return the sbsrender argument list.
+getSBSAliases() -- Return the url aliases, discovering the Substance config on first use.
+setSBSConfig(config_fpn, packages_dir) -- Set the url aliases explicitly.
 
 Exceptions:
 
@@ -18,10 +31,20 @@ commandline to render using sbsrender.exe:
 # IMPORTS
 #===============================================================================
 import fileTools as ft
+import pathtools
 import xml.etree.ElementTree as et
 import uuid
+import copy
+import tempfile
 from getpass import getuser
 import subprocess
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import itertools
+import time
+import threading
+import shutil
+import signal
 import printtools as pt
 #===============================================================================
 # CONSTANTS
@@ -29,16 +52,10 @@ import printtools as pt
 SBSTEMPLATE_EMPTY = r"C:\Leviathan\src\substance_library\Cryptic\Cryptic_Empty.sbs"
 
 #Load the Substance working environment paths (used for relative addresses specified by URL e.g. sbs://)
-SBSRENDER = r"C:\Program Files\Allegorithmic\Substance\Designer\4.x\sbsrender.exe"
+SBSRENDER = ft.os.environ.get('SBSRENDER', r"C:\Program Files\Allegorithmic\Substance\Designer\4.x\sbsrender.exe")
 SBSALIASES = {'sbs':r"C:\Program Files\Allegorithmic\Substance\Designer\4.x\resources\packages"} 
-config_dir = 'c:/users/{username}/AppData/Local/Allegorithmic/'.format(username = getuser())
-config_fpn = ft.searchFiles(config_dir, 'xml', 'user_preferences')
-config_fpn = [x for x in config_fpn if x.lower().find('substance-designer') != -1][0]
-tree = et.parse(config_fpn)
-root = tree.getroot()
-SBSALIASES['sbs'] = root.findtext('.//packagesdir')
-tree = None
-root = None
+SBSCONFIG_DIR = 'c:/users/{username}/AppData/Local/Allegorithmic/'.format(username = getuser())
+_sbs_config_loaded = False
 
 #===============================================================================
 # CLASSES
@@ -94,6 +111,8 @@ class SBS(object):
     SBSTAG_UID          = "uid"
     SBSTAG_GRAPH        = "graph"
     
+    PACKAGE_TEMPLATE    = r'C:\Leviathan\src\substance_library\Cryptic\Cryptic_Package.sbs'
+    
     def __init__(self,
                  tex_m_fpn,
                  tex_n_fpn,
@@ -102,7 +121,9 @@ class SBS(object):
                  tex_wsn_fpn,
                  tex_p_fpn,
                  geo_l_fpn,
-                 package_template = r'C:\Leviathan\src\substance_library\Cryptic\Cryptic_Package.sbs'):
+                 package_template = PACKAGE_TEMPLATE,
+                 package_doc = None):
+        r"""package_doc is an already loaded SBSDocument of package_template to edit in place of loading it."""
         self.package_path   = package_template
         
         self.tex_m_fpn      = tex_m_fpn
@@ -113,8 +134,9 @@ class SBS(object):
         self.tex_p_fpn      = tex_p_fpn
         self.geo_l_fpn      = geo_l_fpn
         self.package_template = package_template
-        self.package_tree = et.parse(self.package_template)
-        self.package_root = self.package_tree.getroot()
+        self.package_doc = package_doc if package_doc else SBSDocument(self.package_template, readonly = True)
+        self.package_tree = self.package_doc.tree
+        self.package_root = self.package_doc.root
         self.UID = None
         self.__getDepUID()
         self.uid_ls = []
@@ -125,7 +147,9 @@ class SBS(object):
     
     def __getDepUID(self):
         r"""Each package has a UID for self.  Find it."""
-        rsrc = self.package_root.findall(".//*[@v='?himself']/../uid")[0]
+        rsrc = self.package_doc.findSibling('?himself', 'uid')
+        if rsrc == None:
+            raise SBS_MissingElementError(".//*[@v='?himself']/../uid", self.package_root)
         self.UID = rsrc.get('v')
         
     def setMap(self, maptype, new_path, res):
@@ -134,36 +158,33 @@ class SBS(object):
         for MAPTYPE in SBS.MAPTYPE_LIST:
             if maptype == MAPTYPE[SBS.FORMAT_FULL]:
                 maptype = MAPTYPE[SBS.FORMAT_SWAP]
-        rel_path = ft.getRelativePathFrom(ft.getDirectory(self.package_path), new_path)
+        rel_path = pathtools.getRelativePathFrom(self.package_path, new_path)
         map_name = new_path.split('/')[-1]
         map_name = map_name.split('.')[0]
         #correct rel_path filename capitalization to original
         rel_path = '/'.join(rel_path.split('/')[:-1] + [new_path.split('/')[-1]])
         
         #set new file-path for resource
-        rsrc = self.package_root.findall(".//*[@v='{}']/../filepath".format(maptype))
-        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
-        rsrc = rsrc[0]
-        rsrc.set('v',rel_path)
+        rsrc = self.package_doc.findSibling(maptype, 'filepath')
+        if rsrc == None: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        self.package_doc.setValue(rsrc, rel_path)
         
         #set new file-name for resource
-        rsrc = self.package_root.findall(".//*[@v='{}']/../identifier".format(maptype))
-        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
-        rsrc = rsrc[0]
-        rsrc.set('v','{}'.format(map_name))
+        rsrc = self.package_doc.findSibling(maptype, 'identifier')
+        if rsrc == None: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        self.package_doc.setValue(rsrc, '{}'.format(map_name))
         
         #update graph node that references the resource
-        rsrc_node = self.package_root.findall(".//*[@v='pkg://Resources/{}?dependency={}']/../../../../../../".format(maptype, self.UID))
-        if len(rsrc_node) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc_ls = self.package_doc.findByValue('pkg://Resources/{}?dependency={}'.format(maptype, self.UID))
+        if len(rsrc_ls) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
+        rsrc_node = self.package_doc.getAncestor(rsrc_ls[0], 6)
+        if rsrc_node == None or len(rsrc_node) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
         rsrc_node = rsrc_node[0]
         #set the output node resolution
-        rsrc_node.findall('.//constantValueInt2/value')[0].set('v', res)
+        self.package_doc.setValue(rsrc_node.findall('.//constantValueInt2/value')[0], res)
                         
         #update graph node that references the resource
-        rsrc = self.package_root.findall(".//*[@v='pkg://Resources/{}?dependency={}']".format(maptype, self.UID))
-        if len(rsrc) == 0: raise SBS_SetMapError(maptype, "template may be corrupt.")
-        rsrc = rsrc[0]
-        rsrc.set('v','pkg://Resources/{}?dependency={}'.format(map_name, self.UID))
+        self.package_doc.setValue(rsrc_ls[0], 'pkg://Resources/{}?dependency={}'.format(map_name, self.UID))
     
     def report(self, sbs_elem = None, depth = 0, file_path = None):
         r"""Dump the SBS node tree to console and if filepath is provided to file."""
@@ -181,18 +202,21 @@ class SBS(object):
     
     def setModel(self, model_path):
         #update graph node that references the resource
-        rsrc = self.package_root.findall(".//*[@v='{}']/../filepath".format('geo_low'))
-        if len(rsrc) == 0: raise SBS_SetModelError("template may be corrupt.")
-        rsrc = rsrc[0]
-        rsrc.set('v','{}'.format(ft.getRelativePathFrom(ft.getDirectory(self.package_path), model_path)))
-        rsrc = self.package_root.findall(".//*[@v='{}']/../identifier".format('geo_low'))
-        if len(rsrc) == 0: raise SBS_SetModelError("template may be corrupt.")
-        rsrc = rsrc[0]
-        rsrc.set('v','{}'.format(ft.fileKey(model_path)))
+        rsrc = self.package_doc.findSibling('geo_low', 'filepath')
+        if rsrc == None: raise SBS_SetModelError("template may be corrupt.")
+        self.package_doc.setValue(rsrc, '{}'.format(pathtools.getRelativePathFrom(self.package_path, model_path)))
+        rsrc = self.package_doc.findSibling('geo_low', 'identifier')
+        if rsrc == None: raise SBS_SetModelError("template may be corrupt.")
+        self.package_doc.setValue(rsrc, '{}'.format(ft.fileKey(model_path)))
         
     
     def makePackage(self, path, res = '11 11'):
         r"""Make a package from files in directory."""
+        self.setPackage(path, res)
+        self.package_tree.write(path)        
+    
+    def setPackage(self, path, res = '11 11'):
+        r"""Set the maps and model of the package to be written at path without writing it."""
         self.package_path = path
         self.setMap(SBS.MAPTYPE_MATERIAL[SBS.FORMAT_PARAM], self.tex_m_fpn, res)
         self.setMap(SBS.MAPTYPE_NORMAL[SBS.FORMAT_PARAM], self.tex_n_fpn, res)
@@ -203,53 +227,1083 @@ class SBS(object):
         
         
         self.setModel(self.geo_l_fpn)
-        self.package_tree.write(path)        
+
+
+class SBSDependencyIndex(object):
+    r"""An in-memory dependency graph of the sbs files under a root.
+    
+    Every sbs is parsed once with readSBSRecord() and the forward edges
+    (file -> dependency filenames/uids, graph -> compInstance targets) are
+    kept along with reverse edges so "who depends on X" is a lookup.
+    
+    Dependency paths are keyed by their absolute, normalized, lowercase path
+    (see depKey()); alias dependencies (e.g. sbs://) are keyed as written.
+    
+    Keyword arguments:
+    cache_fpn  -- A json file the records are saved to and loaded from, keyed
+                  by path, mtime and size, so refresh() only re-parses the sbs
+                  files that changed since the last save(). (default None)
+    use_hash   -- If True, a file whose mtime or size changed is re-parsed only
+                  if its content hash changed too. (default False)
+    
+    Methods:
+    build()              -- Parse every sbs under a root into the index.
+    refresh()            -- Re-parse only the changed, added and deleted sbs under a root.
+    load()               -- Load the records from cache_fpn.
+    save()               -- Save the records to cache_fpn.
+    addFile()            -- (Re)index a single sbs.
+    removeFile()         -- Drop a single sbs from the index.
+    getDependentFiles()  -- Return the sbs files depending on an sbs.
+    getGraphDependents() -- Return (sbs, graph) pairs instancing a graph of an sbs.
+    getDependencies()    -- Return the dependency filenames of an indexed sbs.
+    getGraphs()          -- Return the graph identifiers of an indexed sbs.
+    findBrokenFiles()    -- Return the indexed sbs files with missing file dependencies.
+    """
+    CACHE_VERSION = 1
+    
+    def __init__(self, cache_fpn = None, use_hash = False):
+        self.cache_fpn = cache_fpn
+        self.use_hash = use_hash
+        self.records = {}
+        self.stamps = {}
+        self._dependents = {}
+        self._graph_dependents = {}
+        if cache_fpn and ft.os.access(cache_fpn, ft.os.F_OK):
+            self.load()
+    
+    @staticmethod
+    def depKey(fpn):
+        r"""Return the key used to index the absolute path fpn."""
+        return pathtools.normPath(fpn)
+    
+    @staticmethod
+    def resolveDependency(sbs_fpn, dep_relfpn):
+        r"""Return the index key of dep_relfpn as referenced from within sbs_fpn."""
+        if dep_relfpn == '?himself':
+            return SBSDependencyIndex.depKey(sbs_fpn)
+        if dep_relfpn.split(':')[0] in SBSALIASES:
+            return dep_relfpn.lower()
+        return pathtools.joinPath(ft.os.path.dirname(sbs_fpn), dep_relfpn)
+    
+    def build(self, root_path, pbar = None, workers = None, errors = None):
+        r"""Parse every sbs under root_path into the index and return self.
+        
+        Keyword arguments:
+        pbar     -- An optional progress object, reset(maxcount) to the file count and updated per file.
+        workers  -- Parse in a pool of this many processes. (default None, serial)
+        errors   -- See iterSBSRecords()."""
+        sbs_fpn_ls = ft.searchFiles(root_path, 'sbs')
+        if pbar:
+            pbar.reset(len(sbs_fpn_ls))
+        for sbs_fpn, record in iterSBSRecords(sbs_fpn_ls, workers, pbar, errors):
+            self.addFile(sbs_fpn, record)
+            self.stamps[sbs_fpn] = self.stampFile(sbs_fpn)
+        return self
+    
+    def refresh(self, root_path, pbar = None, workers = None, errors = None):
+        r"""Bring the index up to date with the sbs files under root_path.
+        Files whose path, mtime and size match the stored stamp reuse their record,
+        changed and added files are re-parsed and missing files are dropped, as are
+        changed files that no longer parse.
+        Saves to cache_fpn if one was given.
+        Return a (reused, parsed, removed) tuple of file counts.
+        
+        Keyword arguments:
+        pbar     -- An optional progress object with an update() method called per file.
+        workers  -- Parse the changed files in a pool of this many processes. (default None, serial)
+        errors   -- See iterSBSRecords()."""
+        reused = parsed = removed = 0
+        sbs_fpn_ls = [x.replace('\\', '/') for x in ft.searchFiles(root_path, 'sbs')]
+        root_key = SBSDependencyIndex.depKey(root_path) + '/'
+        found = set(sbs_fpn_ls)
+        for sbs_fpn in self.records.keys():
+            if not sbs_fpn in found and SBSDependencyIndex.depKey(sbs_fpn).startswith(root_key):
+                self.removeFile(sbs_fpn)
+                removed += 1
+        changed_ls = []
+        for sbs_fpn in sbs_fpn_ls:
+            stamp = self.stampFile(sbs_fpn)
+            old_stamp = self.stamps.get(sbs_fpn)
+            if old_stamp and old_stamp[:2] == stamp[:2]:
+                reused += 1
+            elif old_stamp and self.use_hash and old_stamp[2] == self.hashFile(sbs_fpn):
+                self.stamps[sbs_fpn] = stamp[:2] + [old_stamp[2]]
+                reused += 1
+            else:
+                changed_ls.append(sbs_fpn)
+                continue
+            if pbar:
+                pbar.update()
+        unread = set(changed_ls)
+        for sbs_fpn, record in iterSBSRecords(changed_ls, workers, pbar, errors):
+            unread.discard(sbs_fpn)
+            self.addFile(sbs_fpn, record)
+            stamp = self.stampFile(sbs_fpn)
+            if self.use_hash:
+                stamp[2] = self.hashFile(sbs_fpn)
+            self.stamps[sbs_fpn] = stamp
+            parsed += 1
+        for sbs_fpn in unread:
+            if sbs_fpn in self.records:
+                self.removeFile(sbs_fpn)
+                removed += 1
+        if self.cache_fpn:
+            self.save()
+        return (reused, parsed, removed)
+    
+    def stampFile(self, sbs_fpn):
+        r"""Return the [mtime, size, hash] stamp of sbs_fpn, hash is None unless use_hash."""
+        st = ft.os.stat(sbs_fpn)
+        return [st.st_mtime, st.st_size, None]
+    
+    def hashFile(self, sbs_fpn):
+        r"""Return the sha1 hex digest of the content of sbs_fpn."""
+        return ft.hashFile(sbs_fpn)
+    
+    def load(self):
+        r"""Load the records from cache_fpn, replacing the indexed ones."""
+        with open(self.cache_fpn, 'r') as f:
+            cache = ft.json.load(f)
+        self.records = {}
+        self.stamps = {}
+        self._dependents = {}
+        self._graph_dependents = {}
+        if cache.get('version') != SBSDependencyIndex.CACHE_VERSION:
+            return
+        for sbs_fpn, entry in cache['files'].iteritems():
+            self.addFile(sbs_fpn, entry['record'])
+            self.stamps[sbs_fpn] = entry['stamp']
+    
+    def save(self):
+        r"""Save the records to cache_fpn."""
+        files = dict([(k, {'stamp' : self.stamps.get(k), 'record' : v}) for k, v in self.records.iteritems()])
+        tmp_fpn = self.cache_fpn + '.tmp'
+        with open(tmp_fpn, 'w') as f:
+            ft.json.dump({'version' : SBSDependencyIndex.CACHE_VERSION, 'files' : files}, f)
+        ft.replaceFile(tmp_fpn, self.cache_fpn)
+    
+    def addFile(self, sbs_fpn, record = None):
+        r"""(Re)index sbs_fpn, parsing it unless its record is given."""
+        sbs_fpn = sbs_fpn.replace('\\', '/')
+        if sbs_fpn in self.records:
+            self.removeFile(sbs_fpn)
+        if record == None:
+            stamp = self.stampFile(sbs_fpn)
+            if self.use_hash:
+                stamp[2] = self.hashFile(sbs_fpn)
+            record = readSBSRecord(sbs_fpn)
+            self.stamps[sbs_fpn] = stamp
+        self.records[sbs_fpn] = record
+        dep_key_dct = {}
+        for dep_relfpn, dep_uid in record['deps']:
+            dep_key = SBSDependencyIndex.resolveDependency(sbs_fpn, dep_relfpn)
+            dep_key_dct[dep_uid] = dep_key
+            self._dependents.setdefault(dep_key, set()).add(sbs_fpn)
+        for graph_nm, inst_ls in record['graphs'].iteritems():
+            for inst_graph_nm, inst_dep_uid in inst_ls:
+                if not inst_dep_uid in dep_key_dct:
+                    continue
+                key = (dep_key_dct[inst_dep_uid], inst_graph_nm.lower())
+                self._graph_dependents.setdefault(key, set()).add((sbs_fpn, graph_nm))
+    
+    def removeFile(self, sbs_fpn):
+        r"""Drop sbs_fpn and its edges from the index."""
+        sbs_fpn = sbs_fpn.replace('\\', '/')
+        record = self.records.pop(sbs_fpn, None)
+        self.stamps.pop(sbs_fpn, None)
+        if record == None:
+            return
+        dep_key_dct = {}
+        for dep_relfpn, dep_uid in record['deps']:
+            dep_key = SBSDependencyIndex.resolveDependency(sbs_fpn, dep_relfpn)
+            dep_key_dct[dep_uid] = dep_key
+            if not dep_key in self._dependents:
+                continue
+            self._dependents[dep_key].discard(sbs_fpn)
+            if not self._dependents[dep_key]:
+                del self._dependents[dep_key]
+        for graph_nm, inst_ls in record['graphs'].iteritems():
+            for inst_graph_nm, inst_dep_uid in inst_ls:
+                key = (dep_key_dct.get(inst_dep_uid), inst_graph_nm.lower())
+                if not key in self._graph_dependents:
+                    continue
+                self._graph_dependents[key].discard((sbs_fpn, graph_nm))
+                if not self._graph_dependents[key]:
+                    del self._graph_dependents[key]
+    
+    def getDependentFiles(self, dep_fpn):
+        r"""Return a sorted list of indexed sbs files dependent on dep_fpn."""
+        return sorted(self._dependents.get(SBSDependencyIndex.depKey(dep_fpn), ()))
+    
+    def getGraphDependents(self, dep_fpn, graph_nm):
+        r"""Return a sorted list of (sbs file, graph identifier) instancing graph_nm from dep_fpn."""
+        key = (SBSDependencyIndex.depKey(dep_fpn), graph_nm.lower())
+        return sorted(self._graph_dependents.get(key, ()))
+    
+    def getDependencies(self, sbs_fpn):
+        r"""Return a list of dependency filenames of sbs_fpn as written in the file."""
+        return [x[0] for x in self.records[sbs_fpn.replace('\\', '/')]['deps']]
+    
+    def getGraphs(self, sbs_fpn):
+        r"""Return a list of graph identifiers within sbs_fpn."""
+        return self.records[sbs_fpn.replace('\\', '/')]['graphs'].keys()
+    
+    def findBrokenFiles(self):
+        r"""Return a sorted list of indexed sbs files with broken file dependencies."""
+        ret_ls = []
+        for sbs_fpn, record in self.records.iteritems():
+            for dep_relfpn, dep_uid in record['deps']:
+                if not ft.os.access(pathtools.getDirectory(sbs_fpn) + '/' + dep_relfpn, ft.os.F_OK):
+                    ret_ls.append(sbs_fpn)
+                    break
+        return sorted(ret_ls)
+
+
+class SBSDocument(object):
+    r"""An sbs file parsed once for a series of edits and written once.
+    
+    Used as a context manager the edits are written on exit, unless an
+    exception was raised or nothing was changed.  Writes go to a temp file
+    next to the sbs that then replaces it.
+    
+    Arguments:
+    sbs_fpn   -- Path to the sbs file.
+    
+    Keyword arguments:
+    readonly  -- If True, the file is never written and doesn't need to be writable. (default False)
+    
+    Lookup tables (value -> elements, uid -> dependency, identifier -> graph,
+    child -> parent) are built on first use and kept up to date by setValue().
+    Edits that add or remove elements drop them to be rebuilt on the next lookup.
+    
+    Methods:
+    write()                 -- Write the document to its file or another path.
+    setValue()              -- Set the v attribute of an element.
+    checkpoint()            -- Start recording setValue() edits for rollback().
+    rollback()              -- Undo the setValue() edits since checkpoint().
+    findByValue()           -- Return the elements with a v attribute.
+    getParent()             -- Return the parent of an element.
+    getAncestor()           -- Return the ancestor of an element some levels up.
+    findGraph()             -- Return the graph element with an identifier.
+    getDependencyByUid()    -- Return the dependency element with a uid.
+    hasDependency()         -- Return True if a file is among the dependencies.
+    getGraphDependencies()  -- Return {uid : dependency element} used by a graph.
+    getDependencyGraphs()   -- Return {graph uid : graph element} using a dependency.
+    copyGraph()             -- Copy a graph and its dependencies from another SBSDocument.
+    removeGraph()           -- Remove a graph and its dependencies no longer in use.
+    renameGraph()           -- Rename a graph and the references to it.
+    renameGraphReferences() -- Rename the references to a graph.
+    changeDependencyPath()  -- Change the path of a dependency.
+    reconnectDependency()   -- Point dependencies on one file to another.
+    """
+    def __init__(self, sbs_fpn, readonly = False):
+        if not readonly and not ft.os.access(sbs_fpn, ft.os.W_OK):
+            raise SBS_IOError(sbs_fpn)
+        self.fpn = sbs_fpn
+        self.readonly = readonly
+        self.modified = False
+        self.tree, self.root = openSBS(sbs_fpn)
+        self._parent_map = None
+        self._value_map = None
+        self._dep_uid_map = None
+        self._graph_map = None
+        self._undo_ls = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type == None and self.modified and not self.readonly:
+            self.write()
+        return False
+    
+    def write(self, sbs_fpn = None):
+        r"""Write the document to sbs_fpn (default its own file) through a temp file.
+        The temp file is made like a new file, under the umask, and takes the mode of an
+        existing sbs_fpn before it's moved over it."""
+        sbs_fpn = sbs_fpn if sbs_fpn else self.fpn
+        tmp_fpn = '{}.{}.{}.tmp'.format(sbs_fpn, ft.os.getpid(), threading.current_thread().ident)
+        try:
+            self.tree.write(tmp_fpn,
+                            encoding = "UTF-8",
+                            xml_declaration = True,
+                            method = "xml")
+            if ft.os.path.exists(sbs_fpn):
+                shutil.copymode(sbs_fpn, tmp_fpn)
+            ft.replaceFile(tmp_fpn, sbs_fpn)
+        finally:
+            if ft.os.path.exists(tmp_fpn):
+                ft.os.remove(tmp_fpn)
+        if sbs_fpn == self.fpn:
+            self.modified = False
+    
+    def _buildIndex(self):
+        self._parent_map = {}
+        self._value_map = {}
+        self._dep_uid_map = {}
+        self._graph_map = {}
+        for parent in self.root.iter():
+            for child in parent:
+                self._parent_map[child] = parent
+                v = child.get('v')
+                if v != None:
+                    self._value_map.setdefault(v, []).append(child)
+                    self._indexValue(child, parent, v)
+    
+    def _indexValue(self, elem, parent, v):
+        if parent.tag == 'dependency' and elem.tag == 'uid':
+            self._dep_uid_map[v] = parent
+        elif parent.tag == 'graph' and elem.tag == 'identifier':
+            self._graph_map.setdefault(v, parent)
+    
+    def _invalidate(self):
+        self._parent_map = None
+        self.modified = True
+    
+    def _index(self):
+        if self._parent_map == None:
+            self._buildIndex()
+    
+    def setValue(self, elem, v):
+        r"""Set the v attribute of elem, keeping the lookup tables up to date."""
+        self._index()
+        old_v = elem.get('v')
+        if self._undo_ls != None:
+            self._undo_ls.append((elem, old_v))
+        elem.set('v', v)
+        self.modified = True
+        if old_v in self._value_map and elem in self._value_map[old_v]:
+            self._value_map[old_v].remove(elem)
+        self._value_map.setdefault(v, []).append(elem)
+        parent = self._parent_map.get(elem)
+        if parent == None:
+            return
+        if self._dep_uid_map.get(old_v) is parent:
+            del self._dep_uid_map[old_v]
+        if self._graph_map.get(old_v) is parent:
+            del self._graph_map[old_v]
+        self._indexValue(elem, parent, v)
+    
+    def checkpoint(self):
+        r"""Start recording setValue() edits so rollback() can undo them."""
+        self._undo_ls = []
+    
+    def rollback(self):
+        r"""Undo the setValue() edits made since checkpoint() and stop recording."""
+        undo_ls = self._undo_ls if self._undo_ls else []
+        self._undo_ls = None
+        for elem, v in reversed(undo_ls):
+            if v == None:
+                elem.attrib.pop('v', None)
+                self._parent_map = None
+            else:
+                self.setValue(elem, v)
+    
+    def findByValue(self, v):
+        r"""Return a list of elements below the root whose v attribute is v, as with .//*[@v='v']."""
+        self._index()
+        return list(self._value_map.get(v, ()))
+    
+    def getParent(self, elem):
+        r"""Return the parent element of elem or None for the root."""
+        self._index()
+        return self._parent_map.get(elem)
+    
+    def getAncestor(self, elem, levels):
+        r"""Return the element levels above elem or None if the root is reached first."""
+        for i in xrange(levels):
+            if elem == None:
+                return None
+            elem = self.getParent(elem)
+        return elem
+    
+    def findSibling(self, v, tag):
+        r"""Return the first tag element next to an element whose v attribute is v, as with .//*[@v='v']/../tag."""
+        for elem in self.findByValue(v):
+            parent = self.getParent(elem)
+            sibling = parent.find(tag) if parent != None else None
+            if sibling != None:
+                return sibling
+    
+    def findGraph(self, graph_nm):
+        r"""Return the graph element identified by graph_nm or None."""
+        self._index()
+        return self._graph_map.get(graph_nm)
+    
+    def getDependencyByUid(self, uid):
+        r"""Return the dependency element with uid or None."""
+        self._index()
+        return self._dep_uid_map.get(uid)
+    
+    def getDependencyElements(self):
+        r"""Return a list of the dependency elements."""
+        return self.root.findall('.//dependency')
+    
+    def hasDependency(self, dep_fpn):
+        r"""Return True if dep_fpn is among the dependencies, False otherwise."""
+        dep_fpn_rel = pathtools.getRelativePathFrom(self.fpn, dep_fpn)
+        return dep_fpn_rel in [x.find('filename').get('v').lower() for x in self.getDependencyElements()]
+    
+    def getGraphDependencies(self, graph_nm):
+        r"""Return a dict of {uid : dependency element} referenced by graph_nm."""
+        graph_elem = self.findGraph(graph_nm)
+        if graph_elem == None:
+            raise SBS_MissingElementError(".//graph/identifier[@v='{}']/..".format(graph_nm), self.root)
+        return self._getGraphElemDependencies(graph_elem)
+    
+    def _getGraphElemDependencies(self, graph_elem):
+        ret_dep_dct = {}
+        for graph_elem_dep in graph_elem.findall('.//compInstance'):
+            graph_dep_id = graph_elem_dep.find('.//path/value').get('v').split('=')[-1]
+            if not graph_dep_id in ret_dep_dct:
+                dep = self.getDependencyByUid(graph_dep_id)
+                if dep != None:
+                    ret_dep_dct[graph_dep_id] = dep
+        return ret_dep_dct
+    
+    def getDependencyGraphs(self, dep_fpn):
+        r"""Return a dictionary of {graph uid : graph element} using dep_fpn."""
+        dep_relfpn = pathtools.getRelativePathFrom(self.fpn, dep_fpn)
+        if dep_fpn.split(':')[0] in SBSALIASES:
+            dep_relfpn = dep_fpn
+        dep_dct = dict([(x.find('./filename').get('v').lower(), x) for x in self.getDependencyElements()])
+        return self._getUidGraphs(dep_dct[dep_relfpn].find('uid').get('v'))
+    
+    def _getUidGraphs(self, dep_uid):
+        ret_dct = {}
+        for graph_elem in self.root.findall('.//graph'):
+            graph_uid = graph_elem.find('.//uid').get('v')
+            if dep_uid in self._getGraphElemDependencies(graph_elem) and not graph_uid in ret_dct:
+                ret_dct[graph_uid] = graph_elem
+        return ret_dct
+    
+    def copyGraph(self, src_doc, graph_nm):
+        r"""Copy graph_nm and the dependencies it uses from the SBSDocument src_doc into this one."""
+        if self.findGraph(graph_nm) != None:
+            raise SBS_CopyGraphError(src_doc.fpn, self.fpn, graph_nm)
+        graph_elem_src = src_doc.findGraph(graph_nm)
+        if graph_elem_src == None:
+            raise SBS_CopyGraphError(src_doc.fpn, self.fpn, graph_nm)
+        content_trg = self.root.find('content')
+        dependencies_trg = self.root.find('dependencies')
+        if content_trg == None or dependencies_trg == None:
+            raise SBS_CopyGraphError(src_doc.fpn, self.fpn, graph_nm)
+        
+        #Check/find/compare/copy dependencies.
+        for graph_dep_src in src_doc.getGraphDependencies(graph_nm).itervalues():
+            graph_dep_src = copy.deepcopy(graph_dep_src)
+            graph_dep_src_relfpn = graph_dep_src.find('filename').get('v')
+            himself = graph_dep_src_relfpn == '?himself'
+            alias = graph_dep_src_relfpn.split(':')[0]
+            graph_dep_fpn_src = ft.os.path.split(src_doc.fpn)[0] + "/" + graph_dep_src_relfpn
+            if alias in SBSALIASES:
+                graph_dep_fpn_src = graph_dep_src_relfpn
+            if himself:
+                graph_dep_fpn_src = pathtools.getRelativePathFrom(self.fpn, src_doc.fpn)
+            if self.hasDependency(graph_dep_fpn_src):
+                continue
+            graph_dep_fpn_src_abs = ft.os.path.normpath(graph_dep_fpn_src).replace('\\', '/')
+            if alias in SBSALIASES:
+                graph_dep_fpn_src_abs = ft.os.path.normpath(graph_dep_src_relfpn.replace(alias + ':', getSBSAliases()[alias])).replace('\\', '/')
+            if graph_dep_fpn_src_abs.lower() == self.fpn.replace('\\','/').lower():
+                continue
+            if himself:
+                graph_dep_src.find('filename').set('v', graph_dep_fpn_src)
+            else:
+                graph_dep_src.find('filename').set('v', pathtools.getRelativePathFrom(self.fpn, graph_dep_fpn_src_abs))
+            dependencies_trg.append(graph_dep_src)
+        
+        content_trg.append(copy.deepcopy(graph_elem_src))
+        self._invalidate()
+    
+    def removeGraph(self, graph_nm):
+        r"""Remove graph_nm and any of its dependencies no longer used by another graph."""
+        content = self.root.find('./content')
+        graph = content.find('./graph/identifier[@v=\'{}\']/..'.format(graph_nm))
+        graph_dep_dct = self.getGraphDependencies(graph_nm)
+        if graph != None:
+            content.remove(graph)
+            self._invalidate()
+        deps_elem = self.root.find('.//dependencies')
+        for graph_dep_id, graph_dep in graph_dep_dct.iteritems():
+            if len(self._getUidGraphs(graph_dep_id)) == 0:
+                if deps_elem == None:
+                    raise SBS_MissingElementError('.//dependencies', self.root)
+                deps_elem.remove(graph_dep)
+                self._invalidate()
+    
+    def renameGraphReferences(self, old_graph_nm, new_graph_nm):
+        r"""Rename references to old_graph_nm from compInstances."""
+        for graph_ref in self.root.findall('.//compInstance/path/value'):
+            graph_ref_graphname = graph_ref.get('v').split('?')[0].split('/')[-1]
+            graph_ref_depinfo = graph_ref.get('v').split('?')[-1]
+            if old_graph_nm.lower() == graph_ref_graphname.lower():
+                self.setValue(graph_ref, 'pkg://{}?{}'.format(new_graph_nm, graph_ref_depinfo))
+    
+    def renameGraph(self, old_graph_nm, new_graph_nm):
+        r"""Rename old_graph_nm and the references to it."""
+        self.renameGraphReferences(old_graph_nm, new_graph_nm)
+        for graph_ref in self.root.findall('.//graph/identifier'):
+            if old_graph_nm.lower() == graph_ref.get('v').lower():
+                self.setValue(graph_ref, new_graph_nm)
+    
+    def changeDependencyPath(self, dep_fpn_old, dep_fpn_new):
+        r"""Change the path of the dependency on dep_fpn_old to dep_fpn_new."""
+        dep_relfpn_old = pathtools.getRelativePathFrom(self.fpn, dep_fpn_old)
+        dep_relfpn_new = pathtools.getRelativePathFrom(self.fpn, dep_fpn_new)
+        dep_dct = dict([(x.find('./filename').get('v').lower(), x) for x in self.getDependencyElements()])
+        self.setValue(dep_dct[dep_relfpn_old].find('filename'), dep_relfpn_new)
+    
+    def reconnectDependency(self, sbs_fpn_old, sbs_fpn_new):
+        r"""Point the dependencies on sbs_fpn_old to sbs_fpn_new. Return number of dependencies fixed."""
+        num_fixed = 0
+        sbs_fpn_old = pathtools.getRelativePathFrom(self.fpn, sbs_fpn_old).lower().replace('\\','/')
+        sbs_fpn_new = pathtools.getRelativePathFrom(self.fpn, sbs_fpn_new).lower().replace('\\','/')
+        for dep in self.getDependencyElements():
+            dep_fpn_elem = dep.find('filename')
+            if dep_fpn_elem.get('v').lower() == sbs_fpn_old:
+                self.setValue(dep_fpn_elem, sbs_fpn_new)
+                num_fixed += 1
+        return num_fixed
+
+
+class SBSRenderJob(object):
+    r"""A single sbsrender call queued in an SBSRenderQueue and its result.
+    
+    Arguments:
+    sbsar_path  -- The sbsar to render.
+    output      -- The graph output to render.
+    out_path    -- The directory the tga files are written to.
+    
+    Keyword arguments:
+    width       -- The $outputsize width, if None the graph's native size is used. (default None)
+    height      -- The $outputsize height. (default None)
+    engine      -- The sbsrender engine. (default 'd3d10pc')
+    
+    Results set by the queue:
+    returncode    -- Exit code of the last attempt, None if it never ran.
+    duration      -- Seconds spent over all attempts.
+    attempts      -- Number of times sbsrender was run.
+    timed_out     -- True if the last attempt was killed for running over the timeout.
+    lines         -- The output lines of the last attempt.
+    output_files  -- The files the job wrote to out_path.
+    cached        -- True if output_files came from an SBSRenderCache instead of sbsrender.
+    """
+    def __init__(self, sbsar_path, output, out_path, width = None, height = None, engine = 'd3d10pc'):
+        self.sbsar_path = sbsar_path
+        self.output = output
+        self.out_path = out_path
+        self.width = width
+        self.height = height
+        self.engine = engine
+        self.returncode = None
+        self.duration = 0.0
+        self.attempts = 0
+        self.timed_out = False
+        self.lines = []
+        self.output_files = []
+        self.cached = False
+    
+    def getArgs(self, out_path = None):
+        r"""Return the sbsrender argument list, optionally rendering to another out_path."""
+        return getRenderArgs(self.sbsar_path, self.output, out_path if out_path else self.out_path,
+                             self.width, self.height, self.engine)
+    
+    def __str__(self):
+        return '{}:{}'.format(ft.os.path.basename(self.sbsar_path), self.output)
+    
+    def __repr__(self):
+        return '{!r}:{!r},{!r}'.format(self.sbsar_path, self.output, self.returncode)
+
+
+class SBSRenderCache(object):
+    r"""A content addressed store of rendered sbsar outputs.
+    
+    Entries are keyed by the sbsar content hash, graph output, $outputsize and
+    engine so a render of an unchanged sbsar can be served from disk.  Each
+    entry is a directory of the rendered files under root.  Hits refresh an
+    entry's mtime and the least recently used entries are evicted once the
+    store grows over max_bytes.
+    
+    Arguments:
+    root       -- The cache directory.
+    
+    Keyword arguments:
+    max_bytes  -- Size the store is trimmed to after each store(), None for unbounded. (default None)
+    link       -- If True, hits are hard-linked into place where possible instead of copied.
+                  Don't edit linked outputs in place. (default True)
+    
+    Attributes:
+    hits       -- Number of fetch() calls served from the cache.
+    misses     -- Number of fetch() calls that weren't.
+    
+    Methods:
+    getKey()   -- Return the key for a render.
+    fetch()    -- Place the files of an entry in a directory.
+    store()    -- Add rendered files as an entry.
+    evict()    -- Remove least recently used entries over max_bytes.
+    """
+    def __init__(self, root, max_bytes = None, link = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.link = link
+        self.hits = 0
+        self.misses = 0
+        self._hash_dct = {}
+        self._lock = threading.Lock()
+        _makeDirs(root)
+    
+    def hashFile(self, fpn):
+        r"""Return the sha1 of the content of fpn, remembered while its mtime and size don't change."""
+        st = ft.os.stat(fpn)
+        stamp = (st.st_mtime, st.st_size)
+        if fpn in self._hash_dct and self._hash_dct[fpn][0] == stamp:
+            return self._hash_dct[fpn][1]
+        self._hash_dct[fpn] = (stamp, ft.hashFile(fpn))
+        return self._hash_dct[fpn][1]
+    
+    def getKey(self, sbsar_path, output, width = None, height = None, engine = 'd3d10pc'):
+        r"""Return the cache key of rendering output from sbsar_path at a size with engine."""
+        outputsize = '{},{}'.format(width, height) if width != None and height != None else 'native'
+        return ft.hashlib.sha1('|'.join([self.hashFile(sbsar_path), output, outputsize, engine])).hexdigest()
+    
+    def fetch(self, key, out_path):
+        r"""Place the files of entry key in out_path and return their paths, or None on a miss.
+        An empty entry or one evicted while its files are placed is a miss."""
+        entry_path = ft.os.path.join(self.root, key)
+        try:
+            fn_ls = sorted(ft.os.listdir(entry_path))
+            if fn_ls:
+                ft.os.utime(entry_path, None)
+        except OSError:
+            fn_ls = []
+        if not fn_ls:
+            with self._lock:
+                self.misses += 1
+            return None
+        _makeDirs(out_path)
+        ret_ls = []
+        for fn in fn_ls:
+            src_fpn = ft.os.path.join(entry_path, fn)
+            fpn = '/'.join([out_path.replace('\\', '/').rstrip('/'), fn])
+            try:
+                if ft.os.path.exists(fpn):
+                    ft.os.remove(fpn)
+                if self.link and hasattr(ft.os, 'link'):
+                    try:
+                        ft.os.link(src_fpn, fpn)
+                        ret_ls.append(fpn)
+                        continue
+                    except OSError:
+                        pass
+                shutil.copy2(src_fpn, fpn)
+            except (OSError, IOError):
+                if ft.os.path.exists(src_fpn):
+                    raise
+                #evicted meanwhile, take back the files placed so far
+                for fpn in ret_ls:
+                    ft.os.remove(fpn)
+                with self._lock:
+                    self.misses += 1
+                return None
+            ret_ls.append(fpn)
+        with self._lock:
+            self.hits += 1
+        return ret_ls
+    
+    def store(self, key, fpn_ls):
+        r"""Add the files in fpn_ls as entry key, unless it exists or fpn_ls is empty, and evict over max_bytes."""
+        entry_path = ft.os.path.join(self.root, key)
+        if not fpn_ls or ft.os.path.isdir(entry_path):
+            return
+        tmp_path = tempfile.mkdtemp('', '.' + key, self.root)
+        try:
+            for fpn in fpn_ls:
+                shutil.copy2(fpn, ft.os.path.join(tmp_path, ft.os.path.basename(fpn)))
+            ft.os.rename(tmp_path, entry_path)
+        except OSError:
+            #another process stored the same entry first
+            pass
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+        self.evict()
+    
+    def evict(self):
+        r"""Remove the least recently used entries until the store is within max_bytes."""
+        if self.max_bytes == None:
+            return
+        with self._lock:
+            entry_ls = []
+            total = 0
+            for key in ft.os.listdir(self.root):
+                entry_path = ft.os.path.join(self.root, key)
+                if key.startswith('.') or not ft.os.path.isdir(entry_path):
+                    continue
+                size = sum([ft.os.path.getsize(ft.os.path.join(entry_path, x)) for x in ft.os.listdir(entry_path)])
+                entry_ls.append((ft.os.path.getmtime(entry_path), entry_path, size))
+                total += size
+            entry_ls.sort()
+            while total > self.max_bytes and entry_ls:
+                mtime, entry_path, size = entry_ls.pop(0)
+                shutil.rmtree(entry_path, ignore_errors = True)
+                total -= size
+
+
+class SBSRenderQueue(object):
+    r"""Run many sbsrender jobs with a bounded number of concurrent processes.
+    
+    Each job's output is streamed line by line as it's produced.  A job is killed
+    if it runs over the timeout and failed jobs are retried.  The renderer is
+    SBSRENDER, which can be pointed at a stand-in with the SBSRENDER environment
+    variable.
+    
+    Keyword arguments:
+    concurrency  -- The maximum number of sbsrender processes at once. (default 4)
+    timeout      -- Seconds before a job is killed, None for no limit. (default None)
+    retries      -- How many more times a failed or timed out job is run. (default 1)
+    retry_codes  -- If given, only jobs exiting with one of these codes (or timing out)
+                    are retried. (default None, any failure)
+    f_line       -- Function called with (job, line) for each output line.
+                    (default prints the line prefixed by the job)
+    cache        -- An SBSRenderCache to serve jobs from and store renders in. (default None)
+    
+    Methods:
+    add()        -- Queue a job.
+    run()        -- Run the queued jobs and return them with their results.
+    """
+    def __init__(self, concurrency = 4, timeout = None, retries = 1, retry_codes = None, f_line = None, cache = None):
+        self.concurrency = concurrency
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_codes = retry_codes
+        self.f_line = f_line if f_line else self._printLine
+        self.jobs = []
+        self._lock = threading.Lock()
+    
+    def _printLine(self, job, line):
+        with self._lock:
+            print '[{}] {}'.format(job, line)
+    
+    def add(self, sbsar_path, output, out_path, width = None, height = None, engine = 'd3d10pc'):
+        r"""Queue a render of output from sbsar_path into out_path and return its SBSRenderJob."""
+        job = SBSRenderJob(sbsar_path, output, out_path, width, height, engine)
+        self.jobs.append(job)
+        return job
+    
+    def run(self):
+        r"""Run the queued jobs and return them, in the order added, with their results set.
+        A job that fails with an exception gets returncode -1 and the error as its last line,
+        the other jobs still run. The queue is emptied."""
+        jobs, self.jobs = self.jobs, []
+        if not jobs:
+            return jobs
+        pool = ThreadPool(min(self.concurrency, len(jobs)))
+        try:
+            pool.map(self._runJob, jobs, 1)
+        finally:
+            pool.close()
+            pool.join()
+        return jobs
+    
+    def _runJob(self, job):
+        r"""Run a job, recording an error on the job instead of raising so the other jobs still run."""
+        t = time.time()
+        try:
+            self._renderJob(job, t)
+        except Exception as e:
+            job.returncode = -1
+            line = '{}: {}'.format(type(e).__name__, e)
+            job.lines.append(line)
+            job.duration = time.time() - t
+            self.f_line(job, line)
+    
+    def _renderJob(self, job, t):
+        cache_key = None
+        if self.cache:
+            cache_key = self.cache.getKey(job.sbsar_path, job.output, job.width, job.height, job.engine)
+            cached_ls = self.cache.fetch(cache_key, job.out_path)
+            if cached_ls != None:
+                job.returncode = 0
+                job.cached = True
+                job.output_files = cached_ls
+                job.duration = time.time() - t
+                return
+        _makeDirs(job.out_path)
+        #render to a directory of its own so the files written can be told apart from other jobs'
+        tmp_path = tempfile.mkdtemp('', '.sbsrender_', job.out_path)
+        try:
+            while job.attempts <= self.retries:
+                job.attempts += 1
+                self._runAttempt(job, tmp_path)
+                if job.returncode == 0:
+                    break
+                if not job.timed_out and self.retry_codes != None and not job.returncode in self.retry_codes:
+                    break
+            if job.returncode == 0:
+                for fn in sorted(ft.os.listdir(tmp_path)):
+                    fpn = '/'.join([job.out_path.replace('\\', '/').rstrip('/'), fn])
+                    ft.replaceFile(ft.os.path.join(tmp_path, fn), fpn)
+                    job.output_files.append(fpn)
+                if cache_key:
+                    self.cache.store(cache_key, job.output_files)
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+        job.duration = time.time() - t
+    
+    def _runAttempt(self, job, out_path):
+        job.lines = []
+        job.timed_out = False
+        for fn in ft.os.listdir(out_path):
+            ft.os.remove(ft.os.path.join(out_path, fn))
+        try:
+            #own process group so a timeout kills anything sbsrender started too
+            if ft.os.name == 'nt':
+                proc = subprocess.Popen(job.getArgs(out_path),
+                                        stdout = subprocess.PIPE,
+                                        stderr = subprocess.STDOUT,
+                                        bufsize = 1,
+                                        creationflags = subprocess.CREATE_NEW_PROCESS_GROUP)
+            else:
+                proc = subprocess.Popen(job.getArgs(out_path),
+                                        stdout = subprocess.PIPE,
+                                        stderr = subprocess.STDOUT,
+                                        bufsize = 1,
+                                        preexec_fn = ft.os.setsid)
+        except OSError as e:
+            job.returncode = -1
+            job.lines.append(str(e))
+            self.f_line(job, str(e))
+            return
+        timer = None
+        if self.timeout:
+            def kill():
+                job.timed_out = True
+                try:
+                    if ft.os.name == 'nt':
+                        subprocess.call(['taskkill', '/F', '/T', '/PID', str(proc.pid)])
+                    else:
+                        ft.os.killpg(proc.pid, signal.SIGKILL)
+                except OSError:
+                    pass
+            timer = threading.Timer(self.timeout, kill)
+            timer.start()
+        try:
+            for line in iter(proc.stdout.readline, ''):
+                line = line.rstrip('\r\n')
+                job.lines.append(line)
+                self.f_line(job, line)
+            proc.stdout.close()
+            job.returncode = proc.wait()
+        finally:
+            if timer:
+                timer.cancel()
 
 
 #===============================================================================
 # FUNCTIONS
 #===============================================================================
+def findSBSConfig(config_dir = None):
+    r"""Return the Substance Designer user_preferences xml under config_dir or None if there isn't one.
+    
+    Keyword arguments:
+    config_dir -- The directory to search. (default SBSCONFIG_DIR)"""
+    if config_dir == None:
+        config_dir = SBSCONFIG_DIR
+    if not ft.os.path.isdir(config_dir):
+        return None
+    config_fpn_ls = [x for x in ft.searchFiles(config_dir, 'xml', 'user_preferences') if x.lower().find('substance-designer') != -1]
+    if not config_fpn_ls:
+        return None
+    return config_fpn_ls[0]
+
+def setSBSConfig(config_fpn = None, packages_dir = None):
+    r"""Set the Substance aliases explicitly instead of discovering them on first use.
+    
+    Keyword arguments:
+    config_fpn   -- A Substance Designer user_preferences xml to read the packages dir from.
+    packages_dir -- The directory the sbs:// alias resolves to. Takes precedence over config_fpn."""
+    global _sbs_config_loaded
+    if packages_dir == None and config_fpn != None:
+        packages_dir = et.parse(config_fpn).getroot().findtext('.//packagesdir')
+    if packages_dir:
+        SBSALIASES['sbs'] = packages_dir
+    _sbs_config_loaded = True
+    return SBSALIASES
+
+def getSBSAliases():
+    r"""Return SBSALIASES, loading the Substance config the first time it's asked for.
+    
+    The packages dir is taken from the SBS_PACKAGES_DIR environment variable, then the config file
+    named by SBS_CONFIG, then the user_preferences found under SBSCONFIG_DIR, then the install default."""
+    if not _sbs_config_loaded:
+        packages_dir = ft.os.environ.get('SBS_PACKAGES_DIR')
+        if packages_dir:
+            return setSBSConfig(None, packages_dir)
+        setSBSConfig(ft.os.environ.get('SBS_CONFIG') or findSBSConfig())
+    return SBSALIASES
+
 def openSBS(sbs_fpn):
     r"""Return the (tree, root) of sbs_fpn."""
     tree = et.parse(sbs_fpn)
     root = tree.getroot()
     return (tree, root)
 
+def iterSBSElements(sbs_fpn, tags, stop_tag = None, clear = True):
+    r"""Stream the sbs with iterparse and yield each completed element whose tag is in tags.
+    
+    Keyword arguments:
+    stop_tag  -- Stop reading the file once an element with this tag is closed. (default None)
+    clear     -- If True, each yielded element is cleared once the consumer resumes so
+                 the tree is never fully built. (default True)
+    
+    Raises SBS_CorruptFileError if the file can't be parsed."""
+    try:
+        for event, elem in et.iterparse(sbs_fpn):
+            if elem.tag in tags:
+                yield elem
+                if clear:
+                    elem.clear()
+            if elem.tag == stop_tag:
+                return
+    except et.ParseError:
+        raise SBS_CorruptFileError(sbs_fpn)
+    except IOError:
+        raise SBS_CorruptFileError(sbs_fpn)
+
+def iterDependencies(sbs_fpn):
+    r"""Yield the (filename, uid) of each dependency in an sbs.
+    Stops reading the file once <dependencies> is closed."""
+    for dep in iterSBSElements(sbs_fpn, ('dependency',), 'dependencies'):
+        yield (dep.find('filename').get('v'), dep.find('uid').get('v'))
+
+def iterGraphs(sbs_fpn):
+    r"""Yield the graph elements in an sbs.
+    Each graph is cleared when the next one is requested so hold on to data, not elements."""
+    for graph_elem in iterSBSElements(sbs_fpn, ('graph',)):
+        yield graph_elem
+
 def getDependencies(sbs_fpn):
     r"""Return a list of elements for dependencies in an sbs."""
+    return list(iterSBSElements(sbs_fpn, ('dependency',), 'dependencies', clear = False))
+
+def readSBSRecord(sbs_fpn):
+    r"""Return the dependencies and graph references of sbs_fpn as plain data.
+    {'deps'   : [[filename, uid],..],
+     'graphs' : {graph identifier : [[instanced graph name, dependency uid],..],..}}"""
+    deps = []
+    graphs = {}
+    for elem in iterSBSElements(sbs_fpn, ('dependency', 'graph')):
+        if elem.tag == 'dependency':
+            deps.append([elem.find('filename').get('v'), elem.find('uid').get('v')])
+            continue
+        inst_ls = []
+        for inst_v_elem in elem.findall('.//compInstance/path/value'):
+            inst_v = inst_v_elem.get('v')
+            inst_ls.append([inst_v.split('?')[0].split('/')[-1], inst_v.split('=')[-1]])
+        graphs[elem.find('identifier').get('v')] = inst_ls
+    return {'deps' : deps, 'graphs' : graphs}
+
+def _readSBSRecordSafe(sbs_fpn):
+    r"""Return (sbs_fpn, record) or (sbs_fpn, None) if the file is corrupt.  Runs in pool workers."""
     try:
-        sbs_tree = et.parse(sbs_fpn)
-    except:
-        raise SBS_CorruptFileError(sbs_fpn)
-    sbs_root = sbs_tree.getroot()
-    return sbs_root.findall(".//dependency")
+        return (sbs_fpn, readSBSRecord(sbs_fpn))
+    except SBS_CorruptFileError:
+        return (sbs_fpn, None)
+
+def _readSBSGraphsSafe(sbs_fpn):
+    r"""Return (sbs_fpn, graph elements) or (sbs_fpn, None) if the file is corrupt.  Runs in pool workers."""
+    try:
+        return (sbs_fpn, getGraphs(sbs_fpn))
+    except (et.ParseError, IOError):
+        return (sbs_fpn, None)
+
+def _readSBSGraphIdentifiersSafe(sbs_fpn):
+    r"""Return (sbs_fpn, [graph identifier,..]) or (sbs_fpn, None) if the file is corrupt.  Runs in pool workers."""
+    try:
+        return (sbs_fpn, [x.find('identifier').get('v') for x in iterGraphs(sbs_fpn)])
+    except SBS_CorruptFileError:
+        return (sbs_fpn, None)
+
+def _iterDependenciesSafe(sbs_fpn):
+    r"""Return (sbs_fpn, [(filename, uid),..]) or (sbs_fpn, None) if the file is corrupt.  Runs in pool workers."""
+    try:
+        return (sbs_fpn, list(iterDependencies(sbs_fpn)))
+    except SBS_CorruptFileError:
+        return (sbs_fpn, None)
+
+def _scanSBS(fn, sbs_fpn_ls, workers = None, pbar = None, errors = None, chunksize = None):
+    r"""Yield the (sbs_fpn, result) of fn(sbs_fpn) for each file in order.
+    fn must be a module level function returning (sbs_fpn, None) for a corrupt file."""
+    pool = None
+    if workers and workers > 1 and len(sbs_fpn_ls) > 1:
+        if not chunksize:
+            chunksize = max(1, len(sbs_fpn_ls) / (workers * 4))
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(fn, sbs_fpn_ls, chunksize)
+    else:
+        results = itertools.imap(fn, sbs_fpn_ls)
+    try:
+        for sbs_fpn, result in results:
+            if pbar:
+                pbar.update()
+            if result == None:
+                if errors == None:
+                    print SBS_CorruptFileError(sbs_fpn)
+                else:
+                    errors.append(SBS_CorruptFileError(sbs_fpn))
+                continue
+            yield (sbs_fpn, result)
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+
+def iterSBSRecords(sbs_fpn_ls, workers = None, pbar = None, errors = None, chunksize = None):
+    r"""Yield (sbs_fpn, readSBSRecord(sbs_fpn)) for each file in sbs_fpn_ls, in order.
+    
+    Keyword arguments:
+    workers    -- Parse in a multiprocessing pool of this many processes, results are still
+                  yielded in the order of sbs_fpn_ls. (default None, serial)
+    pbar       -- An optional progress object (e.g. pt.PBar2) updated per file from this process.
+    errors     -- A list to collect SBS_CorruptFileError for files that failed to parse.
+                  Those files are skipped either way, if None the errors are printed.
+    chunksize  -- Files sent to a worker at a time. (default spreads the files in 4 chunks per worker)
+    
+    Scripts using workers on Windows must guard their entry point with if __name__ == '__main__'."""
+    return _scanSBS(_readSBSRecordSafe, sbs_fpn_ls, workers, pbar, errors, chunksize)
 
 def changeDependencyPath(sbs_fpn, dep_fpn_old, dep_fpn_new):
     r"""Change the path of a dependency."""
-    if not ft.os.access(sbs_fpn, ft.os.W_OK):
-        raise SBS_IOError(sbs_fpn)
-    tree, root = openSBS(sbs_fpn)
-    dep_relfpn_old = ft.getRelativePathFrom(sbs_fpn, dep_fpn_old)
-    dep_relfpn_new = ft.getRelativePathFrom(sbs_fpn, dep_fpn_new)
-    dep_dct = dict([(x.find('./filename').get('v').lower(), x) for x in root.findall('.//dependency')])
-    dep = dep_dct[dep_relfpn_old]
-    dep.find('filename').set('v', dep_relfpn_new)
-    tree.write(sbs_fpn,
-               encoding="UTF-8",
-               xml_declaration=True,
-               method="xml")
-
-def getDependentFiles(root, sbs_fpn):
-    r"""Return a list of sbs files dependenent on sbs_fpn."""
+    with SBSDocument(sbs_fpn) as sbs_doc:
+        sbs_doc.changeDependencyPath(dep_fpn_old, dep_fpn_new)
+
+def getDependentFiles(root, sbs_fpn, index = None, workers = None, errors = None):
+    r"""Return a list of sbs files dependenent on sbs_fpn.
+    If an SBSDependencyIndex is given it's queried instead of parsing the files under root.
+    
+    Keyword arguments:
+    workers  -- Read the dependencies of the files in a pool of this many processes, see iterSBSRecords().
+    errors   -- A list collecting SBS_CorruptFileError of unparsable files, see iterSBSRecords()."""
+    if index:
+        sbs_fpn_ls = index.getDependentFiles(sbs_fpn)
+        sbs_fpn_ls = [x for x in sbs_fpn_ls if x.lower().find('_macos') == -1]
+        return [x for x in sbs_fpn_ls if x.lower().find('.autosave') == -1]
     sbs_fpn_ls = ft.searchFiles(root, 'sbs')
     pbar = pt.PBar2("Checking SBS files for dependency to {}".format(sbs_fpn.replace("\\","/").split("/")[-1]), len(sbs_fpn_ls), chr(135), 80)
     sbs_fpn_ls = [x for x in sbs_fpn_ls if x.lower().find('_macos') == -1]
     sbs_fpn_ls = [x for x in sbs_fpn_ls if x.lower().find('.autosave') == -1]
+    if workers:
+        ret_ls = []
+        for x, dep_ls in _scanSBS(_iterDependenciesSafe, sbs_fpn_ls, workers, pbar, errors):
+            if pathtools.getRelativePathFrom(x, sbs_fpn) in [fn.lower() for fn, uid in dep_ls]:
+                ret_ls.append(x)
+        return ret_ls
     return [x for x in sbs_fpn_ls if hasDependency(x, sbs_fpn, pbar)]
 
 def hasDependency(sbs_fpn, dep_fpn, pbar = None):
     r"""Return True if the sbs_fpn has dep_fpn in its dependencies, False otherwise."""
-    dep_fpn_rel = ft.getRelativePathFrom(sbs_fpn, dep_fpn)
+    dep_fpn_rel = pathtools.getRelativePathFrom(sbs_fpn, dep_fpn)
     sbs_dep_fpn_ls = [x.find('filename').get('v').lower() for x in getDependencies(sbs_fpn)]
     if pbar:
         pbar.update()
@@ -292,7 +1346,7 @@ def cookSBS(sbs_path):
 
 #--------------------------------------------
 
-def moveGraph(sbs_fpn_from, sbs_fpn_to, old_graph_name, new_graph_name, root_path):
+def moveGraph(sbs_fpn_from, sbs_fpn_to, old_graph_name, new_graph_name, root_path, index = None):
     r"""Move a graph from one sbs to another and fix up dependencies in all directories in dep_path_ls.
     If the target sbs path doesn't exist, a new file will be made for it.
     Arguments:
@@ -301,9 +1355,13 @@ def moveGraph(sbs_fpn_from, sbs_fpn_to, old_graph_name, new_graph_name, root_pat
     old_graph_name -- The name of the graph as is
     new_graph_name -- The new name for the graph
     dep_fpn_ls    -- Path to root directory within which to check and fix dependencies.
+    
+    Keyword arguments:
+    index         -- An SBSDependencyIndex of root_path to query for dependent files.
+                     The edited files are re-indexed afterwards.
     """
-    dep_fpn_ls = getDependentFiles(root_path, sbs_fpn_from)
-    ft.checkOutMany(dep_fpn_ls, batch_size = 50)
+    dep_fpn_ls = getDependentFiles(root_path, sbs_fpn_from, index)
+    ft.checkOutMany(dep_fpn_ls)
     for fpn in dep_fpn_ls:
         allrdy = 1
         if not ft.os.access(fpn, ft.os.W_OK):
@@ -312,45 +1370,52 @@ def moveGraph(sbs_fpn_from, sbs_fpn_to, old_graph_name, new_graph_name, root_pat
         if not allrdy:
             raise
     ft.checkOutFile(sbs_fpn_from)
+    if not ft.os.path.exists(sbs_fpn_to):
+        makeSBSFile(sbs_fpn_to)
     
-    copyGraph(sbs_fpn_from, sbs_fpn_to, old_graph_name)
-    removeGraph(sbs_fpn_from, old_graph_name)
-    renameGraph(sbs_fpn_to, old_graph_name, new_graph_name)
+    with SBSDocument(sbs_fpn_from) as sbs_doc_from:
+        with SBSDocument(sbs_fpn_to) as sbs_doc_to:
+            sbs_doc_to.copyGraph(sbs_doc_from, old_graph_name)
+            sbs_doc_to.renameGraph(old_graph_name, new_graph_name)
+        sbs_doc_from.removeGraph(old_graph_name)
     
     for fpn in dep_fpn_ls:
-        reconnectSBSDep(sbs_fpn_from, sbs_fpn_to, fpn)
-        renameGraphReferences(fpn, old_graph_name, new_graph_name)    
+        with SBSDocument(fpn) as sbs_doc:
+            sbs_doc.reconnectDependency(sbs_fpn_from, sbs_fpn_to)
+            sbs_doc.renameGraphReferences(old_graph_name, new_graph_name)
+    
+    if index:
+        for fpn in dep_fpn_ls + [sbs_fpn_from, sbs_fpn_to]:
+            index.addFile(fpn)
 
-def findBrokenSBS_FileDependencies(root_path):
-    r"""Return a list of files with broken file dependencies."""
+def findBrokenSBS_FileDependencies(root_path, index = None, workers = None, errors = None):
+    r"""Return a list of files with broken file dependencies.
+    If an SBSDependencyIndex is given it's queried instead of parsing the files under root_path.
+    
+    Keyword arguments:
+    workers  -- Parse the files in a pool of this many processes, see iterSBSRecords().
+    errors   -- A list collecting SBS_CorruptFileError of unparsable files, see iterSBSRecords()."""
+    if workers and not index:
+        index = SBSDependencyIndex().build(root_path, workers = workers, errors = errors)
+    if index:
+        return index.findBrokenFiles()
     ret_ls = []
     sbs_fp_ls = ft.searchFiles(root_path, 'sbs')
     for sbs_fp in sbs_fp_ls:
         dep_ls = getDependencies(sbs_fp)
         for dep in dep_ls:
             dep_fp = dep.find('filename').get('v')
-            dep_fp_abs = (ft.getDirectory(sbs_fp) + '/' + dep_fp)
+            dep_fp_abs = (pathtools.getDirectory(sbs_fp) + '/' + dep_fp)
             if not ft.os.access(dep_fp_abs, ft.os.F_OK) and not sbs_fp in ret_ls:
                 ret_ls.append(sbs_fp)
     return ret_ls
 
 def reconnectSBSDep(sbs_fpn_old, sbs_fpn_new, sbs_fpn):
     r"""Fix-up a dependency path in dep_sbs. Return number of dependencies fixed"""
-    num_fixed = 0
     if not ft.canWrite(sbs_fpn):
         raise SBS_IOError(sbs_fpn) 
-    sbs_fpn_old = ft.getRelativePathFrom(sbs_fpn, sbs_fpn_old).lower().replace('\\','/')
-    sbs_fpn_new = ft.getRelativePathFrom(sbs_fpn, sbs_fpn_new).lower().replace('\\','/')
-    tree = et.parse(sbs_fpn)
-    root = tree.getroot()
-    dep_ls = root.findall(".//dependency")
-    for dep in dep_ls:
-        dep_fpn_elem = dep.find('filename') 
-        dep_fpn = dep_fpn_elem.get('v').lower()
-        if dep_fpn == sbs_fpn_old:
-            dep_fpn_elem.set('v', sbs_fpn_new)
-            num_fixed += 1
-    tree.write(sbs_fpn)
+    with SBSDocument(sbs_fpn) as sbs_doc:
+        return sbs_doc.reconnectDependency(sbs_fpn_old, sbs_fpn_new)
 
 def findSBSUsage(sbs_path, graph_name):
     r"""Return a list of SBS files (paths) and graphs that reference a given SBS and graph."""
@@ -359,13 +1424,29 @@ def findSBSUsage(sbs_path, graph_name):
         #go through each sbs file's graph
         #Check if has reference to sbs_path and graph_name 
 
-def collectSBS(root_path):
-    r"""Return a dictionary of {SBS_File1:[Graph1, Graph2, ...], SBS_File2:[Graph1, Graph2, ...], ...} under root_path"""
+def collectSBS(root_path, workers = None, errors = None, identifiers = False):
+    r"""Return a dictionary of {SBS_File1:[Graph1, Graph2, ...], SBS_File2:[Graph1, Graph2, ...], ...} under root_path
+    
+    Keyword arguments:
+    workers      -- Parse the files in a pool of this many processes, see iterSBSRecords().
+                    The graph elements of every file are pickled back from the pool, which costs
+                    about as much as parsing them, so use it with identifiers.
+    errors       -- A list collecting SBS_CorruptFileError of unparsable files, see iterSBSRecords().
+                    If None and there are no workers, a corrupt file raises SBS_CorruptFileError.
+    identifiers  -- If True, the graphs are their identifiers instead of et elements and the
+                    files are streamed, see iterGraphs(). (default False)"""
     ret_dct = {}
-    sbs_fp_ls = ft.searchFiles('c:/Denis_Korkh', 'sbs')
-    for sbs_fp in sbs_fp_ls:
-        sbs_fp_lower = sbs_fp.lower()
-        ret_dct[sbs_fp_lower] = getGraphs(sbs_fp_lower)
+    sbs_fp_ls = ft.searchFiles(root_path, 'sbs')
+    fn = _readSBSGraphIdentifiersSafe if identifiers else _readSBSGraphsSafe
+    if not workers and errors == None:
+        for sbs_fp in sbs_fp_ls:
+            graph_ls = fn(sbs_fp)[1]
+            if graph_ls == None:
+                raise SBS_CorruptFileError(sbs_fp)
+            ret_dct[sbs_fp.lower()] = graph_ls
+        return ret_dct
+    for sbs_fp, graph_ls in _scanSBS(fn, sbs_fp_ls, workers, errors = errors):
+        ret_dct[sbs_fp.lower()] = graph_ls
     return ret_dct
     
 def getGraphs(sbs_fpn):
@@ -377,11 +1458,68 @@ def getGraphs(sbs_fpn):
 
 def getGraphOutputs(sbs_fpn, graph_nm):
     r"""Return a list of et elements for sbs outputs for a graph within sbs_fpn."""
-    #Read the sbs
-    sbs_tree = et.parse(sbs_fpn)
-    sbs_root = sbs_tree.getroot()
+    ret_ls = []
+    for graph_elem in iterGraphs(sbs_fpn):
+        if graph_elem.find('identifier').get('v') == graph_nm:
+            ret_ls += graph_elem.findall('graphOutputs/graphoutput')
+    return ret_ls
+
+def _writePackage(path, data):
+    r"""Write data to path and return the seconds it took.  Runs in makePackages() threads."""
+    t = time.time()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return time.time() - t
+
+def makePackages(asset_ls, package_template = SBS.PACKAGE_TEMPLATE, res = '11 11', threads = 4, pbar = None):
+    r"""Make a package per asset from a single load of package_template.
     
-    return sbs_root.findall(".//graph/identifier[@v='{}']/../graphOutputs/graphoutput".format(graph_nm))
+    The template is loaded once and each asset's edits are applied to it, serialized and
+    rolled back.  Writing the packages is left to a pool of threads.  A failing asset is
+    reported and skipped, it doesn't stop the batch.
+    
+    Arguments:
+    asset_ls          -- An iterable of (tex_m, tex_n, tex_h, tex_ao, tex_wsn, tex_p, geo_l, package_path) tuples.
+    
+    Keyword arguments:
+    package_template  -- The sbs to make the packages from. (default SBS.PACKAGE_TEMPLATE)
+    res               -- The output resolution set on the map nodes. (default '11 11')
+    threads           -- The number of threads writing packages. (default 4)
+    pbar              -- An optional progress object with an update() method called per asset.
+    
+    Return a list of {'path' : package_path, 'time' : seconds, 'error' : exception or None}
+    in the order of asset_ls."""
+    package_doc = SBSDocument(package_template, readonly = True)
+    pool = ThreadPool(threads)
+    ret_ls = []
+    try:
+        for asset in asset_ls:
+            t = time.time()
+            ret = {'path' : asset[-1], 'time' : 0.0, 'error' : None}
+            package_doc.checkpoint()
+            try:
+                sbs = SBS(*asset[:-1], package_template = package_template, package_doc = package_doc)
+                sbs.setPackage(asset[-1], res)
+                ret['write'] = pool.apply_async(_writePackage, (asset[-1], et.tostring(package_doc.root)))
+            except Exception as e:
+                ret['error'] = e
+            finally:
+                package_doc.rollback()
+            ret['time'] = time.time() - t
+            ret_ls.append(ret)
+        for ret in ret_ls:
+            write = ret.pop('write', None)
+            if write:
+                try:
+                    ret['time'] += write.get()
+                except Exception as e:
+                    ret['error'] = e
+            if pbar:
+                pbar.update()
+    finally:
+        pool.close()
+        pool.join()
+    return ret_ls
 
 def makeSBSFile(sbs_path, template = SBSTEMPLATE_EMPTY, overwrite = 0):
     r"""Make a new sbs file at sbs_path.
@@ -419,215 +1557,76 @@ def copyGraph(sbs_fpn_src, sbs_fpn_trg, sbs_graph_nm):
     #Assert source path exists
     if not ft.os.path.exists(sbs_fpn_src):
         raise SBS_MissingFileError(sbs_fpn_src)
-        
-    #check target file for a graph by the same name
-    tree_trg = et.parse(sbs_fpn_trg)
-    root_trg = tree_trg.getroot()
-    graph_elem_trg = root_trg.find(".//graph/identifier[@v='{}']/..".format(sbs_graph_nm))
-    if graph_elem_trg != None:
-        raise SBS_CopyGraphError(sbs_fpn_src, sbs_fpn_trg, sbs_graph_nm)
-    
-    #check the source file for the wanted graph
-    tree_src = et.parse(sbs_fpn_src)
-    root_src = tree_src.getroot()
-    graph_elem_src = root_src.find(".//graph/identifier[@v='{}']/..".format(sbs_graph_nm))
-    if graph_elem_src == None:
-        raise SBS_CopyGraphError(sbs_fpn_src, sbs_fpn_trg, sbs_graph_nm)
-    
-    #check the target file for the content element
-    content_trg = root_trg.find('content')
-    if content_trg == None:
-        raise SBS_CopyGraphError(sbs_graph_nm, sbs_fpn_src, sbs_fpn_trg)
-    
-    #check the target file for the dependencies element
-    dependencies_trg = root_trg.find('dependencies')
-    if dependencies_trg == None:
-        raise SBS_CopyGraphError(sbs_graph_nm, sbs_fpn_src, sbs_fpn_trg)
-    
-    #Check/find/compare/copy dependencies.
-    graph_dep_dct_src = getGraphDependencies(sbs_fpn_src, sbs_graph_nm)
-    for graph_dep_src in graph_dep_dct_src.itervalues():
-        himself = 0
-        graph_dep_src_relfpn = graph_dep_src.find('filename').get('v')
-        if graph_dep_src_relfpn == '?himself':
-            himself = 1
-        graph_dep_fpn_src = ft.os.path.split(sbs_fpn_src)[0] + "/" + graph_dep_src_relfpn
-        alias = graph_dep_src_relfpn.split(':')[0]
-        if alias in SBSALIASES:
-            graph_dep_fpn_src = graph_dep_src_relfpn
-        if himself:
-            graph_dep_fpn_src = ft.getRelativePathFrom(sbs_fpn_trg, sbs_fpn_src)
-        if not hasDependency(sbs_fpn_trg, graph_dep_fpn_src):
-            graph_dep_fpn_src_abs = ft.os.path.normpath(graph_dep_fpn_src).replace('\\', '/')
-            alias = graph_dep_src_relfpn.split(':')[0]
-            if alias in SBSALIASES:
-                graph_dep_fpn_src_abs = ft.os.path.normpath(graph_dep_src_relfpn.replace(alias + ':', SBSALIASES[alias])).replace('\\', '/')
-            if graph_dep_fpn_src_abs.lower() != sbs_fpn_trg.replace('\\','/').lower():
-                if alias in SBSALIASES:
-                    graph_dep_src.find('filename').set('v', graph_dep_src_relfpn)
-                if himself:
-                    graph_dep_src.find('filename').set('v', graph_dep_fpn_src)
-                else:
-                    graph_dep_src.find('filename').set('v', ft.getRelativePathFrom(sbs_fpn_trg, graph_dep_fpn_src_abs))
-                dependencies_trg.append(graph_dep_src)
-    
-    #Copy the graph
-    content_trg.append(graph_elem_src)
     
-    #write the file
-    tree_trg.write(sbs_fpn_trg, 
-                   encoding = "UTF-8", 
-                   xml_declaration = True, 
-                   method = "xml")
+    with SBSDocument(sbs_fpn_trg) as sbs_doc_trg:
+        sbs_doc_trg.copyGraph(SBSDocument(sbs_fpn_src, readonly = True), sbs_graph_nm)
     
 def getGraphDependencies(sbs_fpn, graph_nm):
     r"""Return a dict of dependencies in sbs_fpn referenced by graph_nm."""
-    tree, root = openSBS(sbs_fpn)
-    find_str = ".//graph/identifier[@v='{}']/..".format(graph_nm)
-    graph_elem = root.find(find_str)
-    if graph_elem == None:
-        raise SBS_MissingElementError(find_str, root)
-    ret_dep_dct = {}
-    sbs_dep_dct = dict([(x.find("uid").get("v"), x) for x in root.findall(".//dependency")])
-    
-    graph_elem_deps = graph_elem.findall('.//compInstance')
-    for graph_elem_dep in graph_elem_deps:
-        graph_dep_id = graph_elem_dep.find('.//path/value').get('v')
-        graph_dep_id = graph_dep_id.split('=')[-1]
-        if graph_dep_id in sbs_dep_dct and not graph_dep_id in ret_dep_dct:
-            ret_dep_dct[graph_dep_id] = sbs_dep_dct[graph_dep_id]
-    return ret_dep_dct
+    return SBSDocument(sbs_fpn, readonly = True).getGraphDependencies(graph_nm)
     
 def getDependencyGraphs(sbs_fpn, dep_fpn):
     r"""Return a dictionary of graph elements in sbs_fpn using a dep_fpn."""
-    ret_dct = dict()
-    sbs_tree, sbs_root = openSBS(sbs_fpn)
-    dep_relfpn = ft.getRelativePathFrom(sbs_fpn, dep_fpn)
-    if dep_fpn.split(':')[0] in SBSALIASES:
-        dep_relfpn = dep_fpn
-    dep_dct = dict([(x.find('./filename').get('v').lower(), x) for x in sbs_root.findall('.//dependency')])
-    dep_uid = dep_dct[dep_relfpn].find('uid').get('v')
-    #dep_uid = sbs_root.find('.//dependency/filename[@v=\'{}\']/../uid'.format(dep_relfpn)).get('v')
-    dep_graph_ls = getGraphs(sbs_fpn)
-    for dep_graph in dep_graph_ls:
-        dep_graph_uid = dep_graph.find('.//uid').get('v')
-        graph_dep_uid_ls = getGraphDependencies(sbs_fpn, dep_graph.find('identifier').get('v')).keys()
-        if dep_uid in graph_dep_uid_ls and not dep_graph_uid in ret_dct:
-            ret_dct[dep_graph_uid] = dep_graph
-    return ret_dct
-        
-        #if hasDendency()
-    
-    #sbs_dep_dct = getGraphDendencies
+    return SBSDocument(sbs_fpn, readonly = True).getDependencyGraphs(dep_fpn)
 
 def removeGraph(sbs_fpn, graph_nm):
     r"""Remove graph_nm from sbs_fpn.
-    Removes any of its dependencies if they're not used after removal.
-    Stupidly writes before checking whether to remove dependencies because this whole thing is stupidly written."""
-    if not ft.os.access(sbs_fpn, ft.os.W_OK):
-        raise SBS_IOError(sbs_fpn)
-    tree, root = openSBS(sbs_fpn)
-    
-    #find graph and remove it from content
-    content = root.find('./content')
-    graph = content.find('./graph/identifier[@v=\'{}\']/..'.format(graph_nm))
-    graph_dep_id_ls_dirty = getGraphDependencies(sbs_fpn, graph_nm).keys()
-    if graph != None:
-        content.remove(graph)
-    tree.write(sbs_fpn,
-               encoding = "UTF-8",
-               xml_declaration = True,
-               method = "xml")
-    
-    #check if that graphs dependencies are still necessary
-        
-    tree, root = openSBS(sbs_fpn)
-    for graph_dep_id in graph_dep_id_ls_dirty:
-        find_str = './/dependency/uid[@v=\'{}\']/..'.format(graph_dep_id)
-        graph_dep = root.find(find_str)
-        if graph_dep == None:
-            raise SBS_MissingElementError(find_str, root)
-        graph_dep_fpn = graph_dep.find('filename').get('v')
-        graph_dep_alias = graph_dep_fpn.split(':')[0]
-        if not graph_dep_alias in SBSALIASES:
-            graph_dep_fpn = ft.os.path.normpath(ft.os.path.dirname(sbs_fpn) + '/' + graph_dep_fpn)
-        dep_graphs = getDependencyGraphs(sbs_fpn, graph_dep_fpn)
-        if len(dep_graphs) == 0:
-            find_str = './/dependencies'
-            deps_elem = root.find(find_str)
-            if deps_elem == None:
-                raise SBS_MissingElementError(find_str, deps_elem)
-            deps_elem.remove(graph_dep)
-            tree.write(sbs_fpn,
-               encoding = "UTF-8",
-               xml_declaration = True,
-               method = "xml")    
+    Removes any of its dependencies if they're not used after removal."""
+    with SBSDocument(sbs_fpn) as sbs_doc:
+        sbs_doc.removeGraph(graph_nm)
 
 def renameGraphReferences(sbs_fpn, old_graph_nm, new_graph_nm):
     r"""Rename graph references within the sbs_fpn."""
-    if not ft.os.access(sbs_fpn, ft.os.W_OK):
-        raise SBS_IOError(sbs_fpn)
-    tree, root = openSBS(sbs_fpn)
-    graph_refs = root.findall('.//compInstance/path/value')
-    for graph_ref in graph_refs:
-        graph_ref_graphname = graph_ref.get('v').split('?')[0].split('/')[-1]
-        graph_ref_depinfo = graph_ref.get('v').split('?')[-1]
-        if old_graph_nm.lower() == graph_ref_graphname.lower():
-            graph_ref.set('v', 'pkg://{}?{}'.format(new_graph_nm, graph_ref_depinfo))
-    tree.write(sbs_fpn,
-               encoding = "UTF-8",
-               xml_declaration = True,
-               method = "xml")
+    with SBSDocument(sbs_fpn) as sbs_doc:
+        sbs_doc.renameGraphReferences(old_graph_nm, new_graph_nm)
     
 def renameGraph(sbs_fpn, old_graph_nm, new_graph_nm):
-    if not ft.os.access(sbs_fpn, ft.os.W_OK):
-        raise SBS_IOError(sbs_fpn)
-    tree, root = openSBS(sbs_fpn)
-    renameGraphReferences(sbs_fpn, old_graph_nm, new_graph_nm)
-    graph_ls = root.findall('.//graph/identifier')
-    for graph_ref in graph_ls:
-        graph_ref_graphname = graph_ref.get('v')
-        if old_graph_nm.lower() == graph_ref_graphname.lower():
-            graph_ref.set('v', new_graph_nm)
-    tree.write(sbs_fpn,
-               encoding = "UTF-8",
-               xml_declaration = True,
-               method = "xml")
+    r"""Rename a graph within sbs_fpn and the references to it."""
+    with SBSDocument(sbs_fpn) as sbs_doc:
+        sbs_doc.renameGraph(old_graph_nm, new_graph_nm)
     
 def moveSourceTexture(dep_sbs, tex_path_old, tex_path_new):
     r"""Move a source texture and update a dependent sbs with new path"""
 
 
-def renderSBSAR(sbsar_path, output, out_path, width, height):
-    renderpipe = subprocess.check_output('{renderer} render \
-                                            --inputs {inputs} \
-                                            --input-graph-output {output} \
-                                            --output-path {out_path} \
-                                            --output-name {out_name} \
-                                            --engine "d3d10pc" \
-                                            --set-value "$outputsize"@"{width},{height}" \
-                                            --output-format tga'.format(renderer = SBSRENDER,
-                                                                        inputs = sbsar_path,
-                                                                        output = output,
-                                                                        out_path = out_path,
-                                                                        out_name = '{inputGraphUrl}_{outputNodeName}',
-                                                                        width = width,
-                                                                        height = height))
+def _makeDirs(path):
+    r"""Make path and its parents if missing, another thread or process may be making them too."""
+    try:
+        ft.os.makedirs(path)
+    except OSError as e:
+        if e.errno != ft.errno.EEXIST or not ft.os.path.isdir(path):
+            raise
+
+def getRenderArgs(sbsar_path, output, out_path, width = None, height = None, engine = 'd3d10pc'):
+    r"""Return the sbsrender argument list to render output from sbsar_path into out_path as tga.
+    If width and height are None the graph's native size is used."""
+    args = [SBSRENDER, 'render',
+            '--inputs', sbsar_path,
+            '--input-graph-output', output,
+            '--output-path', out_path,
+            '--output-name', '{inputGraphUrl}_{outputNodeName}',
+            '--engine', engine]
+    if width != None and height != None:
+        args += ['--set-value', '$outputsize@{},{}'.format(width, height)]
+    return args + ['--output-format', 'tga']
+
+def renderSBSAR(sbsar_path, output, out_path, width, height, cache = None):
+    r"""Render output from sbsar_path into out_path as tga.
+    If an SBSRenderCache is given, a previous render of the same sbsar content, output,
+    size and engine is placed in out_path instead of running SBSRENDER."""
+    if cache:
+        queue = SBSRenderQueue(1, retries = 0, cache = cache)
+        job = queue.add(sbsar_path, output, out_path, width, height)
+        queue.run()
+        if job.returncode != 0:
+            raise subprocess.CalledProcessError(job.returncode, job.getArgs(), '\n'.join(job.lines))
+        return
+    renderpipe = subprocess.check_output(getRenderArgs(sbsar_path, output, out_path, width, height))
     for line in renderpipe.split('\n'):
         print line,
 
 def renderSBSAR_NativeDim(sbsar_path, output, out_path):
-    renderpipe = subprocess.check_output('{renderer} render \
-                                            --inputs {inputs} \
-                                            --input-graph-output {output} \
-                                            --output-path {out_path} \
-                                            --output-name {out_name} \
-                                            --engine "d3d10pc" \
-                                            --output-format tga'.format(renderer = SBSRENDER,
-                                                                        inputs = sbsar_path,
-                                                                        output = output,
-                                                                        out_path = out_path,
-                                                                        out_name = '{inputGraphUrl}_{outputNodeName}'))
+    renderpipe = subprocess.check_output(getRenderArgs(sbsar_path, output, out_path))
     for line in renderpipe.split('\n'):
         print line,
 